@@ -0,0 +1,325 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Resumable jobs that process every result of a query in batches.
+
+A job walks its query one page at a time and checkpoints its cursor after each
+batch has been processed, so it can resume after any interruption. Jobs run as
+a chain of push tasks on the "jobs" queue, each working for at most
+TASK_TIME_BUDGET_SECS, or in-process with run_job_locally (for example against
+the local datastore stub).
+
+New kinds of jobs subclass BatchJob and are registered with @register.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import json
+import time
+import uuid
+
+from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+import webapp2
+
+QUEUE_NAME = 'jobs'
+WORKER_URL = '/_jobs/run'
+START_URL = '/_jobs/start'
+STATUS_URL = '/_jobs/status'
+# How long a single push task works before checkpointing and handing over to
+# the next task of the chain, to stay well within the task deadline.
+TASK_TIME_BUDGET_SECS = 5 * 60
+
+_JOB_CLASSES = {}
+
+
+def register(job_class):
+    """Class decorator which makes a BatchJob subclass runnable by name."""
+    _JOB_CLASSES[job_class.JOB_TYPE] = job_class
+    return job_class
+
+
+class BatchJob(object):
+    """Base class of the batch jobs. Subclasses override the classmethods."""
+
+    # The name the job is registered and started under.
+    JOB_TYPE = None
+    # The number of query results processed per batch.
+    BATCH_SIZE = 500
+    # Whether the query should return keys rather than entities.
+    KEYS_ONLY = False
+
+    @classmethod
+    def get_query(cls, params):
+        """Returns the ndb.Query whose results the job processes.
+
+        Args:
+            params: dict. The parameters the job was started with.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def process_batch_async(cls, results, params):
+        """Processes a batch of query results.
+
+        Args:
+            results: list(ndb.Model|ndb.Key). The next batch of results.
+            params: dict. The parameters the job was started with.
+
+        Returns:
+            ndb.Future. Resolves once the batch has been processed.
+        """
+        raise NotImplementedError
+
+
+class BatchJobModel(ndb.Model):
+    """The checkpointed state of a batch job.
+
+    Instances of this class have a random ID.
+    """
+
+    # The JOB_TYPE of the BatchJob subclass which runs this job.
+    job_type = ndb.StringProperty(required=True, indexed=True)
+    # The parameters the job was started with.
+    params = ndb.JsonProperty(default=None)
+    # Groups the shards of a job that was split into several.
+    group_id = ndb.StringProperty(default=None, indexed=True)
+    # The urlsafe cursor after the last batch that was fully processed.
+    cursor = ndb.StringProperty(default=None, indexed=False)
+    # The number of query results processed so far.
+    processed_count = ndb.IntegerProperty(default=0, indexed=False)
+    # Whether every result of the query has been processed.
+    done = ndb.BooleanProperty(default=False, indexed=False)
+    # When the job was started.
+    created_on = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    # When the last checkpoint was written.
+    last_updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+    def get_status(self):
+        """Returns a JSON-serializable summary of the job's progress."""
+        elapsed_secs = (
+            (self.last_updated or self.created_on) - self.created_on
+        ).total_seconds()
+        return {
+            'job_id': self.key.id(),
+            'job_type': self.job_type,
+            'group_id': self.group_id,
+            'params': self.params,
+            'processed_count': self.processed_count,
+            'done': self.done,
+            'elapsed_secs': elapsed_secs,
+            'items_per_sec': (
+                self.processed_count / elapsed_secs if elapsed_secs > 0
+                else None),
+        }
+
+
+def create_job(job_type, params, group_id=None):
+    """Stores the initial state of a job, without starting it.
+
+    Args:
+        job_type: str. The JOB_TYPE of a registered BatchJob subclass.
+        params: dict. The parameters to pass to the job.
+        group_id: str|None. The group the job is a shard of, if any.
+
+    Returns:
+        str. The ID of the new job.
+
+    Raises:
+        Exception: if no job is registered under job_type.
+    """
+    if job_type not in _JOB_CLASSES:
+        raise Exception('Unknown job type %r' % job_type)
+    job_id = uuid.uuid4().hex
+    BatchJobModel(
+        id=job_id, job_type=job_type, params=params, group_id=group_id).put()
+    return job_id
+
+
+def enqueue_job(job_id):
+    """Enqueues the next push task of a job."""
+    taskqueue.add(
+        queue_name=QUEUE_NAME, url=WORKER_URL, params={'job_id': job_id})
+
+
+def start_job(job_type, params, group_id=None):
+    """Creates a job and enqueues its first push task.
+
+    Args:
+        job_type: str. The JOB_TYPE of a registered BatchJob subclass.
+        params: dict. The parameters to pass to the job.
+        group_id: str|None. The group the job is a shard of, if any.
+
+    Returns:
+        str. The ID of the new job.
+    """
+    job_id = create_job(job_type, params, group_id=group_id)
+    enqueue_job(job_id)
+    return job_id
+
+
+def run_job_slice(job_id, time_budget_secs=None):
+    """Processes batches of a job until it is done or out of time.
+
+    The next page of results is fetched while the current batch is being
+    processed. The cursor is only checkpointed once a batch is done, so a
+    slice interrupted at any point resumes without skipping results.
+
+    Args:
+        job_id: str. The ID of the job.
+        time_budget_secs: float|None. How long to keep starting new batches
+            for. None means until the job is done.
+
+    Returns:
+        bool. Whether the job is done.
+    """
+    job = BatchJobModel.get_by_id(job_id)
+    if job is None or job.done:
+        return True
+    job_class = _JOB_CLASSES[job.job_type]
+    query = job_class.get_query(job.params)
+    deadline = time.time() + time_budget_secs if time_budget_secs else None
+
+    def _fetch_async(cursor):
+        return query.fetch_page_async(
+            job_class.BATCH_SIZE, start_cursor=cursor,
+            keys_only=job_class.KEYS_ONLY)
+
+    fetch_future = _fetch_async(
+        Cursor(urlsafe=job.cursor) if job.cursor else None)
+    while fetch_future is not None:
+        results, cursor, more = fetch_future.get_result()
+        process_future = (
+            job_class.process_batch_async(results, job.params) if results
+            else None)
+        fetch_future = None
+        if more and cursor and (deadline is None or time.time() < deadline):
+            fetch_future = _fetch_async(cursor)
+        if process_future is not None:
+            process_future.get_result()
+
+        job.processed_count += len(results)
+        if cursor:
+            job.cursor = cursor.urlsafe()
+        job.done = not more
+        job.put()
+    return job.done
+
+
+def run_job_locally(job_id):
+    """Runs a job to completion in the current process.
+
+    Args:
+        job_id: str. The ID of the job.
+
+    Returns:
+        dict. The final status of the job.
+    """
+    run_job_slice(job_id)
+    return BatchJobModel.get_by_id(job_id).get_status()
+
+
+def get_status(job_id=None, group_id=None):
+    """Summarizes the progress of a job, or of every shard in a group.
+
+    Args:
+        job_id: str|None. The ID of a single job.
+        group_id: str|None. The ID of a group of job shards.
+
+    Returns:
+        dict|None. The status, or None if there is no such job or group.
+    """
+    if job_id:
+        job = BatchJobModel.get_by_id(job_id)
+        return job and job.get_status()
+    shards = BatchJobModel.query(BatchJobModel.group_id == group_id).fetch()
+    if not shards:
+        return None
+    statuses = [shard.get_status() for shard in shards]
+    started = min(shard.created_on for shard in shards)
+    finished = max(shard.last_updated for shard in shards)
+    elapsed_secs = (finished - started).total_seconds()
+    processed_count = sum(status['processed_count'] for status in statuses)
+    return {
+        'group_id': group_id,
+        'processed_count': processed_count,
+        'done': all(status['done'] for status in statuses),
+        'elapsed_secs': elapsed_secs,
+        'items_per_sec': (
+            processed_count / elapsed_secs if elapsed_secs > 0 else None),
+        'shards': statuses,
+    }
+
+
+def respond_with_job(handler, job_id):
+    """Answers a request which started a job with where to follow it.
+
+    Cron records any response outside 2xx as a failed run, so requests made
+    by cron get the job ID as JSON with a 200. Others are redirected to the
+    job's status.
+
+    Args:
+        handler: webapp2.RequestHandler. The handler which started the job.
+        job_id: str. The ID of the job.
+    """
+    if handler.request.headers.get('X-Appengine-Cron'):
+        handler.response.content_type = 'application/json'
+        handler.response.out.write(json.dumps({'job_id': job_id}))
+    else:
+        handler.redirect('%s?job_id=%s' % (STATUS_URL, job_id))
+
+
+class BatchJobWorker(webapp2.RequestHandler):
+    """Runs one push task's worth of a batch job."""
+
+    def post(self):
+        job_id = self.request.get('job_id')
+        if not run_job_slice(job_id, time_budget_secs=TASK_TIME_BUDGET_SECS):
+            enqueue_job(job_id)
+
+
+class StartBatchJobPage(webapp2.RequestHandler):
+    """Starts a batch job. Every query parameter except job_type is passed to
+    the job as a parameter. Unknown job types are answered with 400 Bad
+    Request.
+    """
+
+    def get(self):
+        job_type = self.request.get('job_type')
+        if job_type not in _JOB_CLASSES:
+            self.abort(400, detail='Unknown job type')
+        params = {
+            name: self.request.get(name) for name in self.request.arguments()
+            if name != 'job_type'
+        }
+        job_id = start_job(job_type, params)
+        respond_with_job(self, job_id)
+
+
+class BatchJobStatusPage(webapp2.RequestHandler):
+    """Reports the progress of a batch job, or group of shards, as JSON."""
+
+    def get(self):
+        status = get_status(
+            job_id=self.request.get('job_id') or None,
+            group_id=self.request.get('group_id') or None)
+        if status is None:
+            self.abort(404)
+        self.response.content_type = 'application/json'
+        self.response.out.write(json.dumps(status))
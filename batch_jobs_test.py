@@ -0,0 +1,55 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for batch_jobs."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import webapp2
+
+import batch_jobs
+import migration_jobs
+
+app = webapp2.WSGIApplication([
+    (batch_jobs.START_URL, batch_jobs.StartBatchJobPage),
+])
+
+
+class StartBatchJobPageTests(test_utils.TestBase):
+
+    def _get(self, url):
+        return webapp2.Request.blank(str(url)).get_response(app)
+
+    def test_unknown_job_types_are_bad_requests(self):
+        response = self._get(batch_jobs.START_URL + '?job_type=unknown')
+        self.assertEqual(response.status_int, 400)
+        self.assertEqual(batch_jobs.BatchJobModel.query().count(), 0)
+
+    def test_known_job_types_are_started(self):
+        response = self._get(
+            batch_jobs.START_URL + '?job_type=%s&model=base' % (
+                migration_jobs.ReconcileTaskCountersJob.JOB_TYPE))
+        self.assertEqual(response.status_int, 302)
+        self.assertEqual(
+            [job.params for job in batch_jobs.BatchJobModel.query()],
+            [{'model': 'base'}])
+        self.assertEqual(
+            len(self.taskqueue_stub.get_filtered_tasks(
+                queue_names=[batch_jobs.QUEUE_NAME])),
+            1)
@@ -0,0 +1,558 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Headless benchmark comparing the query strategies of the task models.
+
+Runs against the local datastore stub, so no dev_appserver is needed:
+
+    python benchmark.py --num-entities 5000 --iterations 200 > out.json
+
+or, to see how the reads of one hot exploration scale with its task count:
+
+    python benchmark.py --sweep 10000,100000,1000000 --iterations 20 \\
+        --sweep-csv sweep.csv > sweep.json
+
+or, to see how the size and batching of a history page affect its latency and
+cost:
+
+    python benchmark.py --page-sweep 10,50,100,500 --num-entities 5000 \\
+        --sweep-csv pages.csv > pages.json
+
+The report is a JSON object keyed by model name (see task_models.TASK_MODELS),
+with latency percentiles, RPC counts and entities read for each operation.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+sys.path.append('../oppia_tools/google_appengine_1.9.67/google_appengine')
+sys.path.append('../oppia_tools/google-cloud-sdk-251.0.0')
+
+import argparse
+import contextlib
+import csv
+import functools
+import json
+import math
+import time
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+import ndb_utils
+import rpc_trace
+import task_models
+import workload
+
+SEED_BATCH_SIZE = 1000
+PERCENTILES = (50, 95, 99)
+# The operations measured at every point of a cardinality sweep.
+SWEEP_OPERATIONS = ('get_open_tasks', 'fetch_history_page')
+SWEEP_CSV_COLUMNS = (
+    ['model', 'num_tasks', 'operation'] +
+    ['p%d_ms' % pct for pct in PERCENTILES] +
+    ['rpcs_per_call', 'entities_read_per_call', 'results_per_call'])
+# The ways of fetching a history page measured at every page size of a page
+# size sweep. See get_page_sweep_options.
+PAGE_SWEEP_VARIANTS = ('default', 'batch', 'batch_prefetch', 'no_cursors')
+PAGE_SWEEP_CSV_COLUMNS = (
+    ['model', 'page_size', 'variant'] + SWEEP_CSV_COLUMNS[3:])
+
+
+@contextlib.contextmanager
+def override_attributes(obj, **attributes):
+    """Temporarily sets attributes of an object, such as a model class."""
+    originals = {name: getattr(obj, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(obj, name, value)
+
+
+def setup_testbed():
+    """Activates a testbed backed by a strongly consistent datastore stub.
+
+    Returns:
+        testbed.Testbed. The activated testbed.
+    """
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_datastore_v3_stub(
+        consistency_policy=datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+            probability=1))
+    bed.init_memcache_stub()
+    ndb.get_context().clear_cache()
+    return bed
+
+
+def seed(task_model, num_entities, entity_id, workload_seed=0, stream=0):
+    """Writes num_entities generated tasks for the given exploration.
+
+    Args:
+        task_model: class. The task entry model to seed.
+        num_entities: int. How many entities to write.
+        entity_id: str. The exploration every generated task belongs to.
+        workload_seed: int. Seeds the generated workload.
+        stream: int. The stream of the workload to draw from. Seeding the
+            same model twice needs different streams to write new tasks.
+
+    Returns:
+        dict. The write throughput of the model's put_multi.
+    """
+    generator = workload.WorkloadGenerator(
+        task_model, seed=workload_seed, stream=stream, entity_ids=[entity_id])
+    put_secs = 0
+    for batch in generator.generate_batches(num_entities, SEED_BATCH_SIZE):
+        start = time.time()
+        task_model.put_multi(batch, update_last_updated_time=False)
+        put_secs += time.time() - start
+    ndb.get_context().clear_cache()
+    return {
+        'put_secs': put_secs,
+        'entities_per_sec': num_entities / put_secs if put_secs else None,
+    }
+
+
+def percentile(sorted_values, pct):
+    """Returns the nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values: list(float). Non-empty, sorted in ascending order.
+        pct: int. The percentile to compute, in [0, 100].
+
+    Returns:
+        float. The value at the requested percentile.
+    """
+    rank = int(math.ceil(pct / 100 * len(sorted_values))) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def entities_read(trace):
+    """Returns how many entities the RPCs of a trace read from the datastore.
+
+    Keys-only query results are not counted, since they carry no entity data.
+
+    Args:
+        trace: rpc_trace.RpcTrace. A finished trace.
+
+    Returns:
+        int. The number of entities read.
+    """
+    return sum(
+        rpc.get('entities', 0) for rpc in trace.rpcs
+        if rpc['call'] in ('RunQuery', 'Next', 'Get') and
+        not rpc.get('keys_only'))
+
+
+def measure(operation, iterations):
+    """Runs an operation repeatedly and summarizes its cost.
+
+    Every iteration starts with an empty in-context cache, so that each one
+    behaves like a separate request.
+
+    Args:
+        operation: callable. Takes no arguments.
+        iterations: int. How many times to run the operation.
+
+    Returns:
+        dict. Latency percentiles in milliseconds, and the mean number of RPCs
+        and entities read per call.
+    """
+    latencies = []
+    total_rpcs = 0
+    total_entities_read = 0
+    for _ in range(iterations):
+        ndb.get_context().clear_cache()
+        rpc_trace.start_trace()
+        start = time.time()
+        try:
+            operation()
+        finally:
+            latencies.append((time.time() - start) * 1000)
+            trace = rpc_trace.end_trace()
+        total_rpcs += len(trace.rpcs)
+        total_entities_read += entities_read(trace)
+
+    latencies.sort()
+    summary = {
+        'p%d_ms' % pct: percentile(latencies, pct) for pct in PERCENTILES
+    }
+    summary['rpcs_per_call'] = total_rpcs / iterations
+    summary['entities_read_per_call'] = total_entities_read / iterations
+    return summary
+
+
+def fetch_page_sequential(task_model, entity_id):
+    """Runs the three queries the task page used to make, one by one."""
+    task_model.get_open_tasks('exploration', entity_id, 1)
+    task_model.fetch_history_page(
+        'exploration', entity_id, 1, None, new_to_old=True)
+    task_model.fetch_history_page(
+        'exploration', entity_id, 1, None, new_to_old=False)
+
+
+def fetch_page_concurrent(task_model, entity_id):
+    """Runs the queries of a task page in parallel, as PageBase does."""
+    futures = [
+        task_model.list_open_tasks_async('exploration', entity_id, 1),
+        task_model.list_history_page_async('exploration', entity_id, 1, None),
+    ]
+    ndb.Future.wait_all(futures)
+
+
+def benchmark_model(task_model, iterations, entity_id):
+    """Measures the read paths of a single, already seeded task model.
+
+    Args:
+        task_model: class. The task entry model to measure.
+        iterations: int. How many times to run each operation.
+        entity_id: str. The exploration the tasks were seeded under.
+
+    Returns:
+        dict. Maps operation name to its summary, as returned by measure().
+    """
+    return {
+        'get_open_tasks': measure(
+            lambda: task_model.get_open_tasks('exploration', entity_id, 1),
+            iterations),
+        'fetch_history_page': measure(
+            lambda: task_model.fetch_history_page(
+                'exploration', entity_id, 1, None, new_to_old=True),
+            iterations),
+        'fetch_history_page_bidirectional': measure(
+            lambda: task_model.fetch_history_page_bidirectional(
+                'exploration', entity_id, 1, None),
+            iterations),
+        'list_open_tasks': measure(
+            lambda: task_model.list_open_tasks_async(
+                'exploration', entity_id, 1).get_result(),
+            iterations),
+        'list_history_page': measure(
+            lambda: task_model.list_history_page_async(
+                'exploration', entity_id, 1, None).get_result(),
+            iterations),
+        'page_sequential': measure(
+            lambda: fetch_page_sequential(task_model, entity_id), iterations),
+        'page_concurrent': measure(
+            lambda: fetch_page_concurrent(task_model, entity_id), iterations),
+    }
+
+
+def run(
+        model_names, num_entities, iterations, entity_id,
+        read_mode=ndb_utils.READ_MODE_EAGER, cache_open_tasks=False,
+        workload_seed=0):
+    """Seeds and benchmarks each requested model in a fresh datastore.
+
+    Args:
+        model_names: list(str). Keys of task_models.TASK_MODELS.
+        num_entities: int. How many tasks to seed per model.
+        iterations: int. How many times to run each operation.
+        entity_id: str. The exploration to seed tasks under.
+        read_mode: str. The READ_MODE the models query with, one of
+            ndb_utils.READ_MODES.
+        cache_open_tasks: bool. Whether get_open_tasks may be served from
+            open_tasks_cache.
+        workload_seed: int. Seeds the tasks written to every model, so each
+            model is benchmarked on the same data.
+
+    Returns:
+        dict. The full report, keyed by model name.
+    """
+    report = {
+        'num_entities': num_entities,
+        'iterations': iterations,
+        'read_mode': read_mode,
+        'cache_open_tasks': cache_open_tasks,
+        'workload_seed': workload_seed,
+        'models': {},
+    }
+    for name in model_names:
+        task_model = task_models.get_task_model(name)
+        bed = setup_testbed()
+        try:
+            with override_attributes(
+                    task_model, READ_MODE=read_mode,
+                    CACHE_OPEN_TASKS=cache_open_tasks):
+                seed_report = seed(
+                    task_model, num_entities, entity_id,
+                    workload_seed=workload_seed)
+                report['models'][name] = (
+                    benchmark_model(task_model, iterations, entity_id))
+                report['models'][name]['seed'] = seed_report
+        finally:
+            bed.deactivate()
+    return report
+
+
+def sweep_cardinality(
+        model_names, cardinalities, iterations, entity_id, workload_seed=0):
+    """Measures how the reads of one exploration scale with its task count.
+
+    Each model is seeded with tasks for a single exploration in increments, up
+    to each of the cardinalities in turn, and its unpaginated get_open_tasks
+    and first history page are measured at every step. get_open_tasks reads
+    past open_tasks_cache, since the point is the cost of the query itself.
+
+    Args:
+        model_names: list(str). Keys of task_models.TASK_MODELS.
+        cardinalities: list(int). The numbers of tasks to measure at.
+        iterations: int. How many times to run each operation per step.
+        entity_id: str. The exploration every task belongs to.
+        workload_seed: int. Seeds the tasks written to every model.
+
+    Returns:
+        dict. The report. For each model, a list with one entry per
+        cardinality, holding the measure() summary of each operation in
+        SWEEP_OPERATIONS plus the number of results it returned.
+    """
+    cardinalities = sorted(set(cardinalities))
+    report = {
+        'cardinalities': cardinalities,
+        'iterations': iterations,
+        'workload_seed': workload_seed,
+        'models': {},
+    }
+    operations = {
+        'get_open_tasks': lambda task_model: task_model.get_open_tasks(
+            'exploration', entity_id, 1),
+        'fetch_history_page': lambda task_model: (
+            task_model.fetch_history_page(
+                'exploration', entity_id, 1, None, new_to_old=True)[0]),
+    }
+    for name in model_names:
+        task_model = task_models.get_task_model(name)
+        points = report['models'][name] = []
+        bed = setup_testbed()
+        try:
+            with override_attributes(task_model, CACHE_OPEN_TASKS=False):
+                num_seeded = 0
+                for stream, num_tasks in enumerate(cardinalities):
+                    seed_report = seed(
+                        task_model, num_tasks - num_seeded, entity_id,
+                        workload_seed=workload_seed, stream=stream)
+                    num_seeded = num_tasks
+                    point = {'num_tasks': num_tasks, 'seed': seed_report}
+                    for operation_name in SWEEP_OPERATIONS:
+                        operation = functools.partial(
+                            operations[operation_name], task_model)
+                        point[operation_name] = measure(operation, iterations)
+                        point[operation_name]['results_per_call'] = len(
+                            operation())
+                    points.append(point)
+        finally:
+            bed.deactivate()
+    return report
+
+
+def get_page_sweep_options(variant, page_size):
+    """Returns the fetch_history_page options of a page size sweep variant.
+
+    Args:
+        variant: str. One of PAGE_SWEEP_VARIANTS: ndb's default batching, a
+            batch_size of page_size, the same with a prefetch_size of
+            page_size, or a batch_size of page_size without cursors.
+        page_size: int. The page size being measured.
+
+    Returns:
+        dict. The keyword arguments to pass to fetch_history_page.
+    """
+    options = {'page_size': page_size}
+    if variant != 'default':
+        options['batch_size'] = page_size
+    if variant == 'batch_prefetch':
+        options['prefetch_size'] = page_size
+    if variant == 'no_cursors':
+        options['produce_cursors'] = False
+    return options
+
+
+def sweep_page_sizes(
+        model_names, num_entities, page_sizes, iterations, entity_id,
+        workload_seed=0):
+    """Measures how the first history page costs grow with its size.
+
+    Each model is seeded once with tasks for a single exploration, then the
+    first page of fetch_history_page is measured at every page size, once per
+    variant in PAGE_SWEEP_VARIANTS.
+
+    Args:
+        model_names: list(str). Keys of task_models.TASK_MODELS.
+        num_entities: int. How many tasks to seed per model.
+        page_sizes: list(int). The page sizes to measure at, each at most
+            ndb_utils.MAX_PAGE_SIZE.
+        iterations: int. How many times to fetch each page.
+        entity_id: str. The exploration every task belongs to.
+        workload_seed: int. Seeds the tasks written to every model.
+
+    Returns:
+        dict. The report. For each model, a list with one entry per page size
+        and variant, holding its measure() summary plus the number of results
+        it returned.
+    """
+    page_sizes = sorted(set(page_sizes))
+    report = {
+        'num_entities': num_entities,
+        'page_sizes': page_sizes,
+        'iterations': iterations,
+        'workload_seed': workload_seed,
+        'models': {},
+    }
+    for name in model_names:
+        task_model = task_models.get_task_model(name)
+        points = report['models'][name] = []
+        bed = setup_testbed()
+        try:
+            seed(
+                task_model, num_entities, entity_id,
+                workload_seed=workload_seed)
+            for page_size in page_sizes:
+                for variant in PAGE_SWEEP_VARIANTS:
+                    operation = functools.partial(
+                        task_model.fetch_history_page, 'exploration',
+                        entity_id, 1, None, new_to_old=True,
+                        **get_page_sweep_options(variant, page_size))
+                    point = measure(operation, iterations)
+                    point.update({
+                        'page_size': page_size,
+                        'variant': variant,
+                        'results_per_call': len(operation()[0]),
+                    })
+                    points.append(point)
+        finally:
+            bed.deactivate()
+    return report
+
+
+def write_page_sweep_csv(report, csv_file):
+    """Writes a page size sweep as CSV, one row per measured point.
+
+    Args:
+        report: dict. As returned by sweep_page_sizes.
+        csv_file: file. Where to write the rows.
+    """
+    writer = csv.writer(csv_file)
+    writer.writerow(PAGE_SWEEP_CSV_COLUMNS)
+    for name, points in sorted(report['models'].items()):
+        for point in points:
+            writer.writerow([name] + [
+                point[column] for column in PAGE_SWEEP_CSV_COLUMNS[1:]])
+
+
+def write_sweep_csv(report, csv_file):
+    """Writes a cardinality sweep as CSV, one row per measured point.
+
+    Args:
+        report: dict. As returned by sweep_cardinality.
+        csv_file: file. Where to write the rows.
+    """
+    writer = csv.writer(csv_file)
+    writer.writerow(SWEEP_CSV_COLUMNS)
+    for name, points in sorted(report['models'].items()):
+        for point in points:
+            for operation_name in SWEEP_OPERATIONS:
+                summary = point[operation_name]
+                writer.writerow(
+                    [name, point['num_tasks'], operation_name] +
+                    [summary[column] for column in SWEEP_CSV_COLUMNS[3:]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--models', default=','.join(task_models.TASK_MODELS),
+        help='Comma-separated models to benchmark (default: all).')
+    parser.add_argument(
+        '--num-entities', type=int, default=1000,
+        help='Number of tasks to seed per model.')
+    parser.add_argument(
+        '--iterations', type=int, default=100,
+        help='Number of times to run each query.')
+    parser.add_argument(
+        '--entity-id', default='foo',
+        help='The exploration id every seeded task belongs to.')
+    parser.add_argument(
+        '--read-mode', default=ndb_utils.READ_MODE_EAGER,
+        choices=ndb_utils.READ_MODES,
+        help='How the models read query results.')
+    parser.add_argument(
+        '--cache-open-tasks', action='store_true',
+        help='Let get_open_tasks read through the memcache cache.')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed of the generated tasks (default: 0).')
+    parser.add_argument(
+        '--sweep', default=None,
+        help=(
+            'Comma-separated task counts for a single exploration, e.g. '
+            '10000,100000,1000000. Runs a cardinality sweep of '
+            'get_open_tasks and fetch_history_page instead of the full '
+            'benchmark; --num-entities is then ignored.'))
+    parser.add_argument(
+        '--page-sweep', default=None,
+        help=(
+            'Comma-separated page sizes, e.g. 10,50,100,500. Runs a page '
+            'size sweep of fetch_history_page over --num-entities tasks of '
+            'a single exploration instead of the full benchmark.'))
+    parser.add_argument(
+        '--sweep-csv', default=None,
+        help='Where to also write the sweep as CSV, for plotting.')
+    parser.add_argument(
+        '--output', default=None,
+        help='Where to write the JSON report (default: stdout).')
+    args = parser.parse_args(argv)
+
+    if args.sweep:
+        report = sweep_cardinality(
+            args.models.split(','),
+            [int(count) for count in args.sweep.split(',')],
+            args.iterations, args.entity_id, workload_seed=args.seed)
+        if args.sweep_csv:
+            with open(args.sweep_csv, 'w') as csv_file:
+                write_sweep_csv(report, csv_file)
+    elif args.page_sweep:
+        report = sweep_page_sizes(
+            args.models.split(','), args.num_entities,
+            [int(size) for size in args.page_sweep.split(',')],
+            args.iterations, args.entity_id, workload_seed=args.seed)
+        if args.sweep_csv:
+            with open(args.sweep_csv, 'w') as csv_file:
+                write_page_sweep_csv(report, csv_file)
+    else:
+        report = run(
+            args.models.split(','), args.num_entities, args.iterations,
+            args.entity_id, read_mode=args.read_mode,
+            cache_open_tasks=args.cache_open_tasks, workload_seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
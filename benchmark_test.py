@@ -0,0 +1,43 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for benchmark."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import benchmark
+
+
+class PercentileTests(test_utils.TestBase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 90), 90)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile(values, 100), 100)
+
+    def test_ranks_are_clamped(self):
+        self.assertEqual(benchmark.percentile([3, 5, 7], 0), 3)
+        self.assertEqual(benchmark.percentile([3, 5, 7], 100), 7)
+
+    def test_small_samples_round_up(self):
+        self.assertEqual(benchmark.percentile([3, 5, 7], 50), 5)
+        self.assertEqual(benchmark.percentile([3, 5, 7, 9], 50), 5)
+        self.assertEqual(benchmark.percentile([3, 5, 7, 9], 51), 7)
@@ -0,0 +1,266 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Seeds task entry models in bulk, in parallel, through a push task queue.
+
+A seed job splits its target count into shards. Each shard is a chain of push
+tasks on the "seed" queue; every task writes up to ENTITIES_PER_TASK tasks
+from the job's workload (see workload.py) through the task model's
+put_multi_async, with up to MAX_PUTS_IN_FLIGHT batches being written at once,
+records its progress, and enqueues the next task of the chain for whatever
+remains.
+
+Seeded writes skip the open task summaries, whose single entity per entity
+version could not keep up with every shard updating it after every batch.
+Each task marks the summaries of the versions it wrote for rebuild instead,
+once it is done.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import datetime
+import json
+import random
+import uuid
+
+from google.appengine.api import taskqueue
+from google.appengine.ext import ndb
+import webapp2
+
+import open_task_summary
+import task_models
+import workload
+
+QUEUE_NAME = 'seed'
+SHARD_WORKER_URL = '/_seed/shard'
+STATUS_URL = '/_seed/status'
+# The number of entities each put RPC writes.
+BATCH_SIZE = 500
+# The number of batches a seed task writes at once.
+MAX_PUTS_IN_FLIGHT = 4
+# The number of entities a single push task writes before handing over to the
+# next task of its shard, to stay well within the task deadline.
+ENTITIES_PER_TASK = 20000
+# The number of entities each shard is responsible for when a job does not
+# specify a shard count.
+DEFAULT_ENTITIES_PER_SHARD = 50000
+MAX_SHARDS = 100
+
+
+class SeedJobModel(ndb.Model):
+    """A request to write a number of random task entries.
+
+    Instances of this class have a random ID.
+    """
+
+    # The name of the task model to seed, a key of task_models.TASK_MODELS.
+    model_name = ndb.StringProperty(required=True, indexed=False)
+    # The total number of task entries to write.
+    target_count = ndb.IntegerProperty(required=True, indexed=False)
+    # The number of shards the job is split into.
+    num_shards = ndb.IntegerProperty(required=True, indexed=False)
+    # The exploration every task is written for, if any.
+    entity_id = ndb.StringProperty(default=None, indexed=False)
+    # Seeds the workload, so a job with the same seed and workload writes the
+    # same explorations with the same popularity.
+    seed = ndb.IntegerProperty(default=0, indexed=False)
+    # Keyword arguments for the job's workload.WorkloadGenerator.
+    workload = ndb.JsonProperty(default=None)
+    # When the job was started.
+    created_on = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+
+class SeedShardModel(ndb.Model):
+    """The progress of one shard of a seed job.
+
+    Instances of this class have an ID with the form:
+        [job_id].[shard_index]
+    """
+
+    # The number of task entries this shard has to write.
+    target_count = ndb.IntegerProperty(required=True, indexed=False)
+    # The number of task entries written so far.
+    written_count = ndb.IntegerProperty(default=0, indexed=False)
+    # When the last write of this shard completed.
+    finished_on = ndb.DateTimeProperty(default=None, indexed=False)
+
+    @classmethod
+    def get_shard_id(cls, job_id, shard_index):
+        """Returns the ID of the given shard of a job."""
+        return '%s.%d' % (job_id, shard_index)
+
+
+def start_job(
+        task_model, target_count, entity_id=None, num_shards=None, seed=None,
+        workload_config=None):
+    """Creates a seed job and enqueues the first task of each of its shards.
+
+    Args:
+        task_model: class. The task entry model to seed.
+        target_count: int. The number of task entries to write.
+        entity_id: str|None. If given, the exploration every task is for.
+        num_shards: int|None. How many shards to split the job into. Defaults
+            to one per DEFAULT_ENTITIES_PER_SHARD entities.
+        seed: int|None. Seeds the workload. Defaults to a random seed.
+        workload_config: dict|None. Keyword arguments for the
+            workload.WorkloadGenerator writing the tasks, other than the
+            task model, seed, stream and entity IDs.
+
+    Returns:
+        str. The ID of the new job.
+    """
+    if num_shards is None:
+        num_shards = -(-target_count // DEFAULT_ENTITIES_PER_SHARD)
+    num_shards = max(1, min(num_shards, MAX_SHARDS, target_count or 1))
+
+    job_id = uuid.uuid4().hex
+    job = SeedJobModel(
+        id=job_id, model_name=task_models.get_task_model_name(task_model),
+        target_count=target_count, num_shards=num_shards, entity_id=entity_id,
+        seed=random.getrandbits(31) if seed is None else seed,
+        workload=workload_config)
+    shards = []
+    for shard_index in range(num_shards):
+        # Spread the remainder over the first shards.
+        shard_count = target_count // num_shards + (
+            1 if shard_index < target_count % num_shards else 0)
+        shards.append(SeedShardModel(
+            id=SeedShardModel.get_shard_id(job_id, shard_index),
+            target_count=shard_count))
+    ndb.put_multi([job] + shards)
+
+    tasks = [
+        taskqueue.Task(url=SHARD_WORKER_URL, params={
+            'job_id': job_id,
+            'shard_index': shard_index,
+        })
+        for shard_index in range(num_shards)
+    ]
+    queue = taskqueue.Queue(QUEUE_NAME)
+    for i in range(0, len(tasks), taskqueue.MAX_TASKS_PER_ADD):
+        queue.add(tasks[i:i + taskqueue.MAX_TASKS_PER_ADD])
+    return job_id
+
+
+def run_shard_task(job_id, shard_index):
+    """Writes the next part of a shard and enqueues the task for the rest.
+
+    Args:
+        job_id: str. The ID of the seed job.
+        shard_index: int. Which shard of the job to work on.
+    """
+    job = SeedJobModel.get_by_id(job_id)
+    shard = SeedShardModel.get_by_id(
+        SeedShardModel.get_shard_id(job_id, shard_index))
+    if job is None or shard is None:
+        return
+    task_model = task_models.get_task_model(job.model_name)
+
+    count = min(shard.target_count - shard.written_count, ENTITIES_PER_TASK)
+    if count <= 0:
+        return
+    # Every task of the job draws from its own stream of the workload, so
+    # that retried tasks rewrite the same entities rather than new ones.
+    generator = workload.WorkloadGenerator(
+        task_model, seed=job.seed,
+        stream='%d.%d' % (shard_index, shard.written_count),
+        entity_ids=[job.entity_id] if job.entity_id else None,
+        **(job.workload or {}))
+    # Writing through the model keeps the counters and caches in step with
+    # the seeded tasks, as task_hooks does for every other write.
+    in_flight = collections.deque()
+    entity_keys = set()
+    for batch in generator.generate_batches(count, BATCH_SIZE):
+        if len(in_flight) >= MAX_PUTS_IN_FLIGHT:
+            in_flight.popleft().get_result()
+        entity_keys.update(
+            task_model.get_entity_key(
+                entity.entity_type, entity.entity_id, entity.entity_version)
+            for entity in batch)
+        in_flight.append(task_model.put_multi_async(
+            batch, update_last_updated_time=False, update_summaries=False))
+    while in_flight:
+        in_flight.popleft().get_result()
+    open_task_summary.mark_for_rebuild_async(
+        task_model, entity_keys).get_result()
+
+    shard.written_count += count
+    shard.finished_on = datetime.datetime.utcnow()
+    shard.put()
+    if shard.written_count < shard.target_count:
+        taskqueue.add(
+            queue_name=QUEUE_NAME, url=SHARD_WORKER_URL,
+            params={'job_id': job_id, 'shard_index': shard_index})
+
+
+def get_job_status(job_id):
+    """Summarizes the progress of a seed job.
+
+    Args:
+        job_id: str. The ID of the seed job.
+
+    Returns:
+        dict|None. The status of the job, or None if there is no such job.
+    """
+    job = SeedJobModel.get_by_id(job_id)
+    if job is None:
+        return None
+    shards = ndb.get_multi([
+        ndb.Key(SeedShardModel, SeedShardModel.get_shard_id(job_id, i))
+        for i in range(job.num_shards)])
+    shards = [shard for shard in shards if shard is not None]
+
+    written_count = sum(shard.written_count for shard in shards)
+    finished_times = [
+        shard.finished_on for shard in shards if shard.finished_on]
+    last_write = max(finished_times) if finished_times else job.created_on
+    elapsed_secs = (last_write - job.created_on).total_seconds()
+    return {
+        'job_id': job_id,
+        'model': job.model_name,
+        'target_count': job.target_count,
+        'written_count': written_count,
+        'num_shards': job.num_shards,
+        'shards_done': sum(
+            1 for shard in shards
+            if shard.written_count >= shard.target_count),
+        'done': written_count >= job.target_count,
+        'elapsed_secs': elapsed_secs,
+        'entities_per_sec': (
+            written_count / elapsed_secs if elapsed_secs > 0 else None),
+    }
+
+
+class SeedShardWorker(webapp2.RequestHandler):
+    """Runs a single task of a seed job shard."""
+
+    def post(self):
+        run_shard_task(
+            self.request.get('job_id'), int(self.request.get('shard_index')))
+
+
+class SeedStatusPage(webapp2.RequestHandler):
+    """Reports the progress and throughput of a seed job as JSON."""
+
+    def get(self):
+        status = get_job_status(self.request.get('job_id'))
+        if status is None:
+            self.abort(404)
+        self.response.content_type = 'application/json'
+        self.response.out.write(json.dumps(status))
@@ -0,0 +1,92 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for bulk_seed."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import bulk_seed
+import open_task_summary
+import task_counters
+import task_entry
+
+_TARGET_COUNT = 50
+
+
+class RunShardTaskTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(RunShardTaskTests, self).setUp()
+        self.constants = (
+            bulk_seed.BATCH_SIZE, bulk_seed.MAX_PUTS_IN_FLIGHT,
+            bulk_seed.ENTITIES_PER_TASK)
+        # Small batches, so that several puts are in flight at once.
+        bulk_seed.BATCH_SIZE = 7
+        bulk_seed.MAX_PUTS_IN_FLIGHT = 2
+        bulk_seed.ENTITIES_PER_TASK = 30
+        self.job_id = bulk_seed.start_job(
+            self.TASK_MODEL, _TARGET_COUNT, entity_id='foo', num_shards=1,
+            seed=1, workload_config={'num_versions': 1})
+        self.entity_key = self.TASK_MODEL.get_entity_key(
+            task_entry.ENTITY_TYPE_EXPLORATION, 'foo', 1)
+
+    def tearDown(self):
+        (bulk_seed.BATCH_SIZE, bulk_seed.MAX_PUTS_IN_FLIGHT,
+         bulk_seed.ENTITIES_PER_TASK) = self.constants
+        super(RunShardTaskTests, self).tearDown()
+
+    def _get_num_queued_tasks(self):
+        return len(self.taskqueue_stub.get_filtered_tasks(
+            queue_names=[bulk_seed.QUEUE_NAME]))
+
+    def _count_tasks(self):
+        return task_counters.count_tasks_async(
+            self.TASK_MODEL, self.entity_key, task_entry.STATUS_CHOICES,
+            task_entry.TASK_TYPES).get_result()
+
+    def test_shards_write_their_tasks_in_a_chain(self):
+        self.assertEqual(self._get_num_queued_tasks(), 1)
+
+        bulk_seed.run_shard_task(self.job_id, 0)
+        self.assertEqual(
+            bulk_seed.get_job_status(self.job_id)['written_count'],
+            bulk_seed.ENTITIES_PER_TASK)
+        self.assertEqual(self._get_num_queued_tasks(), 2)
+
+        bulk_seed.run_shard_task(self.job_id, 0)
+        self.assertTrue(bulk_seed.get_job_status(self.job_id)['done'])
+        self.assertEqual(self._get_num_queued_tasks(), 2)
+
+    def test_counters_follow_seeded_tasks(self):
+        bulk_seed.run_shard_task(self.job_id, 0)
+        bulk_seed.run_shard_task(self.job_id, 0)
+        num_tasks = self.TASK_MODEL.query().count()
+        self.assertGreater(num_tasks, 0)
+        self.assertEqual(self._count_tasks(), num_tasks)
+
+    def test_seeded_summaries_are_left_for_readers_to_rebuild(self):
+        bulk_seed.run_shard_task(self.job_id, 0)
+        summary = open_task_summary.OpenTaskSummaryModel.get_by_id(
+            open_task_summary.OpenTaskSummaryModel.get_summary_id(
+                self.TASK_MODEL, self.entity_key))
+        self.assertIsNotNone(summary)
+        self.assertFalse(summary.rebuilt)
+        self.assertEqual(summary.get_open_task_ids(), [])
@@ -0,0 +1,151 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Exports task entries from a deployed app to a newline-delimited JSON file.
+
+    python export_tasks.py --host my-app.appspot.com --model real \\
+        --entity-id foo --entity-version 1 --output foo.ndjson
+
+Reads through remote_api (enabled in app.yaml), so it needs credentials for
+an admin of the app. After every batch, the cursor and the size of the output
+so far are saved to a checkpoint file (the output path plus ".checkpoint").
+Running the same command again resumes from the checkpoint, first truncating
+anything written after it, so no entity is exported twice.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+sys.path.append('../oppia_tools/google_appengine_1.9.67/google_appengine')
+sys.path.append('../oppia_tools/google-cloud-sdk-251.0.0')
+
+import argparse
+import json
+import os
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext.remote_api import remote_api_stub
+
+import task_export
+import task_models
+
+
+def load_checkpoint(checkpoint_path):
+    """Returns the saved progress of an export, or None to start afresh."""
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """Atomically replaces the saved progress of an export."""
+    temp_path = checkpoint_path + '.tmp'
+    with open(temp_path, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.rename(temp_path, checkpoint_path)
+
+
+def export(query, output_path, batch_size):
+    """Exports a query to a file, resuming from its checkpoint if any.
+
+    Args:
+        query: ndb.Query. The query to export.
+        output_path: str. The NDJSON file to write.
+        batch_size: int. The number of entities fetched per batch.
+
+    Returns:
+        dict. The final checkpoint.
+    """
+    checkpoint_path = output_path + '.checkpoint'
+    checkpoint = load_checkpoint(checkpoint_path) or {
+        'cursor': None, 'offset': 0, 'count': 0, 'done': False}
+    if checkpoint['done']:
+        return checkpoint
+
+    with open(output_path, 'ab') as out:
+        # Drop whatever was written after the last checkpoint. Writes in
+        # append mode then continue from there.
+        out.truncate(checkpoint['offset'])
+        resumed_count = checkpoint['count']
+
+        def _on_batch(cursor, num_written):
+            out.flush()
+            os.fsync(out.fileno())
+            checkpoint.update({
+                'cursor': cursor and cursor.urlsafe(),
+                'offset': out.tell(),
+                'count': resumed_count + num_written,
+            })
+            save_checkpoint(checkpoint_path, checkpoint)
+
+        task_export.export_ndjson(
+            query, out,
+            start_cursor=(
+                checkpoint['cursor'] and Cursor(urlsafe=checkpoint['cursor'])),
+            batch_size=batch_size, on_batch=_on_batch)
+
+    checkpoint['done'] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--host', required=True,
+        help='The host of the app, e.g. my-app.appspot.com.')
+    parser.add_argument(
+        '--model', required=True, choices=list(task_models.TASK_MODELS),
+        help='The task model to export.')
+    parser.add_argument(
+        '--entity-type', default='exploration',
+        help='The entity type of --entity-id (default: exploration).')
+    parser.add_argument(
+        '--entity-id', default=None,
+        help='Only export the tasks of this entity (default: all tasks).')
+    parser.add_argument(
+        '--entity-version', type=int, default=1,
+        help='The version of --entity-id to export (default: 1).')
+    parser.add_argument(
+        '--include-deleted', action='store_true',
+        help='Also export deleted tasks.')
+    parser.add_argument(
+        '--batch-size', type=int, default=task_export.DEFAULT_BATCH_SIZE,
+        help='Number of entities fetched per batch.')
+    parser.add_argument(
+        '--output', required=True,
+        help='The NDJSON file to write, or resume writing.')
+    args = parser.parse_args(argv)
+
+    remote_api_stub.ConfigureRemoteApiForOAuth(args.host, '/_ah/remote_api')
+    query = task_export.get_export_query(
+        task_models.get_task_model(args.model),
+        entity_type=args.entity_type if args.entity_id else None,
+        entity_id=args.entity_id,
+        entity_version=args.entity_version if args.entity_id else None,
+        include_deleted=args.include_deleted)
+    checkpoint = export(query, args.output, args.batch_size)
+    print('Exported %d tasks to %s' % (checkpoint['count'], args.output))
+
+
+if __name__ == '__main__':
+    main()
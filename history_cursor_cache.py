@@ -0,0 +1,148 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memcache-backed index of the cursors at which history pages start.
+
+Seeking to page N of an entity's history stores the start cursor of every
+PAGE_INTERVAL-th page it walks past, so later seeks start from the nearest
+stored cursor and walk fewer than PAGE_INTERVAL pages, with a single keys-only
+query. Cursors are keyed by the task model's kind, the entity key built by
+get_entity_key, the sort direction, the page size and a generation number.
+Invalidating an entity's cursors increments its generation rather than
+deleting them, so cursors computed before a write are never read again.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import time
+
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+import ndb_utils
+
+# Every how many pages a start cursor is stored.
+PAGE_INTERVAL = 10
+# How long stored cursors are kept, as a backstop for writes that bypass the
+# task models' put and delete methods.
+CURSOR_TTL_SECS = 60 * 60
+
+
+def _get_generation_key(task_model, entity_key):
+    """Returns the memcache key for the generation of an entity's cursors."""
+    return 'history_cursors_gen:%s:%s' % (
+        task_model._get_kind(), entity_key)  # pylint: disable=protected-access
+
+
+def _get_cursor_key(
+        task_model, entity_key, new_to_old, page_size, generation, page):
+    """Returns the memcache key for the start cursor of a history page."""
+    return 'history_cursors:%s:%s:%s:%d:%d:%d' % (
+        task_model._get_kind(), entity_key,  # pylint: disable=protected-access
+        'desc' if new_to_old else 'asc', page_size, generation, page)
+
+
+def _get_initial_generation():
+    """Returns a generation which cursors stored before it was evicted from
+    memcache cannot have.
+    """
+    return int(time.time() * 1000)
+
+
+@ndb.tasklet
+def _get_generation_async(task_model, entity_key):
+    """Returns the current generation of an entity's cursors."""
+    context = ndb.get_context()
+    generation_key = _get_generation_key(task_model, entity_key)
+    generation = yield context.memcache_get(generation_key)
+    if generation is None:
+        generation = _get_initial_generation()
+        added = yield context.memcache_add(generation_key, generation)
+        if not added:
+            generation = yield context.memcache_get(generation_key)
+    raise ndb.Return(generation)
+
+
+@ndb.tasklet
+def seek_async(task_model, entity_key, query, page_size, page, new_to_old):
+    """Returns the cursor at which a page of an entity's history starts.
+
+    Args:
+        task_model: class. The task entry model being read.
+        entity_key: str. The entity key, as built by get_entity_key.
+        query: ndb.Query. The history query, sorted in the direction given by
+            new_to_old.
+        page_size: int. The number of tasks per page.
+        page: int. The page to seek to, starting from 1.
+        new_to_old: bool. The sort direction of query.
+
+    Returns:
+        ndb.Future. Resolves to the Cursor at which the page starts, None for
+        the first page. Pages past the end start at the end of the results.
+    """
+    if page <= 1:
+        raise ndb.Return(None)
+    context = ndb.get_context()
+    generation = yield _get_generation_async(task_model, entity_key)
+    stored_pages = range(1 + PAGE_INTERVAL, page + 1, PAGE_INTERVAL)
+    urlsafe_cursors = yield [
+        context.memcache_get(_get_cursor_key(
+            task_model, entity_key, new_to_old, page_size, generation,
+            stored_page))
+        for stored_page in stored_pages
+    ]
+
+    start_page, cursor = 1, None
+    for stored_page, urlsafe_cursor in zip(stored_pages, urlsafe_cursors):
+        if urlsafe_cursor is not None:
+            start_page, cursor = stored_page, Cursor(urlsafe=urlsafe_cursor)
+
+    while start_page < page:
+        next_page = min(
+            page, start_page + PAGE_INTERVAL - (start_page - 1) % PAGE_INTERVAL)
+        _, end_cursor, more = yield ndb_utils.fetch_page_async(
+            query, (next_page - start_page) * page_size, start_cursor=cursor,
+            read_mode=ndb_utils.READ_MODE_KEYS_ONLY)
+        if end_cursor is None:
+            break
+        start_page, cursor = next_page, end_cursor
+        if (start_page - 1) % PAGE_INTERVAL == 0:
+            yield context.memcache_set(
+                _get_cursor_key(
+                    task_model, entity_key, new_to_old, page_size,
+                    generation, start_page),
+                cursor.urlsafe(), time=CURSOR_TTL_SECS)
+        if not more:
+            break
+    raise ndb.Return(cursor)
+
+
+@ndb.tasklet
+def invalidate_async(task_model, entity_keys):
+    """Invalidates the stored history cursors of the given entities.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        entity_keys: iterable(str). The affected entity keys.
+    """
+    context = ndb.get_context()
+    yield [
+        context.memcache_incr(
+            _get_generation_key(task_model, entity_key),
+            initial_value=_get_initial_generation())
+        for entity_key in set(entity_keys)
+    ]
@@ -0,0 +1,114 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for history_cursor_cache."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+import history_cursor_cache
+import ndb_utils
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+_PAGE_SIZE = 3
+# Enough tasks for more than two stored cursors.
+_NUM_TASKS = _PAGE_SIZE * (2 * history_cursor_cache.PAGE_INTERVAL + 5)
+
+
+class SeekTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(SeekTests, self).setUp()
+        self.put_tasks(self.TASK_MODEL, [
+            self.create_task(
+                self.TASK_MODEL, 'state%03d' % i, task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(minutes=i))
+            for i in range(_NUM_TASKS)
+        ])
+        self.entity_key = self.TASK_MODEL.get_entity_key(
+            'exploration', 'foo', 1)
+
+    def _get_query(self):
+        return self.TASK_MODEL.get_history_query('exploration', 'foo', 1, True)
+
+    def _get_all_ids(self):
+        return [key.id() for key in self._get_query().fetch(keys_only=True)]
+
+    def _get_page_ids(self, page):
+        """Seeks to a page and returns the IDs of the tasks on it."""
+        cursor = history_cursor_cache.seek_async(
+            self.TASK_MODEL, self.entity_key, self._get_query(), _PAGE_SIZE,
+            page, True).get_result()
+        keys, _, _ = ndb_utils.fetch_page_async(
+            self._get_query(), _PAGE_SIZE, start_cursor=cursor,
+            read_mode=ndb_utils.READ_MODE_KEYS_ONLY).get_result()
+        return [key.id() for key in keys]
+
+    def _get_expected_page_ids(self, page):
+        start = (page - 1) * _PAGE_SIZE
+        return self._get_all_ids()[start:start + _PAGE_SIZE]
+
+    def test_first_page_starts_without_a_cursor(self):
+        self.assertIsNone(history_cursor_cache.seek_async(
+            self.TASK_MODEL, self.entity_key, self._get_query(), _PAGE_SIZE,
+            1, True).get_result())
+
+    def test_every_page_starts_where_it_should(self):
+        num_pages = _NUM_TASKS // _PAGE_SIZE
+        for page in range(1, num_pages + 1):
+            self.assertEqual(
+                self._get_page_ids(page), self._get_expected_page_ids(page))
+
+    def test_pages_are_correct_when_read_from_stored_cursors(self):
+        last_page = _NUM_TASKS // _PAGE_SIZE
+        self.assertEqual(
+            self._get_page_ids(last_page),
+            self._get_expected_page_ids(last_page))
+        for page in (last_page, last_page - 1, 12, 11, 2):
+            self.assertEqual(
+                self._get_page_ids(page), self._get_expected_page_ids(page))
+
+    def test_pages_past_the_end_are_empty(self):
+        self.assertEqual(self._get_page_ids(_NUM_TASKS), [])
+
+    def test_writes_invalidate_stored_cursors(self):
+        self.assertEqual(
+            self._get_page_ids(12), self._get_expected_page_ids(12))
+        self.put_tasks(self.TASK_MODEL, [self.create_task(
+            self.TASK_MODEL, 'newest', task_entry.STATUS_RESOLVED,
+            _BASE_TIME + datetime.timedelta(days=1))])
+        self.assertEqual(
+            self._get_page_ids(12), self._get_expected_page_ids(12))
+
+    def test_page_sizes_do_not_share_cursors(self):
+        self.assertEqual(
+            self._get_page_ids(12), self._get_expected_page_ids(12))
+        cursor = history_cursor_cache.seek_async(
+            self.TASK_MODEL, self.entity_key, self._get_query(),
+            _PAGE_SIZE + 1, 12, True).get_result()
+        keys, _, _ = ndb_utils.fetch_page_async(
+            self._get_query(), 1, start_cursor=cursor,
+            read_mode=ndb_utils.READ_MODE_KEYS_ONLY).get_result()
+        self.assertEqual(
+            [key.id() for key in keys],
+            self._get_all_ids()[11 * (_PAGE_SIZE + 1):][:1])
@@ -0,0 +1,266 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reports the index rows and bytes each put of a task model writes.
+
+    python index_cost.py --models base,real --index-yaml index.yaml
+
+For every model, the report lists the built-in and composite index rows a new
+entity writes, an estimate of their size, the resulting write amplification,
+and the indexed properties and composite indexes that none of the model's
+queries use. Row sizes are estimates: the datastore's exact on-disk encoding is
+not public, so each row is costed as its key, kind, property name and values
+plus a fixed overhead.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+sys.path.append('../oppia_tools/google_appengine_1.9.67/google_appengine')
+sys.path.append('../oppia_tools/google-cloud-sdk-251.0.0')
+
+import argparse
+import datetime
+import json
+import os
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.api import datastore_index
+from google.appengine.datastore import datastore_query
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+import migration_jobs
+import task_api
+import task_models
+
+# Fixed per-row cost covering the app ID, namespace and row framing.
+ROW_OVERHEAD_BYTES = 32
+# Every entity is also written to the built-in index of its kind.
+KIND_INDEX_ROWS = 1
+# Each indexed property is written to an ascending and a descending index.
+ROWS_PER_INDEXED_PROPERTY = 2
+
+
+def _get_value_bytes(value):
+    """Estimates the encoded size of a single property value."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime.datetime)):
+        return 8
+    if isinstance(value, bytes):
+        return len(value)
+    return len(('%s' % value).encode('utf-8'))
+
+
+def _get_query_shapes(task_model):
+    """Returns the (equality properties, orders) of every query of a model.
+
+    The queries are built by the model's own query builders, so the report
+    follows the code rather than a hand-maintained list.
+
+    Returns:
+        list(tuple(frozenset(str), tuple(tuple(str, str)))). For each query,
+        the names of its equality-filtered properties and its (name, direction)
+        sort orders.
+    """
+    queries = [
+        task_model.get_open_tasks_query('exploration', 'id', 1),
+        task_model.get_history_query('exploration', 'id', 1, True),
+        task_model.get_history_query('exploration', 'id', 1, False),
+        task_model.get_all(),
+        migration_jobs.get_tombstones_query(
+            task_model, datetime.datetime.utcnow()),
+        migration_jobs.get_archivable_query(
+            task_model, datetime.datetime.utcnow()),
+        task_api.get_latest_update_query(task_model, 'exploration', 'id', 1),
+    ]
+    return [
+        (frozenset(_get_filter_names(query.filters)),
+         tuple(_get_orders(query.orders)))
+        for query in queries
+    ]
+
+
+def _get_filter_names(node):
+    """Yields the property names an ndb filter node filters on for equality.
+
+    Properties filtered with an inequality are also sorted on first, so the
+    query's orders already account for them.
+    """
+    if node is None:
+        return
+    if isinstance(node, ndb.FilterNode):
+        name, op, _ = node.__getnewargs__()
+        if op == '=':
+            yield name
+        return
+    for child in node:
+        for name in _get_filter_names(child):
+            yield name
+
+
+def _get_orders(order):
+    """Yields the (property name, direction) pairs of a query order."""
+    if order is None:
+        return
+    if isinstance(order, datastore_query.CompositeOrder):
+        for child in order.orders:
+            for pair in _get_orders(child):
+                yield pair
+        return
+    yield (
+        order.prop,
+        'desc' if order.direction == datastore_query.PropertyOrder.DESCENDING
+        else 'asc')
+
+
+def _is_index_used(index_properties, query_shapes):
+    """Returns whether any query can be served by a composite index.
+
+    A query can use an index whose leading properties are exactly its equality
+    filters, in any order, followed by its sort orders.
+    """
+    for equality_names, orders in query_shapes:
+        num_equalities = len(equality_names)
+        if (frozenset(name for name, _ in index_properties[:num_equalities]) ==
+                equality_names and
+                tuple(index_properties[num_equalities:][:len(orders)]) ==
+                orders):
+            return True
+    return False
+
+
+def load_composite_indexes(index_yaml_path, kind):
+    """Reads the composite indexes declared for a kind.
+
+    Args:
+        index_yaml_path: str. The path to index.yaml.
+        kind: str. The kind whose indexes to return.
+
+    Returns:
+        list(list(tuple(str, str))). The (name, direction) properties of each
+        composite index on the kind.
+    """
+    with open(index_yaml_path) as index_yaml:
+        definitions = datastore_index.ParseIndexDefinitions(index_yaml)
+    return [
+        [(prop.name, prop.direction or 'asc') for prop in index.properties]
+        for index in (definitions.indexes or [])
+        if index.kind == kind
+    ]
+
+
+def analyze(task_model, index_yaml_path):
+    """Computes the index cost of a put of a typical new entity of a model.
+
+    Args:
+        task_model: class. The task entry model to analyze.
+        index_yaml_path: str. The path to index.yaml.
+
+    Returns:
+        dict. The report for the model.
+    """
+    kind = task_model._get_kind()  # pylint: disable=protected-access
+    entity = task_model.get_random_task('e' * 32)
+    task_model.update_timestamps([entity])
+    entity_bytes = len(ndb.model_to_protobuf(entity).Encode())
+    key_bytes = len(kind) + len(entity.key.id())
+    values = {
+        prop._name: prop._get_for_dict(entity)  # pylint: disable=protected-access
+        for prop in task_model._properties.values()  # pylint: disable=protected-access
+    }
+    indexed_names = sorted(
+        prop._name for prop in task_model._properties.values()  # pylint: disable=protected-access
+        if prop._indexed)  # pylint: disable=protected-access
+
+    builtin_rows = KIND_INDEX_ROWS + (
+        ROWS_PER_INDEXED_PROPERTY * len(indexed_names))
+    builtin_bytes = (ROW_OVERHEAD_BYTES + key_bytes) * KIND_INDEX_ROWS + sum(
+        ROWS_PER_INDEXED_PROPERTY * (
+            ROW_OVERHEAD_BYTES + key_bytes + len(name) +
+            _get_value_bytes(values[name]))
+        for name in indexed_names)
+
+    query_shapes = _get_query_shapes(task_model)
+    composite_indexes = load_composite_indexes(index_yaml_path, kind)
+    composite_bytes = sum(
+        ROW_OVERHEAD_BYTES + key_bytes + sum(
+            _get_value_bytes(values.get(name)) for name, _ in index)
+        for index in composite_indexes)
+
+    queried_names = set()
+    for equality_names, orders in query_shapes:
+        queried_names.update(equality_names)
+        queried_names.update(name for name, _ in orders)
+    unused_names = sorted(set(indexed_names) - queried_names)
+
+    index_rows = builtin_rows + len(composite_indexes)
+    index_bytes = builtin_bytes + composite_bytes
+    return {
+        'kind': kind,
+        'entity_bytes': entity_bytes,
+        'indexed_properties': indexed_names,
+        'builtin_index_rows': builtin_rows,
+        'composite_index_rows': len(composite_indexes),
+        'index_rows_per_put': index_rows,
+        'index_bytes_per_put': index_bytes,
+        # Rows written per put, counting the entity itself as one.
+        'write_amplification': index_rows + 1,
+        'bytes_amplification': (entity_bytes + index_bytes) / entity_bytes,
+        'unused_indexed_properties': unused_names,
+        'rows_saved_by_unindexing_unused': (
+            ROWS_PER_INDEXED_PROPERTY * len(unused_names)),
+        'unused_composite_indexes': [
+            ['%s %s' % prop for prop in index]
+            for index in composite_indexes
+            if not _is_index_used(index, query_shapes)],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--models', default=','.join(task_models.TASK_MODELS),
+        help='Comma-separated models to analyze (default: all).')
+    parser.add_argument(
+        '--index-yaml',
+        default=os.path.join(os.path.dirname(__file__), 'index.yaml'),
+        help='Path to the index.yaml declaring the composite indexes.')
+    args = parser.parse_args(argv)
+
+    # Building keys and queries needs an application ID, but no RPCs are made.
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.setup_env(app_id='index-cost')
+    try:
+        report = {
+            name: analyze(task_models.get_task_model(name), args.index_yaml)
+            for name in args.models.split(',')
+        }
+    finally:
+        bed.deactivate()
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
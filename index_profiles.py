@@ -0,0 +1,80 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Deployment profiles declaring which task entry properties are queryable.
+
+The task models consult the active profile when declaring their properties,
+so a property which is not queryable under it is declared with indexed=False.
+The profile is chosen with the TASK_INDEX_PROFILE environment variable (see
+app.yaml). Entities written before a profile change keep their old index rows
+until they are rewritten by the reindex job in migration_jobs.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+
+# Every property keeps the indexing declared by its model.
+PROFILE_FULL = 'full'
+# Only the properties the models' queries filter or sort on are indexed.
+PROFILE_LEAN = 'lean'
+PROFILES = (
+    PROFILE_FULL,
+    PROFILE_LEAN,
+)
+
+# Maps each profile to the queryable properties of each model kind. Kinds
+# missing from a profile keep the indexing declared by their model.
+QUERYABLE_PROPERTIES = {
+    PROFILE_FULL: {},
+    PROFILE_LEAN: {
+        'TaskEntryModel': frozenset([
+            'entity_type', 'entity_id', 'entity_version', 'status',
+            'last_updated', 'deleted']),
+        'TaskEntryWithComputedPropertyModel': frozenset([
+            'entity_key', 'status', 'last_updated', 'deleted']),
+        'TaskEntryWithRealPropertyModel': frozenset([
+            'entity_key', 'status', 'last_updated', 'deleted']),
+    },
+}
+
+
+def get_active_profile():
+    """Returns the profile selected by the TASK_INDEX_PROFILE variable.
+
+    Raises:
+        Exception: if the variable names an unknown profile.
+    """
+    profile = os.environ.get('TASK_INDEX_PROFILE') or PROFILE_FULL
+    if profile not in PROFILES:
+        raise Exception('Unknown task index profile %r' % profile)
+    return profile
+
+
+def is_indexed(kind, property_name, profile=None):
+    """Returns whether a property should be indexed under a profile.
+
+    Args:
+        kind: str. The kind of the model declaring the property.
+        property_name: str. The name of the property.
+        profile: str|None. One of PROFILES. Defaults to the active profile.
+
+    Returns:
+        bool. Whether to declare the property with indexed=True.
+    """
+    queryable = QUERYABLE_PROPERTIES[profile or get_active_profile()].get(kind)
+    return queryable is None or property_name in queryable
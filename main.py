@@ -17,81 +17,225 @@ sys.path.append('../oppia_tools/google_appengine_1.9.67/google_appengine')
 sys.path.append('../oppia_tools/google-cloud-sdk-251.0.0')
 
 import os
-import re
-import time
 
+from google.appengine.api import datastore_errors
 from google.appengine.datastore.datastore_query import Cursor
 from google.appengine.ext.webapp import template
 import webapp2
 
+import batch_jobs
+import bulk_seed
+import migration_jobs
+import ndb_utils
+import rpc_trace
+import shadow_reads
+import task_api
+import task_archive
+import task_export
 import task_entry
 import task_entry_with_computed_property
 import task_entry_with_real_property
 
 
-class PageBase(webapp2.RequestHandler):
+# The query parameters of GeneratePageBase which configure the workload, with
+# the workload.WorkloadGenerator arguments they set and how to parse them.
+WORKLOAD_PARAMS = (
+    ('explorations', 'num_entity_ids', int),
+    ('zipf', 'zipf_exponent', float),
+    ('versions', 'num_versions', int),
+    ('spread_days', 'last_updated_spread_days', float),
+)
+
+
+# The query parameters of PageBase which size its history reads, with the
+# largest value each accepts. Larger values are clamped to it.
+PAGE_OPTION_PARAMS = (
+    ('page_size', ndb_utils.MAX_PAGE_SIZE),
+    ('batch_size', ndb_utils.MAX_BATCH_SIZE),
+    ('prefetch_size', ndb_utils.MAX_BATCH_SIZE),
+)
+# How many numbered history pages are linked on each side of the current one.
+PAGE_LINKS_AROUND_CURRENT = 2
+
+
+def get_page_numbers(current_page, num_tasks, page_size):
+    """Returns the numbers of the history pages to link to.
+
+    Args:
+        current_page: int. The page being shown, starting from 1.
+        num_tasks: int. The number of resolved tasks.
+        page_size: int. The number of tasks per page.
+
+    Returns:
+        list(int). The first and last pages, and those around current_page,
+        in order.
+    """
+    num_pages = max(1, (num_tasks + page_size - 1) // page_size)
+    return sorted(set([1, num_pages]) | set(range(
+        max(1, current_page - PAGE_LINKS_AROUND_CURRENT),
+        min(num_pages, current_page + PAGE_LINKS_AROUND_CURRENT) + 1)))
+
+
+class PageBase(rpc_trace.TracedRequestHandler):
     def get(self):
-        urlsafe_cursor = self.request.get('cursor') or None
-        cursor = urlsafe_cursor and Cursor(urlsafe=urlsafe_cursor)
-
-        start = time.time()
-        open_tasks = (
-            self.TASK_MODEL.get_open_tasks('exploration', 'foo', 1))
-        end = time.time()
-        open_fetch_duration = end - start
-
-        start = time.time()
-        resolved_tasks, cursor_next, has_more_next = (
-            self.TASK_MODEL.fetch_history_page(
-                'exploration', 'foo', 1, cursor, new_to_old=True))
-        _, cursor_prev, has_more_prev = (
-            self.TASK_MODEL.fetch_history_page(
-                'exploration', 'foo', 1, cursor, new_to_old=False))
-        resolved_tasks = list(resolved_tasks)
-        end = time.time()
-        resolved_fetch_duration = end - start
+        page_options = {}
+        try:
+            urlsafe_cursor = self.request.get('cursor') or None
+            cursor = urlsafe_cursor and Cursor(urlsafe=urlsafe_cursor)
+            urlsafe_open_cursor = self.request.get('open_cursor') or None
+            open_cursor = (
+                urlsafe_open_cursor and Cursor(urlsafe=urlsafe_open_cursor))
+            for param, limit in PAGE_OPTION_PARAMS:
+                if self.request.get(param):
+                    page_options[param] = max(
+                        1, min(int(self.request.get(param)), limit))
+            page_number = (
+                max(1, int(self.request.get('page')))
+                if self.request.get('page') else 0)
+        except (ValueError, datastore_errors.BadValueError):
+            self.abort(
+                400, detail='Malformed page parameters or cursors')
+        backward = self.request.get('dir') == 'prev'
+        page_size = page_options.get(
+            'page_size', task_entry.HISTORY_PAGE_SIZE)
 
+        resolved_count_future = self.TASK_MODEL.count_tasks_async(
+            'exploration', 'foo', 1, status=task_entry.STATUS_RESOLVED)
+        # The counters include archived tasks, which this page's history
+        # does not reach.
+        archived_count_future = task_archive.count_archived_async(
+            self.TASK_MODEL,
+            self.TASK_MODEL.get_entity_key('exploration', 'foo', 1))
+        open_count_future = self.TASK_MODEL.count_tasks_async(
+            'exploration', 'foo', 1, status=task_entry.STATUS_OPEN)
+        if page_number:
+            resolved_tasks_total = max(0, (
+                resolved_count_future.get_result() -
+                archived_count_future.get_result()))
+            # Seeking walks the history up to the page, so pages past the
+            # last one are not sought.
+            page_number = min(page_number, max(
+                1, (resolved_tasks_total + page_size - 1) // page_size))
+            # Numbered pages start from a cursor found through the cursor
+            # cache, rather than one carried by the link.
+            with rpc_trace.span('seek_history_page'):
+                cursor = self.TASK_MODEL.get_history_page_cursor_async(
+                    'exploration', 'foo', 1, page_number,
+                    page_size=page_size).get_result()
+            backward = False
+
+        # Issue both queries before waiting on either of them, so the page
+        # costs roughly as much as the slowest one.
+        with rpc_trace.span('fetch_all'):
+            open_future = self.TASK_MODEL.list_open_tasks_page_async(
+                'exploration', 'foo', 1, open_cursor)
+            history_future = self.TASK_MODEL.list_history_page_async(
+                'exploration', 'foo', 1, cursor, backward=backward,
+                **page_options)
+            shadow_futures = self.shadow_reads_async(
+                open_future, open_cursor, history_future, cursor, backward,
+                page_options)
+
+            with rpc_trace.span('open_tasks') as open_span:
+                open_tasks, open_cursor_next, has_more_open = (
+                    open_future.get_result())
+
+            with rpc_trace.span('resolved_tasks') as resolved_span:
+                (resolved_tasks, cursor_prev, cursor_next, has_more_prev,
+                 has_more_next) = history_future.get_result()
+
+        resolved_tasks_total = max(0, (
+            resolved_count_future.get_result() -
+            archived_count_future.get_result()))
+        if open_cursor is None and not has_more_open:
+            # The page holds every open task, so it is the exact total, even
+            # where the counters have drifted and not been reconciled yet.
+            open_tasks_total = len(open_tasks)
+        else:
+            open_tasks_total = open_count_future.get_result()
         template_path = os.path.join(os.path.dirname(__file__), 'index.html')
         self.response.out.write(template.render(template_path, {
             'open_tasks': open_tasks,
             'open_tasks_len': len(open_tasks),
-            'open_fetch_duration': open_fetch_duration,
+            'open_tasks_total': open_tasks_total,
+            'open_fetch_duration': open_span['duration_ms'],
+            'open_fetch_rpcs': open_span.get('rpcs'),
+            'open_next_url': open_cursor_next and open_cursor_next.urlsafe(),
+            'open_next_url_visibility': (
+                'visible' if has_more_open else 'hidden'),
 
             'resolved_tasks': resolved_tasks,
             'resolved_tasks_len': len(resolved_tasks),
-            'resolved_fetch_duration': resolved_fetch_duration,
+            'resolved_tasks_total': resolved_tasks_total,
+            'resolved_fetch_duration': resolved_span['duration_ms'],
+            'resolved_fetch_rpcs': resolved_span.get('rpcs'),
 
+            'page_path': self.request.path,
             'next_url': cursor_next and cursor_next.urlsafe(),
             'next_url_visibility': ('visible' if has_more_next else 'hidden'),
             'prev_url': cursor_prev and cursor_prev.urlsafe(),
-            'prev_url_visibility': (
-                'visible' if cursor and has_more_prev else 'hidden'),
+            'prev_url_visibility': ('visible' if has_more_prev else 'hidden'),
+            'page_number': page_number,
+            'page_numbers': get_page_numbers(
+                page_number or 1, resolved_tasks_total, page_size),
+            # Keeps the history sized the same way across the page's links.
+            'page_options_query': ''.join(
+                '&%s=%d' % option for option in sorted(page_options.items())),
         }))
+        shadow_reads.abandon_unfinished(shadow_futures)
+
+    def shadow_reads_async(
+            self, open_future, open_cursor, history_future, cursor, backward,
+            page_options):
+        """Issues this page's reads against the shadow model, if any, and
+        compares them with the primary reads.
 
+        Returns:
+            list(ndb.Future). The comparisons, see shadow_reads.compare_async.
+        """
+        shadow_model = shadow_reads.get_shadow_model(self.TASK_MODEL)
+        if shadow_model is None:
+            return []
+        # Cursors only make sense to the model which produced them, so only
+        # first pages can be shadowed.
+        shadow_futures = []
+        if open_cursor is None:
+            shadow_futures.append(shadow_reads.compare_async(
+                self.request.path, shadow_reads.OPERATION_OPEN_TASKS,
+                self.TASK_MODEL, open_future, shadow_model,
+                shadow_model.list_open_tasks_page_async(
+                    'exploration', 'foo', 1, None)))
+        if cursor is None:
+            shadow_futures.append(shadow_reads.compare_async(
+                self.request.path, shadow_reads.OPERATION_HISTORY_PAGE,
+                self.TASK_MODEL, history_future, shadow_model,
+                shadow_model.list_history_page_async(
+                    'exploration', 'foo', 1, None, backward=backward,
+                    **page_options)))
+        return shadow_futures
 
-class GeneratePageBase(webapp2.RequestHandler):
-    BATCH_SIZE = 1000
+
+class GeneratePageBase(rpc_trace.TracedRequestHandler):
     def get(self):
-        self.response.content_type = 'text/plain'
-        num = self.request.get('num')
         task_id = self.request.get('task_id') or None
+        # Optional shape of the generated workload, see workload.py.
+        workload_config = {}
+        try:
+            num = int(self.request.get('num') or 0)
+            shards = self.request.get('shards')
+            num_shards = int(shards) if shards else None
+            seed = self.request.get('seed')
+            seed = int(seed) if seed else None
+            for param, name, parse in WORKLOAD_PARAMS:
+                if self.request.get(param):
+                    workload_config[name] = parse(self.request.get(param))
+        except ValueError:
+            self.abort(400, detail='Seed parameters must be numbers')
 
-        num_remaining = int(num or 0)
-        num_todo = min(num_remaining, self.BATCH_SIZE * 4)
-        while num_todo:
-            batch_size = min(num_todo, self.BATCH_SIZE)
-            self.TASK_MODEL.put_multi(
-                [self.TASK_MODEL.get_random_task(task_id) for _ in range(batch_size)])
-            self.response.out.write('%d entities written\n' % batch_size)
-            num_todo -= batch_size
-            num_remaining -= batch_size
-
-        if num_remaining:
-            next_run_path = (
-                re.sub('num\=\d+', 'num=%d' % num_remaining, self.request.path_qs))
-            self.redirect(next_run_path)
-        else:
-            self.response.out.write('done')
+        job_id = bulk_seed.start_job(
+            self.TASK_MODEL, num, entity_id=task_id, num_shards=num_shards,
+            seed=seed, workload_config=workload_config)
+        self.redirect('%s?job_id=%s' % (bulk_seed.STATUS_URL, job_id))
 
 
 class TaskPage(PageBase):
@@ -120,4 +264,18 @@ app = webapp2.WSGIApplication([
     ('/real/new', GenerateTaskWithRealPropertyPage),
     ('/comp', TaskWithComputedPropertyPage),
     ('/comp/new', GenerateTaskWithComputedPropertyPage),
+    ('/_trace', rpc_trace.RecentTracesPage),
+    (bulk_seed.SHARD_WORKER_URL, bulk_seed.SeedShardWorker),
+    (bulk_seed.STATUS_URL, bulk_seed.SeedStatusPage),
+    (batch_jobs.WORKER_URL, batch_jobs.BatchJobWorker),
+    (batch_jobs.START_URL, batch_jobs.StartBatchJobPage),
+    (batch_jobs.STATUS_URL, batch_jobs.BatchJobStatusPage),
+    (migration_jobs.MIGRATE_URL, migration_jobs.StartMigrationPage),
+    (migration_jobs.PURGE_TOMBSTONES_URL, migration_jobs.PurgeTombstonesPage),
+    (migration_jobs.ARCHIVE_RESOLVED_TASKS_URL,
+     migration_jobs.ArchiveResolvedTasksPage),
+    ('/_shadow', shadow_reads.ShadowReadsPage),
+    (task_export.EXPORT_URL, task_export.ExportPage),
+    (task_api.OPEN_TASKS_URL, task_api.OpenTasksApiPage),
+    (task_api.HISTORY_URL, task_api.HistoryApiPage),
 ])
@@ -0,0 +1,88 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for main."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+import webapp2
+
+import history_cursor_cache
+import main
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+
+
+class PageBaseTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(PageBaseTests, self).setUp()
+        self.put_tasks(self.TASK_MODEL, [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(minutes=i))
+            for i in range(5)
+        ])
+        self.seek_async = history_cursor_cache.seek_async
+        self.sought_pages = []
+
+        def _seek_async(task_model, entity_key, query, page_size, page, *args):
+            self.sought_pages.append(page)
+            return self.seek_async(
+                task_model, entity_key, query, page_size, page, *args)
+        history_cursor_cache.seek_async = _seek_async
+
+    def tearDown(self):
+        history_cursor_cache.seek_async = self.seek_async
+        super(PageBaseTests, self).tearDown()
+
+    def _get(self, url):
+        return webapp2.Request.blank(str(url)).get_response(main.app)
+
+    def test_pages_past_the_last_one_are_not_sought(self):
+        response = self._get('/base?page_size=2&page=100000000')
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(self.sought_pages, [3])
+
+    def test_malformed_parameters_are_bad_requests(self):
+        for url in (
+                '/base?page=many',
+                '/base?page_size=many',
+                '/base?cursor=notacursor',
+                '/base?open_cursor=notacursor'):
+            self.assertEqual(self._get(url).status_int, 400, msg=url)
+
+
+class GeneratePageBaseTests(test_utils.TestBase):
+
+    def test_malformed_parameters_are_bad_requests(self):
+        for url in (
+                '/base/new?num=many',
+                '/base/new?num=10&shards=many',
+                '/base/new?num=10&seed=random',
+                '/base/new?num=10&zipf=skewed'):
+            self.assertEqual(
+                webapp2.Request.blank(str(url)).get_response(
+                    main.app).status_int,
+                400, msg=url)
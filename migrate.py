@@ -0,0 +1,105 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs a sharded task model migration against the local datastore stub.
+
+    python migrate.py --target real --num-entities 5000 --shards 4
+
+Seeds the source model, runs every shard of the migration to completion in
+turn, and reports the migration's throughput along with how many entities the
+target model ended up with.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+sys.path.append('../oppia_tools/google_appengine_1.9.67/google_appengine')
+sys.path.append('../oppia_tools/google-cloud-sdk-251.0.0')
+
+import argparse
+import json
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+import batch_jobs
+import benchmark
+import migration_jobs
+import task_models
+
+
+def run(source_name, target_name, num_entities, num_shards, entity_id):
+    """Seeds the source model and migrates it to the target model.
+
+    Args:
+        source_name: str. The key of task_models.TASK_MODELS to copy from.
+        target_name: str. The key of task_models.TASK_MODELS to copy to.
+        num_entities: int. How many entities to seed the source with.
+        num_shards: int. How many key ranges to split the migration into.
+        entity_id: str. The exploration every seeded task belongs to.
+
+    Returns:
+        dict. The status of the migration's group of shards, plus the number
+        of source and target entities.
+    """
+    bed = benchmark.setup_testbed()
+    try:
+        source_model = task_models.get_task_model(source_name)
+        target_model = task_models.get_task_model(target_name)
+        benchmark.seed(source_model, num_entities, entity_id)
+        group_id, job_ids = migration_jobs.start_migration(
+            source_name, target_name, num_shards=num_shards, enqueue=False)
+        for job_id in job_ids:
+            batch_jobs.run_job_locally(job_id)
+        report = batch_jobs.get_status(group_id=group_id)
+        report['source_count'] = source_model.query().count()
+        report['target_count'] = target_model.query().count()
+        return report
+    finally:
+        bed.deactivate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--source', default='base', choices=list(task_models.TASK_MODELS),
+        help='Model to migrate from (default: base).')
+    parser.add_argument(
+        '--target', required=True, choices=list(task_models.TASK_MODELS),
+        help='Model to migrate to.')
+    parser.add_argument(
+        '--num-entities', type=int, default=5000,
+        help='Number of source entities to seed (default: 5000).')
+    parser.add_argument(
+        '--shards', type=int, default=4,
+        help='Number of key ranges to migrate (default: 4).')
+    parser.add_argument(
+        '--entity-id', default='benchmark',
+        help='Exploration ID the seeded tasks belong to.')
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.source, args.target, args.num_entities, args.shards,
+        args.entity_id)
+    json.dump(report, sys.stdout, indent=2, sort_keys=True, default=str)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
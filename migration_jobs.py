@@ -0,0 +1,593 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batch jobs which rewrite stored task entries.
+
+Start a job from /_jobs/start, for example:
+    /_jobs/start?job_type=reindex_task_entries&model=real
+
+Migrations between task models are split into key-range shards, so they are
+started with start_migration or from /_jobs/migrate instead. migrate.py runs
+one against the local datastore stub. The shards copy the source while it is
+still being written to, so once they are done, copy the tasks updated since
+the migration started with a catch-up pass:
+    /_jobs/migrate?source=base&target=real&since=2020-06-01T12:00:00
+where since is the "started" parameter of the shards. Repeat with the
+"started" parameter of each pass until a pass copies (almost) nothing, then
+switch writes to the target and run one last pass.
+
+Tombstones of soft-deleted tasks are purged by the purge_task_tombstones job,
+which cron.yaml starts daily through /_jobs/purge_tombstones. Old resolved
+tasks are moved into task_archive by the archive_resolved_tasks job, which
+cron.yaml starts daily through /_jobs/archive_resolved_tasks. The
+reconcile_task_counters job, which cron.yaml also starts daily, corrects any
+drift of task_counters.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import datetime
+import uuid
+
+from google.appengine.ext import ndb
+import webapp2
+
+import batch_jobs
+import task_archive
+import task_counters
+import task_entry
+import task_ids
+import task_models
+import task_rows
+
+MIGRATE_URL = '/_jobs/migrate'
+# How many __scatter__ samples are read per shard when choosing the key ranges
+# of a migration. More samples give more evenly sized shards.
+SCATTER_SAMPLES_PER_SHARD = 32
+MAX_MIGRATION_SHARDS = 100
+# How far before the given time a catch-up pass starts, to include writes
+# which stamped their last_updated before it but were committed after it.
+CATCH_UP_MARGIN_SECS = 60
+PURGE_TOMBSTONES_URL = '/_jobs/purge_tombstones'
+# How long soft-deleted tasks are kept before they are purged by default.
+DEFAULT_TOMBSTONE_TTL_DAYS = 30
+ARCHIVE_RESOLVED_TASKS_URL = '/_jobs/archive_resolved_tasks'
+# How old resolved tasks are, by last update, before they are archived by
+# default.
+DEFAULT_ARCHIVE_AGE_DAYS = 180
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+@batch_jobs.register
+class ReindexTaskEntriesJob(batch_jobs.BatchJob):
+    """Rewrites every entity of a task model, so that its index rows match the
+    indexing its properties are currently declared with (see index_profiles).
+
+    Entities are put directly rather than through the model's put_multi: their
+    timestamps are left as they are and, since no task changes, the caches,
+    summaries and counters kept by task_hooks stay valid. Each entity is read
+    again and put in its own transaction, so updates made since the batch was
+    queried are rewritten rather than overwritten.
+
+    Params:
+        model: str. A key of task_models.TASK_MODELS.
+    """
+
+    JOB_TYPE = 'reindex_task_entries'
+    KEYS_ONLY = True
+
+    @classmethod
+    def get_query(cls, params):
+        return task_models.get_task_model(params['model']).query()
+
+    @classmethod
+    @ndb.tasklet
+    def process_batch_async(cls, results, params):
+        yield [_rewrite_async(key) for key in results]
+
+
+@ndb.tasklet
+def _rewrite_async(key):
+    """Transactionally puts the stored version of an entity back, unchanged.
+
+    Args:
+        key: ndb.Key. The key of the entity. Nothing is written if it no
+            longer exists.
+    """
+    @ndb.tasklet
+    def _transaction():
+        entity = yield key.get_async(use_cache=False, use_memcache=False)
+        if entity is not None:
+            yield entity.put_async(use_cache=False, use_memcache=False)
+
+    yield ndb.transaction_async(_transaction)
+
+
+@batch_jobs.register
+class RekeyTaskEntriesJob(batch_jobs.BatchJob):
+    """Moves the entities of a task model whose IDs differ from the ID
+    get_task_id builds for them to that ID.
+
+    These are tasks stored before task_ids escaped the dots and percent signs
+    inside the pieces of an ID. Each is copied to its new ID, keeping its
+    timestamps, and its old ID is deleted, both through the model's write
+    methods so caches, summaries and counters follow. The stored entity_key
+    of models with a real entity_key property is recomputed as well.
+
+    Params:
+        model: str. A key of task_models.TASK_MODELS.
+    """
+
+    JOB_TYPE = 'rekey_task_entries'
+
+    @classmethod
+    def get_query(cls, params):
+        return task_models.get_task_model(params['model']).get_all(
+            include_deleted=True)
+
+    @classmethod
+    @ndb.tasklet
+    def process_batch_async(cls, results, params):
+        task_model = task_models.get_task_model(params['model'])
+        stale_entities, copies = [], []
+        for entity in results:
+            task_id = task_model.get_task_id(
+                entity.entity_type, entity.entity_id, entity.entity_version,
+                entity.task_type, entity.target_type, entity.target_id)
+            if task_id != entity.key.id():
+                copy = convert_task_entry(entity, task_model)
+                copy.key = ndb.Key(task_model, task_id)
+                stale_entities.append(entity)
+                copies.append(copy)
+        if copies:
+            yield task_model.put_multi_async(
+                copies, update_last_updated_time=False)
+            yield task_model.delete_multi_async(stale_entities)
+
+
+@batch_jobs.register
+class MigrateTaskEntriesJob(batch_jobs.BatchJob):
+    """Copies one key range of the entities of a task model to another.
+
+    Every copy keeps the ID, timestamps and deleted flag of its original and
+    is written with the target model's put_multi_async, so the target's
+    caches, summaries and counters are maintained. Re-copying an entity after
+    an interruption is harmless: it rewrites identical data.
+
+    Catch-up passes copy the entities updated since a point in time instead
+    of a key range. Soft deletes are updates, so they are caught up, but hard
+    deletes of source entities are not.
+
+    Params:
+        source: str. The key of task_models.TASK_MODELS to copy from.
+        target: str. The key of task_models.TASK_MODELS to copy to.
+        started: str. When the migration or pass was started, formatted as
+            YYYY-MM-DDTHH:MM:SS in UTC.
+        start_key: str|None. The urlsafe key the range starts at, inclusive.
+        end_key: str|None. The urlsafe key the range ends at, exclusive.
+        updated_since: str|None. For catch-up passes, the UTC time, formatted
+            as YYYY-MM-DDTHH:MM:SS, from which updated entities are copied.
+    """
+
+    JOB_TYPE = 'migrate_task_entries'
+
+    @classmethod
+    def get_query(cls, params):
+        source_model = task_models.get_task_model(params['source'])
+        query = source_model.get_all(include_deleted=True)
+        if params.get('updated_since'):
+            updated_since = datetime.datetime.strptime(
+                params['updated_since'], _DATETIME_FORMAT)
+            return query.filter(
+                source_model.last_updated >= updated_since).order(
+                    source_model.last_updated)
+        if params.get('start_key'):
+            query = query.filter(
+                source_model.key >= ndb.Key(urlsafe=params['start_key']))
+        if params.get('end_key'):
+            query = query.filter(
+                source_model.key < ndb.Key(urlsafe=params['end_key']))
+        return query.order(source_model.key)
+
+    @classmethod
+    def process_batch_async(cls, results, params):
+        target_model = task_models.get_task_model(params['target'])
+        return target_model.put_multi_async(
+            [convert_task_entry(entity, target_model) for entity in results],
+            update_last_updated_time=False)
+
+
+def convert_task_entry(entity, target_model):
+    """Returns a copy of a task entry as an instance of another task model.
+
+    Args:
+        entity: ndb.Model. The task entry to copy.
+        target_model: class. The task entry model to copy it to.
+
+    Returns:
+        ndb.Model. The copy, with the same ID. Its entity_key is computed with
+        target_model.get_entity_key, unless the model computes it itself.
+    """
+    target_properties = target_model._properties  # pylint: disable=protected-access
+    values = {
+        name: value for name, value in entity.to_dict().items()
+        if name in target_properties and
+        not isinstance(target_properties[name], ndb.ComputedProperty)
+    }
+    if 'entity_key' in target_properties and not isinstance(
+            target_properties['entity_key'], ndb.ComputedProperty):
+        values['entity_key'] = target_model.get_entity_key(
+            entity.entity_type, entity.entity_id, entity.entity_version)
+    return target_model(id=entity.key.id(), **values)
+
+
+def get_key_ranges(task_model, num_shards):
+    """Splits the keys of a task model into ranges of similar sizes.
+
+    The boundaries are picked from a sample of the keys ordered by the
+    datastore's __scatter__ property, which is set on a random subset of all
+    entities, so no scan of the kind is needed.
+
+    Args:
+        task_model: class. The task entry model to split.
+        num_shards: int. The desired number of ranges.
+
+    Returns:
+        list(tuple(ndb.Key|None, ndb.Key|None)). The (inclusive start,
+        exclusive end) of each range, where None is unbounded. There may be
+        fewer ranges than requested when the sample is small.
+    """
+    sample = sorted(task_model.query().order(
+        ndb.GenericProperty('__scatter__')).fetch(
+            num_shards * SCATTER_SAMPLES_PER_SHARD, keys_only=True))
+    boundaries = sorted(set(
+        sample[len(sample) * i // num_shards] for i in range(1, num_shards)
+    )) if sample else []
+    starts = [None] + boundaries
+    ends = boundaries + [None]
+    return list(zip(starts, ends))
+
+
+def start_migration(source_name, target_name, num_shards=1, enqueue=True):
+    """Starts copying every entity of a task model to another task model.
+
+    Args:
+        source_name: str. The key of task_models.TASK_MODELS to copy from.
+        target_name: str. The key of task_models.TASK_MODELS to copy to.
+        num_shards: int. How many key ranges to copy in parallel.
+        enqueue: bool. Whether to enqueue the shards on the "jobs" queue.
+            Otherwise they are only created, for batch_jobs.run_job_locally.
+
+    Returns:
+        tuple(str, list(str)). The group ID of the migration, whose progress
+        batch_jobs.get_status reports, and the job ID of each shard.
+
+    Raises:
+        Exception: if the source and target are the same model.
+    """
+    if source_name == target_name:
+        raise Exception('Cannot migrate %s to itself' % source_name)
+    num_shards = max(1, min(num_shards, MAX_MIGRATION_SHARDS))
+    started = datetime.datetime.utcnow().strftime(_DATETIME_FORMAT)
+    group_id = uuid.uuid4().hex
+    job_ids = []
+    for start_key, end_key in get_key_ranges(
+            task_models.get_task_model(source_name), num_shards):
+        params = {
+            'source': source_name,
+            'target': target_name,
+            'started': started,
+            'start_key': start_key and start_key.urlsafe(),
+            'end_key': end_key and end_key.urlsafe(),
+        }
+        if enqueue:
+            job_ids.append(batch_jobs.start_job(
+                MigrateTaskEntriesJob.JOB_TYPE, params, group_id=group_id))
+        else:
+            job_ids.append(batch_jobs.create_job(
+                MigrateTaskEntriesJob.JOB_TYPE, params, group_id=group_id))
+    return group_id, job_ids
+
+
+def start_catch_up(source_name, target_name, since, enqueue=True):
+    """Starts copying the entities of a task model updated since a point in
+    time to another task model, to catch up with writes made during a
+    migration.
+
+    Args:
+        source_name: str. The key of task_models.TASK_MODELS to copy from.
+        target_name: str. The key of task_models.TASK_MODELS to copy to.
+        since: datetime.datetime. When the migration, or the previous pass,
+            was started. Entities updated up to CATCH_UP_MARGIN_SECS before
+            it are copied too.
+        enqueue: bool. Whether to enqueue the job on the "jobs" queue.
+            Otherwise it is only created, for batch_jobs.run_job_locally.
+
+    Returns:
+        str. The ID of the job.
+
+    Raises:
+        Exception: if the source and target are the same model.
+    """
+    if source_name == target_name:
+        raise Exception('Cannot migrate %s to itself' % source_name)
+    updated_since = since - datetime.timedelta(seconds=CATCH_UP_MARGIN_SECS)
+    params = {
+        'source': source_name,
+        'target': target_name,
+        'started': datetime.datetime.utcnow().strftime(_DATETIME_FORMAT),
+        'updated_since': updated_since.strftime(_DATETIME_FORMAT),
+    }
+    if enqueue:
+        return batch_jobs.start_job(MigrateTaskEntriesJob.JOB_TYPE, params)
+    return batch_jobs.create_job(MigrateTaskEntriesJob.JOB_TYPE, params)
+
+
+def get_tombstones_query(task_model, cutoff):
+    """Returns the query over tasks soft-deleted before a point in time.
+
+    Args:
+        task_model: class. The task entry model to query.
+        cutoff: datetime.datetime. Only tasks last updated before this are
+            returned.
+
+    Returns:
+        ndb.Query. The query, ordered by last update.
+    """
+    return task_model.query(
+        task_model.deleted == True,  # pylint: disable=singleton-comparison
+        task_model.last_updated < cutoff).order(task_model.last_updated)
+
+
+@batch_jobs.register
+class PurgeTaskTombstonesJob(batch_jobs.BatchJob):
+    """Deletes the soft-deleted entities of a task model for good.
+
+    The open task caches, summaries and counters already leave soft-deleted
+    tasks out, so the tombstones are deleted directly, without the model's
+    write hooks.
+
+    Params:
+        model: str. A key of task_models.TASK_MODELS.
+        before: str. Only tasks soft-deleted before this UTC time, formatted
+            as YYYY-MM-DDTHH:MM:SS, are deleted.
+    """
+
+    JOB_TYPE = 'purge_task_tombstones'
+    KEYS_ONLY = True
+
+    @classmethod
+    def get_query(cls, params):
+        return get_tombstones_query(
+            task_models.get_task_model(params['model']),
+            datetime.datetime.strptime(params['before'], _DATETIME_FORMAT))
+
+    @classmethod
+    @ndb.tasklet
+    def process_batch_async(cls, results, params):
+        yield ndb.delete_multi_async(results)
+
+
+def start_tombstone_purge(
+        model_name, ttl_days=DEFAULT_TOMBSTONE_TTL_DAYS, enqueue=True):
+    """Starts purging the tombstones which are older than a number of days.
+
+    Args:
+        model_name: str. A key of task_models.TASK_MODELS.
+        ttl_days: float. How many days tombstones are kept for.
+        enqueue: bool. Whether to enqueue the job on the "jobs" queue.
+            Otherwise it is only created, for batch_jobs.run_job_locally.
+
+    Returns:
+        str. The ID of the job.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=ttl_days)
+    params = {
+        'model': model_name,
+        'before': cutoff.strftime(_DATETIME_FORMAT),
+    }
+    if enqueue:
+        return batch_jobs.start_job(PurgeTaskTombstonesJob.JOB_TYPE, params)
+    return batch_jobs.create_job(PurgeTaskTombstonesJob.JOB_TYPE, params)
+
+
+def get_archivable_query(task_model, cutoff):
+    """Returns the query over resolved tasks last updated before a time.
+
+    Args:
+        task_model: class. The task entry model to query.
+        cutoff: datetime.datetime. Only tasks last updated before this are
+            returned.
+
+    Returns:
+        ndb.Query. The query, ordered by last update.
+    """
+    return task_model.query(
+        task_model.status == task_entry.STATUS_RESOLVED,
+        task_model.deleted == False,  # pylint: disable=singleton-comparison
+        task_model.last_updated < cutoff).order(task_model.last_updated)
+
+
+@batch_jobs.register
+class ArchiveResolvedTasksJob(batch_jobs.BatchJob):
+    """Moves the old resolved tasks of a task model into task_archive.
+
+    Params:
+        model: str. A key of task_models.TASK_MODELS.
+        before: str. Only tasks last updated before this UTC time, formatted
+            as YYYY-MM-DDTHH:MM:SS, are archived.
+    """
+
+    JOB_TYPE = 'archive_resolved_tasks'
+
+    @classmethod
+    def get_query(cls, params):
+        return get_archivable_query(
+            task_models.get_task_model(params['model']),
+            datetime.datetime.strptime(params['before'], _DATETIME_FORMAT))
+
+    @classmethod
+    def process_batch_async(cls, results, params):
+        return task_archive.archive_async(
+            task_models.get_task_model(params['model']), results)
+
+
+@batch_jobs.register
+class ReconcileTaskCountersJob(batch_jobs.BatchJob):
+    """Recounts the tasks of every entity version of a task model, and
+    corrects its task_counters.
+
+    Task IDs start with their entity key, so the keys of an entity version's
+    tasks are adjacent. Each version is reconciled by the batch its first key
+    falls in, so versions whose tasks straddle several batches are still
+    recounted once.
+
+    Params:
+        model: str. A key of task_models.TASK_MODELS.
+    """
+
+    JOB_TYPE = 'reconcile_task_counters'
+    KEYS_ONLY = True
+
+    @classmethod
+    def get_query(cls, params):
+        task_model = task_models.get_task_model(params['model'])
+        return task_model.query().order(task_model.key)
+
+    @classmethod
+    @ndb.tasklet
+    def process_batch_async(cls, results, params):
+        task_model = task_models.get_task_model(params['model'])
+        # Maps each entity version to the first of its keys in the batch.
+        first_keys = collections.OrderedDict()
+        for key in results:
+            row = task_rows.row_from_key(key, None)
+            if row.entity_type is not None:
+                first_keys.setdefault(
+                    (row.entity_type, row.entity_id, row.entity_version), key)
+        if not first_keys:
+            return
+        # Only the first version of the batch can have started in an earlier
+        # batch, which reconciled it already.
+        entity_version, first_key = next(iter(first_keys.items()))
+        version_start_key = yield task_model.query(
+            task_model.key >= ndb.Key(
+                task_model,
+                '%s.' % task_ids.encode_entity_key(*entity_version))
+        ).order(task_model.key).get_async(keys_only=True)
+        if version_start_key != first_key:
+            del first_keys[entity_version]
+        yield [
+            task_counters.reconcile_async(
+                task_model, *entity_version,
+                statuses=task_entry.STATUS_CHOICES)
+            for entity_version in first_keys
+        ]
+
+
+def start_archival(
+        model_name, age_days=DEFAULT_ARCHIVE_AGE_DAYS, enqueue=True):
+    """Starts archiving the resolved tasks older than a number of days.
+
+    Args:
+        model_name: str. A key of task_models.TASK_MODELS.
+        age_days: float. How many days after their last update resolved tasks
+            are archived.
+        enqueue: bool. Whether to enqueue the job on the "jobs" queue.
+            Otherwise it is only created, for batch_jobs.run_job_locally.
+
+    Returns:
+        str. The ID of the job.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=age_days)
+    params = {
+        'model': model_name,
+        'before': cutoff.strftime(_DATETIME_FORMAT),
+    }
+    if enqueue:
+        return batch_jobs.start_job(ArchiveResolvedTasksJob.JOB_TYPE, params)
+    return batch_jobs.create_job(ArchiveResolvedTasksJob.JOB_TYPE, params)
+
+
+class StartMigrationPage(webapp2.RequestHandler):
+    """Starts a sharded migration, for example with
+    /_jobs/migrate?source=base&target=real&shards=8, and redirects to its
+    status. With a since parameter, starts a catch-up pass instead.
+    """
+
+    def get(self):
+        source_name = self.request.get('source', 'base')
+        target_name = self.request.get('target')
+        if (source_name not in task_models.TASK_MODELS or
+                target_name not in task_models.TASK_MODELS):
+            self.abort(400, detail='Unknown model')
+        if source_name == target_name:
+            self.abort(400, detail='source and target must differ')
+        if self.request.get('since'):
+            try:
+                since = datetime.datetime.strptime(
+                    self.request.get('since'), _DATETIME_FORMAT)
+            except ValueError:
+                self.abort(400, detail='since must be YYYY-MM-DDTHH:MM:SS')
+            job_id = start_catch_up(source_name, target_name, since)
+            batch_jobs.respond_with_job(self, job_id)
+            return
+        try:
+            num_shards = int(self.request.get('shards') or 1)
+        except ValueError:
+            self.abort(400, detail='shards must be an integer')
+        group_id, _ = start_migration(
+            source_name, target_name, num_shards=num_shards)
+        self.redirect('%s?group_id=%s' % (batch_jobs.STATUS_URL, group_id))
+
+
+class PurgeTombstonesPage(webapp2.RequestHandler):
+    """Starts purging old tombstones, for example with
+    /_jobs/purge_tombstones?model=real&ttl_days=30, and redirects to the
+    job's status. Requests from cron get the job ID instead.
+    """
+
+    def get(self):
+        try:
+            ttl_days = float(
+                self.request.get('ttl_days') or DEFAULT_TOMBSTONE_TTL_DAYS)
+        except ValueError:
+            self.abort(400, detail='ttl_days must be a number')
+        if self.request.get('model') not in task_models.TASK_MODELS:
+            self.abort(400, detail='Unknown model')
+        job_id = start_tombstone_purge(
+            self.request.get('model'), ttl_days=ttl_days)
+        batch_jobs.respond_with_job(self, job_id)
+
+
+class ArchiveResolvedTasksPage(webapp2.RequestHandler):
+    """Starts archiving old resolved tasks, for example with
+    /_jobs/archive_resolved_tasks?model=real&age_days=180, and redirects to
+    the job's status. Requests from cron get the job ID instead.
+    """
+
+    def get(self):
+        try:
+            age_days = float(
+                self.request.get('age_days') or DEFAULT_ARCHIVE_AGE_DAYS)
+        except ValueError:
+            self.abort(400, detail='age_days must be a number')
+        if self.request.get('model') not in task_models.TASK_MODELS:
+            self.abort(400, detail='Unknown model')
+        job_id = start_archival(self.request.get('model'), age_days=age_days)
+        batch_jobs.respond_with_job(self, job_id)
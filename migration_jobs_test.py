@@ -0,0 +1,61 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for migration_jobs."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+import batch_jobs
+import migration_jobs
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+
+
+class RekeyTaskEntriesJobTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def test_tasks_under_ambiguous_ids_are_moved(self):
+        task = self.create_task(
+            self.TASK_MODEL, 'state.1', task_entry.STATUS_OPEN, _BASE_TIME,
+            entity_id='a.b')
+        new_id = task.key.id()
+        legacy_id = 'exploration.a.b.1.%s.state.state.1' % task.task_type
+        task.key = self.TASK_MODEL(id=legacy_id).key
+        self.put_tasks(self.TASK_MODEL, [task])
+
+        job_id = batch_jobs.create_job(
+            migration_jobs.RekeyTaskEntriesJob.JOB_TYPE, {'model': 'base'})
+        self.assertTrue(batch_jobs.run_job_locally(job_id)['done'])
+
+        self.assertEqual(
+            [key.id() for key in self.TASK_MODEL.query().fetch(
+                keys_only=True)],
+            [new_id])
+        self.assertEqual(
+            self.TASK_MODEL.count_tasks_async(
+                'exploration', 'a.b', 1).get_result(),
+            1)
+        self.assertEqual(
+            [task.id for task in self.TASK_MODEL.list_open_tasks_async(
+                'exploration', 'a.b', 1).get_result()],
+            [new_id])
@@ -0,0 +1,247 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Query helpers shared by the task entry models."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+
+from google.appengine.ext import ndb
+
+# The default number of batch puts put_multi_pipelined_async keeps in flight.
+DEFAULT_MAX_IN_FLIGHT = 4
+# The default number of entities written by each batch put. This is the most
+# the datastore accepts in a single put RPC.
+DEFAULT_PUT_BATCH_SIZE = 500
+
+# The most results a paged read of the task models may return at once.
+MAX_PAGE_SIZE = 500
+# The most results a paged read may request per query RPC, which is also the
+# most the datastore returns in one.
+MAX_BATCH_SIZE = 1000
+
+# Runs queries that return full entities. This is what ndb does by default.
+READ_MODE_EAGER = 'eager'
+# Runs keys-only queries and resolves the keys with a batched get, which is
+# served from the in-context cache and memcache whenever possible.
+READ_MODE_KEYS_THEN_GET = 'keys_then_get'
+READ_MODES = (
+    READ_MODE_EAGER,
+    READ_MODE_KEYS_THEN_GET,
+)
+# Runs keys-only queries and returns the keys themselves. Only meant for
+# callers that can work from keys alone, so it is not one of READ_MODES.
+READ_MODE_KEYS_ONLY = 'keys_only'
+
+
+@ndb.tasklet
+def _resolve_keys_async(keys):
+    """Gets the entities for the given keys, skipping those that are missing.
+
+    Keys-only queries may be eventually consistent, so an entity deleted since
+    the index was last updated is dropped rather than returned as None.
+    """
+    entities = yield ndb.get_multi_async(keys)
+    raise ndb.Return([entity for entity in entities if entity is not None])
+
+
+@ndb.tasklet
+def fetch_async(query, read_mode=READ_MODE_EAGER):
+    """Fetches all results of a query, using the given read mode.
+
+    Args:
+        query: ndb.Query. The query to run.
+        read_mode: str. One of READ_MODES, or READ_MODE_KEYS_ONLY.
+
+    Returns:
+        ndb.Future. Resolves to the list of matching entities, or of their keys
+        if read_mode is READ_MODE_KEYS_ONLY.
+    """
+    if read_mode == READ_MODE_KEYS_ONLY:
+        entities = yield query.fetch_async(keys_only=True)
+    elif read_mode == READ_MODE_KEYS_THEN_GET:
+        keys = yield query.fetch_async(keys_only=True)
+        entities = yield _resolve_keys_async(keys)
+    else:
+        entities = yield query.fetch_async()
+    raise ndb.Return(entities)
+
+
+def validate_page_options(page_size, batch_size=None, prefetch_size=None):
+    """Checks the sizes requested of a paged read against their limits.
+
+    Args:
+        page_size: int. The maximum number of results in a page, at most
+            MAX_PAGE_SIZE.
+        batch_size: int|None. The number of results per query RPC, at most
+            MAX_BATCH_SIZE. None leaves it to ndb.
+        prefetch_size: int|None. The number of results returned by the first
+            query RPC, at most MAX_BATCH_SIZE. None leaves it to ndb.
+
+    Raises:
+        ValueError. A size is not positive or exceeds its limit.
+    """
+    for name, value, limit in (
+            ('page_size', page_size, MAX_PAGE_SIZE),
+            ('batch_size', batch_size, MAX_BATCH_SIZE),
+            ('prefetch_size', prefetch_size, MAX_BATCH_SIZE)):
+        if value is not None and not 1 <= value <= limit:
+            raise ValueError(
+                '%s must be between 1 and %d, got %r' % (name, limit, value))
+
+
+def _get_query_options(batch_size, prefetch_size):
+    """Returns the ndb query options for the given sizes, skipping unset
+    ones.
+    """
+    options = {}
+    if batch_size is not None:
+        options['batch_size'] = batch_size
+    if prefetch_size is not None:
+        options['prefetch_size'] = prefetch_size
+    return options
+
+
+@ndb.tasklet
+def fetch_page_async(
+        query, page_size, start_cursor=None, read_mode=READ_MODE_EAGER,
+        batch_size=None, prefetch_size=None, produce_cursors=True):
+    """Fetches a page of results of a query, using the given read mode.
+
+    Args:
+        query: ndb.Query. The query to run.
+        page_size: int. The maximum number of results to return.
+        start_cursor: Cursor|None. Where the page starts.
+        read_mode: str. One of READ_MODES, or READ_MODE_KEYS_ONLY.
+        batch_size: int|None. The number of results per query RPC. None
+            leaves it to ndb.
+        prefetch_size: int|None. The number of results returned by the first
+            query RPC. None leaves it to ndb.
+        produce_cursors: bool. Whether to return the cursor after the page.
+            Without it, one extra result is fetched instead, to tell whether
+            more follow.
+
+    Returns:
+        ndb.Future. Resolves to a (results, cursor, more) tuple, like
+        ndb.Query.fetch_page_async. If read_mode is READ_MODE_KEYS_ONLY, the
+        results are keys. The cursor is None if produce_cursors is False.
+    """
+    options = _get_query_options(batch_size, prefetch_size)
+    keys_only = read_mode in (READ_MODE_KEYS_ONLY, READ_MODE_KEYS_THEN_GET)
+    if produce_cursors:
+        results, cursor, more = yield query.fetch_page_async(
+            page_size, start_cursor=start_cursor, keys_only=keys_only,
+            **options)
+    else:
+        results = yield query.fetch_async(
+            page_size + 1, start_cursor=start_cursor, keys_only=keys_only,
+            **options)
+        results, cursor, more = (
+            results[:page_size], None, len(results) > page_size)
+    if read_mode == READ_MODE_KEYS_THEN_GET:
+        results = yield _resolve_keys_async(results)
+    raise ndb.Return((results, cursor, more))
+
+
+@ndb.tasklet
+def fetch_page_bidirectional_async(
+        forward_query, backward_query, page_size, cursor, backward=False,
+        read_mode=READ_MODE_EAGER, batch_size=None, prefetch_size=None):
+    """Fetches a page that can be navigated both ways, with a single query.
+
+    All cursors taken and returned by this function are positions in
+    forward_query. Pages fetched with backward=True run backward_query (which
+    must have the opposite sort order) from the reversed cursor, so the paired
+    asc/desc composite indexes serve both directions.
+
+    Args:
+        forward_query: ndb.Query. The query whose order pages are shown in.
+        backward_query: ndb.Query. The same query, in reverse order.
+        page_size: int. The maximum number of results in a page.
+        cursor: Cursor|None. Where the page starts (or, if backward is True,
+            ends). None means the start of the results.
+        backward: bool. Whether to fetch the page before cursor rather than
+            the page after it.
+        read_mode: str. One of READ_MODES, or READ_MODE_KEYS_ONLY.
+        batch_size: int|None. See fetch_page_async.
+        prefetch_size: int|None. See fetch_page_async.
+
+    Returns:
+        ndb.Future. Resolves to a (results, prev_cursor, next_cursor, has_prev,
+        has_next) tuple. results are in forward_query order. prev_cursor should
+        be passed back with backward=True, next_cursor with backward=False.
+    """
+    if backward and cursor is not None:
+        results, end_cursor, more = yield fetch_page_async(
+            backward_query, page_size, start_cursor=cursor.reversed(),
+            read_mode=read_mode, batch_size=batch_size,
+            prefetch_size=prefetch_size)
+        if more and end_cursor is not None:
+            results.reverse()
+            raise ndb.Return(
+                (results, end_cursor.reversed(), cursor, True, True))
+        # The page before cursor is the first page, which may be shorter than
+        # a full one when fetched backward. Serve the full first page instead.
+        cursor = None
+
+    results, end_cursor, more = yield fetch_page_async(
+        forward_query, page_size, start_cursor=cursor, read_mode=read_mode,
+        batch_size=batch_size, prefetch_size=prefetch_size)
+    raise ndb.Return(
+        (results, cursor, end_cursor, cursor is not None, bool(more)))
+
+
+def split_into_batches(items, batch_size):
+    """Yields consecutive slices of a list, each of at most batch_size items.
+
+    Args:
+        items: list. The items to split.
+        batch_size: int. The maximum size of each slice.
+
+    Yields:
+        list. The next slice of items.
+    """
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+@ndb.tasklet
+def put_multi_pipelined_async(batches, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """Writes batches of entities, keeping a bounded number of puts in flight.
+
+    Batches are pulled from the iterable lazily, so the next batch can be built
+    while the previous ones are still being written.
+
+    Args:
+        batches: iterable(list(ndb.Model)). The entities to write, in batches.
+        max_in_flight: int. The maximum number of batch puts to wait on at once.
+
+    Returns:
+        ndb.Future. Resolves to the list of keys written, in order.
+    """
+    in_flight = collections.deque()
+    keys = []
+    for batch in batches:
+        if len(in_flight) >= max_in_flight:
+            batch_keys = yield in_flight.popleft()
+            keys.extend(batch_keys)
+        in_flight.append(ndb.put_multi_async(batch))
+    while in_flight:
+        batch_keys = yield in_flight.popleft()
+        keys.extend(batch_keys)
+    raise ndb.Return(keys)
@@ -0,0 +1,100 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for ndb_utils."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+import ndb_utils
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+_NUM_TASKS = 10
+_PAGE_SIZE = 3
+
+
+class FetchPageBidirectionalTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(FetchPageBidirectionalTests, self).setUp()
+        tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(minutes=i))
+            for i in range(_NUM_TASKS)
+        ]
+        self.put_tasks(self.TASK_MODEL, tasks)
+        self.new_to_old_ids = [task.key.id() for task in reversed(tasks)]
+
+    def _fetch_page(self, cursor, backward=False, page_size=_PAGE_SIZE):
+        results, prev_cursor, next_cursor, has_prev, has_next = (
+            ndb_utils.fetch_page_bidirectional_async(
+                self.TASK_MODEL.get_history_query(
+                    'exploration', 'foo', 1, True),
+                self.TASK_MODEL.get_history_query(
+                    'exploration', 'foo', 1, False),
+                page_size, cursor, backward=backward,
+                read_mode=ndb_utils.READ_MODE_KEYS_ONLY).get_result())
+        return (
+            [key.id() for key in results], prev_cursor, next_cursor,
+            has_prev, has_next)
+
+    def _walk_forward(self):
+        """Returns every page, with the cursors returned along with it."""
+        pages, cursor = [], None
+        for _ in range(_NUM_TASKS):
+            page = self._fetch_page(cursor)
+            pages.append(page)
+            cursor = page[2]
+            if not page[4]:
+                return pages
+        self.fail('Paging did not end')
+
+    def test_forward_pages_cover_the_results_in_order(self):
+        pages = self._walk_forward()
+        self.assertEqual(
+            [task_id for page in pages for task_id in page[0]],
+            self.new_to_old_ids)
+        self.assertFalse(pages[0][3])
+        self.assertTrue(all(page[3] for page in pages[1:]))
+        self.assertTrue(all(page[4] for page in pages[:-1]))
+
+    def test_backward_pages_match_the_forward_ones(self):
+        pages = self._walk_forward()
+        for previous_page, page in zip(pages, pages[1:]):
+            ids, _, next_cursor, has_prev, has_next = self._fetch_page(
+                page[1], backward=True)
+            self.assertEqual(ids, previous_page[0])
+            self.assertEqual(has_prev, previous_page[3])
+            self.assertTrue(has_next)
+            self.assertEqual(
+                self._fetch_page(next_cursor)[0], page[0])
+
+    def test_short_first_pages_are_served_in_full(self):
+        _, _, cursor, _, _ = self._fetch_page(None, page_size=2)
+        ids, prev_cursor, _, has_prev, has_next = self._fetch_page(
+            cursor, backward=True)
+        self.assertEqual(ids, self.new_to_old_ids[:_PAGE_SIZE])
+        self.assertIsNone(prev_cursor)
+        self.assertFalse(has_prev)
+        self.assertTrue(has_next)
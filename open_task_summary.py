@@ -0,0 +1,326 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Denormalized summary of the open tasks of each entity version.
+
+The summary is maintained on every write made through the task models, so the
+open tasks of an entity version can be listed with a single get instead of a
+composite-index query. A summary first created by a write does not know about
+older tasks, so it starts out unrebuilt and readers query instead. Once the
+summary is REBUILD_DELAY_SECS old, a reader rebuilds it: the open tasks found
+by a keys-only query are re-read by key, so tasks closed since the index was
+written are left out, and merged with those the writes recorded. The rebuild
+is dropped if any write updated the summary after the query started.
+
+The query is eventually consistent, so a rebuilt summary is only as good as
+the index was REBUILD_DELAY_SECS after the summary's first write. A task
+opened without going through the task models' put methods, or whose index
+rows took longer than that to be written, is missing from it until its next
+write.
+
+Every write updates its entity version's summary in a transaction, so a
+version sustains about one summary update per second. A write whose update
+fails, typically from contention, does not fail itself: the summary is reset
+to an unrebuilt one instead, which readers query around until it is rebuilt.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import datetime
+import logging
+import random
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+import ndb_utils
+import task_rows
+
+# Matches STATUS_OPEN in the task model modules.
+STATUS_OPEN = 'open'
+# The most open task IDs a summary tracks. Past this, the summary is reset and
+# readers fall back to querying. Task IDs are around 100 bytes, so this keeps
+# the entity well within the datastore's size limit even before compression.
+MAX_TRACKED_TASKS = 5000
+# How long after a summary's first write readers wait before rebuilding it,
+# which gives the index time to catch up with the tasks written before it.
+REBUILD_DELAY_SECS = 60
+
+
+class OpenTaskSummaryModel(ndb.Model):
+    """The open tasks of one entity version, for one task entry model.
+
+    Instances of this class have an ID with the form:
+        [task_model_kind]:[entity_key]
+    """
+
+    # Maps the ID of each open task to its task_type.
+    open_tasks = ndb.JsonProperty(compressed=True)
+    # Whether open_tasks has been rebuilt from a query, and so may be served.
+    # This is False until then, and once it overflows MAX_TRACKED_TASKS. It is
+    # stored under its former name, "complete".
+    rebuilt = ndb.BooleanProperty('complete', default=False, indexed=False)
+    # Incremented by every write to the summary, so a rebuild can tell whether
+    # the summary changed while its query ran.
+    generation = ndb.IntegerProperty(default=0, indexed=False)
+    # When this summary was first written.
+    created_on = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    # When this summary was last updated.
+    last_updated = ndb.DateTimeProperty(auto_now=True, indexed=False)
+
+    @classmethod
+    def get_summary_id(cls, task_model, entity_key):
+        """Returns the ID of the summary of an entity version.
+
+        Args:
+            task_model: class. The task entry model being summarized.
+            entity_key: str. The entity key, as built by get_entity_key.
+
+        Returns:
+            str. The summary ID.
+        """
+        return '%s:%s' % (task_model._get_kind(), entity_key)  # pylint: disable=protected-access
+
+    def get_open_task_ids(self):
+        """Returns the IDs of the open tasks, in sorted order."""
+        return sorted(self.open_tasks or {})
+
+    def is_ready_to_rebuild(self):
+        """Returns whether the summary is old enough to be rebuilt."""
+        return self.created_on is None or (
+            datetime.datetime.utcnow() - self.created_on >
+            datetime.timedelta(seconds=REBUILD_DELAY_SECS))
+
+
+@ndb.tasklet
+def get_summary_async(task_model, entity_key):
+    """Gets the summary of an entity version.
+
+    Args:
+        task_model: class. The task entry model being summarized.
+        entity_key: str. The entity key, as built by get_entity_key.
+
+    Returns:
+        ndb.Future. Resolves to the OpenTaskSummaryModel, or None if there is
+        no rebuilt summary of the entity version.
+    """
+    summary = yield OpenTaskSummaryModel.get_by_id_async(
+        OpenTaskSummaryModel.get_summary_id(task_model, entity_key))
+    if summary is None or not summary.rebuilt:
+        raise ndb.Return(None)
+    raise ndb.Return(summary)
+
+
+@ndb.tasklet
+def reset_async(summary_ids):
+    """Replaces summaries with empty, unrebuilt ones, without a transaction.
+
+    Readers query around the reset summaries until they are REBUILD_DELAY_SECS
+    old and rebuilt. Rebuilds already in progress are dropped, since the
+    summaries get a new generation.
+
+    Args:
+        summary_ids: list(str). The IDs of the summaries to reset.
+    """
+    yield ndb.put_multi_async([
+        OpenTaskSummaryModel(
+            id=summary_id, open_tasks={}, rebuilt=False,
+            generation=random.getrandbits(48))
+        for summary_id in summary_ids
+    ])
+
+
+@ndb.tasklet
+def mark_for_rebuild_async(task_model, entity_keys):
+    """Resets the summaries of entity versions, see reset_async.
+
+    Args:
+        task_model: class. The task entry model being summarized.
+        entity_keys: iterable(str). The entity keys, as built by
+            get_entity_key.
+    """
+    yield reset_async([
+        OpenTaskSummaryModel.get_summary_id(task_model, entity_key)
+        for entity_key in set(entity_keys)
+    ])
+
+
+@ndb.tasklet
+def _update_summary_async(summary_id, opened, closed):
+    """Applies changes to a single summary, or resets it if that fails.
+
+    Args:
+        summary_id: str. The ID of the summary to update.
+        opened: dict(str, str). Maps the IDs of tasks that are now open to
+            their task_type.
+        closed: set(str). The IDs of tasks that are no longer open.
+    """
+    try:
+        yield _apply_changes_async(summary_id, opened, closed)
+    except (datastore_errors.TransactionFailedError,
+            datastore_errors.Timeout) as e:
+        logging.warning(
+            'Resetting open task summary %s after failed update: %r',
+            summary_id, e)
+        try:
+            yield reset_async([summary_id])
+        except (datastore_errors.TransactionFailedError,
+                datastore_errors.Timeout) as e:
+            logging.error(
+                'Could not reset open task summary %s: %r', summary_id, e)
+
+
+@ndb.tasklet
+def _apply_changes_async(summary_id, opened, closed):
+    """Transactionally applies changes to a single summary.
+
+    Args:
+        summary_id: str. The ID of the summary to update.
+        opened: dict(str, str). Maps the IDs of tasks that are now open to
+            their task_type.
+        closed: set(str). The IDs of tasks that are no longer open.
+    """
+    @ndb.tasklet
+    def _transaction():
+        summary = yield OpenTaskSummaryModel.get_by_id_async(summary_id)
+        if summary is None:
+            summary = OpenTaskSummaryModel(id=summary_id)
+        if summary.open_tasks is None:
+            summary.open_tasks = {}
+        for task_id in closed:
+            summary.open_tasks.pop(task_id, None)
+        summary.open_tasks.update(opened)
+        if len(summary.open_tasks) > MAX_TRACKED_TASKS:
+            summary.open_tasks = {}
+            summary.rebuilt = False
+        summary.generation += 1
+        yield summary.put_async()
+
+    yield ndb.transaction_async(_transaction)
+
+
+@ndb.tasklet
+def _rebuild_async(summary_id, keys, generation):
+    """Replaces an unrebuilt summary with the open tasks found by a query.
+
+    Args:
+        summary_id: str. The ID of the summary to rebuild.
+        keys: list(ndb.Key). The keys returned by the open tasks query.
+        generation: int|None. The generation of the summary before the query
+            started, None if there was no summary. The rebuild is dropped if
+            it has changed since.
+    """
+    # The index may still list tasks which have been closed since, so each
+    # task is checked against its entity.
+    entities = yield ndb.get_multi_async(
+        keys, use_cache=False, use_memcache=False)
+    open_tasks = {
+        entity.key.id(): entity.task_type for entity in entities
+        if entity is not None and entity.status == STATUS_OPEN and
+        not entity.deleted
+    }
+
+    @ndb.tasklet
+    def _transaction():
+        summary = yield OpenTaskSummaryModel.get_by_id_async(summary_id)
+        current_generation = summary.generation if summary else None
+        if current_generation != generation or (summary and summary.rebuilt):
+            return
+        if summary is None:
+            summary = OpenTaskSummaryModel(id=summary_id)
+        # Tasks the writes recorded may be too recent for the index.
+        open_tasks.update(summary.open_tasks or {})
+        if len(open_tasks) > MAX_TRACKED_TASKS:
+            return
+        summary.open_tasks = open_tasks
+        summary.rebuilt = True
+        summary.generation += 1
+        yield summary.put_async()
+
+    yield ndb.transaction_async(_transaction)
+
+
+@ndb.tasklet
+def list_open_task_rows_async(task_model, entity_key, query):
+    """Lists the open tasks of an entity version, from its summary if it has
+    been rebuilt. Otherwise they come from a keys-only query, whose result is
+    used to rebuild the summary.
+
+    Args:
+        task_model: class. The task entry model being read.
+        entity_key: str. The entity key, as built by get_entity_key.
+        query: ndb.Query. The query over the open tasks of the entity version.
+
+    Returns:
+        ndb.Future. Resolves to a list(task_rows.TaskRow).
+    """
+    summary_id = OpenTaskSummaryModel.get_summary_id(task_model, entity_key)
+    summary = yield OpenTaskSummaryModel.get_by_id_async(summary_id)
+    if summary is not None and summary.rebuilt:
+        raise ndb.Return(task_rows.rows_from_ids(
+            summary.get_open_task_ids(), STATUS_OPEN))
+
+    keys = yield ndb_utils.fetch_async(
+        query, read_mode=ndb_utils.READ_MODE_KEYS_ONLY)
+    if len(keys) <= MAX_TRACKED_TASKS and (
+            summary is None or summary.is_ready_to_rebuild()):
+        yield _rebuild_async(
+            summary_id, keys, summary.generation if summary else None)
+    raise ndb.Return(task_rows.rows_from_keys(keys, STATUS_OPEN))
+
+
+@ndb.tasklet
+def record_put_async(task_model, entities):
+    """Updates the summaries affected by a put of task entries.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        entities: list(ndb.Model). The stored entities.
+    """
+    changes = collections.defaultdict(lambda: ({}, set()))
+    for entity in entities:
+        entity_key = task_model.get_entity_key(
+            entity.entity_type, entity.entity_id, entity.entity_version)
+        opened, closed = changes[entity_key]
+        if entity.status == STATUS_OPEN and not entity.deleted:
+            opened[entity.key.id()] = entity.task_type
+        else:
+            closed.add(entity.key.id())
+    yield [
+        _update_summary_async(
+            OpenTaskSummaryModel.get_summary_id(task_model, entity_key),
+            opened, closed)
+        for entity_key, (opened, closed) in changes.items()
+    ]
+
+
+@ndb.tasklet
+def record_delete_async(task_model, task_ids_by_entity_key):
+    """Updates the summaries affected by a deletion of task entries.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        task_ids_by_entity_key: dict(str, set(str)). Maps each affected entity
+            key to the IDs of its deleted tasks.
+    """
+    yield [
+        _update_summary_async(
+            OpenTaskSummaryModel.get_summary_id(task_model, entity_key),
+            {}, task_ids)
+        for entity_key, task_ids in task_ids_by_entity_key.items()
+    ]
@@ -0,0 +1,211 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for open_task_summary."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+import open_task_summary
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+
+
+class OpenTaskSummaryTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(OpenTaskSummaryTests, self).setUp()
+        self.entity_key = self.TASK_MODEL.get_entity_key(
+            'exploration', 'foo', 1)
+        self.summary_id = open_task_summary.OpenTaskSummaryModel.get_summary_id(
+            self.TASK_MODEL, self.entity_key)
+
+    def _create_tasks(self, statuses):
+        tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, status,
+                _BASE_TIME + datetime.timedelta(minutes=i))
+            for i, status in enumerate(statuses)
+        ]
+        self.put_tasks(self.TASK_MODEL, tasks)
+        return tasks
+
+    def _list_open_task_ids(self):
+        rows = open_task_summary.list_open_task_rows_async(
+            self.TASK_MODEL, self.entity_key,
+            self.TASK_MODEL.get_open_tasks_query('exploration', 'foo', 1)
+        ).get_result()
+        return sorted(row.id for row in rows)
+
+    def _get_summary(self):
+        return open_task_summary.OpenTaskSummaryModel.get_by_id(
+            self.summary_id)
+
+    def _age_summary(self):
+        """Makes the summary old enough to be rebuilt."""
+        summary = self._get_summary()
+        summary.created_on = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=2 * open_task_summary.REBUILD_DELAY_SECS)
+        summary.put()
+
+    def test_summaries_created_by_writes_are_not_served(self):
+        self._create_tasks([task_entry.STATUS_OPEN])
+        self.assertFalse(self._get_summary().rebuilt)
+        self.assertIsNone(open_task_summary.get_summary_async(
+            self.TASK_MODEL, self.entity_key).get_result())
+
+    def test_young_summaries_are_not_rebuilt(self):
+        tasks = self._create_tasks([task_entry.STATUS_OPEN])
+        self.assertEqual(self._list_open_task_ids(), [tasks[0].key.id()])
+        self.assertFalse(self._get_summary().rebuilt)
+
+    def test_readers_rebuild_old_summaries(self):
+        tasks = self._create_tasks([
+            task_entry.STATUS_OPEN, task_entry.STATUS_RESOLVED,
+            task_entry.STATUS_OPEN])
+        self._age_summary()
+        open_ids = sorted([tasks[0].key.id(), tasks[2].key.id()])
+        self.assertEqual(self._list_open_task_ids(), open_ids)
+        summary = open_task_summary.get_summary_async(
+            self.TASK_MODEL, self.entity_key).get_result()
+        self.assertIsNotNone(summary)
+        self.assertEqual(summary.get_open_task_ids(), open_ids)
+        self.assertEqual(self._list_open_task_ids(), open_ids)
+
+    def test_rebuilt_summaries_follow_writes(self):
+        tasks = self._create_tasks([
+            task_entry.STATUS_OPEN, task_entry.STATUS_OPEN])
+        self._age_summary()
+        self._list_open_task_ids()
+        tasks[0].status = task_entry.STATUS_RESOLVED
+        new_task = self.create_task(
+            self.TASK_MODEL, 'new', task_entry.STATUS_OPEN, _BASE_TIME)
+        self.put_tasks(self.TASK_MODEL, [tasks[0], new_task])
+        self.assertTrue(self._get_summary().rebuilt)
+        self.assertEqual(
+            self._list_open_task_ids(),
+            sorted([tasks[1].key.id(), new_task.key.id()]))
+
+    def test_rebuilds_skip_tasks_closed_since_the_query(self):
+        tasks = self._create_tasks([
+            task_entry.STATUS_OPEN, task_entry.STATUS_OPEN])
+        summary = self._get_summary()
+        keys = [task.key for task in tasks]
+        # Closed without going through the model, so the summary is
+        # unchanged and the rebuild goes ahead.
+        tasks[0].status = task_entry.STATUS_RESOLVED
+        super(task_entry.TaskEntryModel, tasks[0]).put()
+        open_task_summary._rebuild_async(  # pylint: disable=protected-access
+            self.summary_id, keys, summary.generation).get_result()
+        self.assertEqual(
+            self._get_summary().get_open_task_ids(), [tasks[1].key.id()])
+
+    def test_rebuilds_keep_tasks_recorded_by_writes(self):
+        tasks = self._create_tasks([
+            task_entry.STATUS_OPEN, task_entry.STATUS_OPEN])
+        summary = self._get_summary()
+        # The query did not see the second task yet.
+        open_task_summary._rebuild_async(  # pylint: disable=protected-access
+            self.summary_id, [tasks[0].key], summary.generation).get_result()
+        self.assertTrue(self._get_summary().rebuilt)
+        self.assertEqual(
+            self._get_summary().get_open_task_ids(),
+            sorted(task.key.id() for task in tasks))
+
+    def test_rebuilds_are_dropped_after_concurrent_writes(self):
+        tasks = self._create_tasks([task_entry.STATUS_OPEN])
+        generation = self._get_summary().generation
+        new_task = self.create_task(
+            self.TASK_MODEL, 'new', task_entry.STATUS_OPEN, _BASE_TIME)
+        self.put_tasks(self.TASK_MODEL, [new_task])
+        open_task_summary._rebuild_async(  # pylint: disable=protected-access
+            self.summary_id, [tasks[0].key], generation).get_result()
+        self.assertFalse(self._get_summary().rebuilt)
+
+    def test_overflowing_summaries_are_reset(self):
+        max_tracked_tasks = open_task_summary.MAX_TRACKED_TASKS
+        open_task_summary.MAX_TRACKED_TASKS = 2
+        try:
+            self._create_tasks([task_entry.STATUS_OPEN] * 2)
+            self._age_summary()
+            self._list_open_task_ids()
+            self.assertTrue(self._get_summary().rebuilt)
+            new_task = self.create_task(
+                self.TASK_MODEL, 'new', task_entry.STATUS_OPEN, _BASE_TIME)
+            self.put_tasks(self.TASK_MODEL, [new_task])
+            self.assertFalse(self._get_summary().rebuilt)
+            self.assertEqual(len(self._list_open_task_ids()), 3)
+        finally:
+            open_task_summary.MAX_TRACKED_TASKS = max_tracked_tasks
+
+    def test_failed_updates_reset_the_summary_without_failing_the_write(self):
+        tasks = self._create_tasks([task_entry.STATUS_OPEN])
+        self._age_summary()
+        self._list_open_task_ids()
+        self.assertTrue(self._get_summary().rebuilt)
+
+        def _fail(*unused_args):
+            future = ndb.Future()
+            future.set_exception(datastore_errors.TransactionFailedError())
+            return future
+
+        apply_changes_async = open_task_summary._apply_changes_async  # pylint: disable=protected-access
+        open_task_summary._apply_changes_async = _fail  # pylint: disable=protected-access
+        try:
+            new_task = self.create_task(
+                self.TASK_MODEL, 'new', task_entry.STATUS_OPEN, _BASE_TIME)
+            self.put_tasks(self.TASK_MODEL, [new_task])
+        finally:
+            open_task_summary._apply_changes_async = apply_changes_async  # pylint: disable=protected-access
+
+        self.assertFalse(self._get_summary().rebuilt)
+        self.assertEqual(
+            self._list_open_task_ids(),
+            sorted([tasks[0].key.id(), new_task.key.id()]))
+
+    def test_marking_for_rebuild_drops_rebuilds_in_progress(self):
+        tasks = self._create_tasks([task_entry.STATUS_OPEN])
+        generation = self._get_summary().generation
+        open_task_summary.mark_for_rebuild_async(
+            self.TASK_MODEL, [self.entity_key]).get_result()
+        open_task_summary._rebuild_async(  # pylint: disable=protected-access
+            self.summary_id, [tasks[0].key], generation).get_result()
+        self.assertFalse(self._get_summary().rebuilt)
+
+    def test_deletes_of_tasks_under_legacy_ids_reach_the_summary(self):
+        self._create_tasks([task_entry.STATUS_OPEN])
+        legacy_task = self.create_task(
+            self.TASK_MODEL, 'legacy', task_entry.STATUS_OPEN, _BASE_TIME)
+        legacy_task.key = self.TASK_MODEL(id='exploration.foo.1.legacy').key
+        self.put_tasks(self.TASK_MODEL, [legacy_task])
+        self._age_summary()
+        self.assertIn('exploration.foo.1.legacy', self._list_open_task_ids())
+        self.assertTrue(self._get_summary().rebuilt)
+
+        self.TASK_MODEL.delete_multi([legacy_task])
+        self.assertTrue(self._get_summary().rebuilt)
+        self.assertNotIn(
+            'exploration.foo.1.legacy', self._get_summary().get_open_task_ids())
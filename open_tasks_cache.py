@@ -0,0 +1,119 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memcache-backed read-through cache of the open tasks of an entity.
+
+Entries are keyed by the task model's kind and the entity key built by
+get_entity_key. Invalidating an entry replaces it with a short-lived marker
+rather than deleting it: readers bypass the cache while the marker is present,
+and fill it with memcache add, so a reader whose query started before a write
+can never store its stale result over the marker. Lists too large for a
+memcache value are not cached.
+
+Only models with CACHE_OPEN_TASKS set read through the cache, and only their
+writes invalidate it; the pages list open tasks from open_task_summary.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import logging
+
+from google.appengine.datastore import entity_pb
+from google.appengine.ext import ndb
+
+# How long a cached list of open tasks may be served, as a backstop for writes
+# that bypass the task models' put and delete methods.
+CACHE_TTL_SECS = 10 * 60
+# How long readers bypass the cache after an invalidation. This covers both
+# queries already in flight and the eventual consistency of the index.
+INVALIDATION_TTL_SECS = 5
+# The largest list of open tasks cached, in bytes of serialized entities,
+# which leaves room within memcache's 1MB value limit for the list's own
+# encoding.
+MAX_CACHED_BYTES = 900 * 1000
+_INVALIDATED = 'invalidated'
+
+
+def _get_cache_key(task_model, entity_key):
+    """Returns the memcache key for the open tasks of an entity."""
+    return 'open_tasks:%s:%s' % (task_model._get_kind(), entity_key)  # pylint: disable=protected-access
+
+
+def _serialize(entities):
+    """Encodes entities as a list of protocol buffer strings."""
+    return [
+        ndb.model_to_protobuf(entity).SerializeToString()
+        for entity in entities]
+
+
+def _deserialize(serialized_entities):
+    """Decodes entities encoded by _serialize."""
+    return [
+        ndb.model_from_protobuf(entity_pb.EntityProto(serialized))
+        for serialized in serialized_entities]
+
+
+@ndb.tasklet
+def get_or_fetch_async(task_model, entity_key, fetch_async):
+    """Returns the open tasks of an entity, from the cache if possible.
+
+    Args:
+        task_model: class. The task entry model being read.
+        entity_key: str. The entity key, as built by get_entity_key.
+        fetch_async: callable. Takes no arguments and returns a future of the
+            open tasks, read from the datastore.
+
+    Returns:
+        ndb.Future. Resolves to the list of open task entries.
+    """
+    context = ndb.get_context()
+    cache_key = _get_cache_key(task_model, entity_key)
+    cached = yield context.memcache_get(cache_key)
+    if cached is not None and cached != _INVALIDATED:
+        raise ndb.Return(_deserialize(cached))
+
+    entities = yield fetch_async()
+    if cached is None:
+        serialized_entities = _serialize(entities)
+        if sum(len(serialized) for serialized in serialized_entities) <= (
+                MAX_CACHED_BYTES):
+            try:
+                yield context.memcache_add(
+                    cache_key, serialized_entities, time=CACHE_TTL_SECS)
+            except ValueError as e:
+                # The list is larger than memcache accepts after all. The
+                # tasks are still served, uncached.
+                logging.warning(
+                    'Not caching the open tasks of %s: %s', entity_key, e)
+    raise ndb.Return(entities)
+
+
+@ndb.tasklet
+def invalidate_async(task_model, entity_keys):
+    """Invalidates the cached open tasks of the given entities.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        entity_keys: iterable(str). The affected entity keys.
+    """
+    context = ndb.get_context()
+    yield [
+        context.memcache_set(
+            _get_cache_key(task_model, entity_key), _INVALIDATED,
+            time=INVALIDATION_TTL_SECS)
+        for entity_key in set(entity_keys)
+    ]
@@ -0,0 +1,85 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for open_tasks_cache."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+from google.appengine.api import memcache
+
+import open_tasks_cache
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+
+
+class OpenTasksCacheTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(OpenTasksCacheTests, self).setUp()
+        self.put_tasks(self.TASK_MODEL, [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, task_entry.STATUS_OPEN,
+                _BASE_TIME + datetime.timedelta(minutes=i))
+            for i in range(3)
+        ])
+        self.cache_key = open_tasks_cache._get_cache_key(  # pylint: disable=protected-access
+            self.TASK_MODEL,
+            self.TASK_MODEL.get_entity_key('exploration', 'foo', 1))
+        self.cache_open_tasks = self.TASK_MODEL.CACHE_OPEN_TASKS
+        self.TASK_MODEL.CACHE_OPEN_TASKS = True
+
+    def tearDown(self):
+        self.TASK_MODEL.CACHE_OPEN_TASKS = self.cache_open_tasks
+        super(OpenTasksCacheTests, self).tearDown()
+
+    def _get_open_task_ids(self):
+        return sorted(
+            task.key.id()
+            for task in self.TASK_MODEL.get_open_tasks('exploration', 'foo', 1))
+
+    def test_reads_fill_the_cache(self):
+        self.assertEqual(len(self._get_open_task_ids()), 3)
+        self.assertEqual(len(memcache.get(self.cache_key)), 3)
+
+    def test_writes_invalidate_the_cache(self):
+        self._get_open_task_ids()
+        new_task = self.create_task(
+            self.TASK_MODEL, 'new', task_entry.STATUS_OPEN, _BASE_TIME)
+        self.put_tasks(self.TASK_MODEL, [new_task])
+        self.assertIn(new_task.key.id(), self._get_open_task_ids())
+
+    def test_lists_too_large_for_memcache_are_not_cached(self):
+        max_cached_bytes = open_tasks_cache.MAX_CACHED_BYTES
+        open_tasks_cache.MAX_CACHED_BYTES = 10
+        try:
+            self.assertEqual(len(self._get_open_task_ids()), 3)
+        finally:
+            open_tasks_cache.MAX_CACHED_BYTES = max_cached_bytes
+        self.assertIsNone(memcache.get(self.cache_key))
+
+    def test_writes_leave_the_cache_alone_when_it_is_off(self):
+        self.TASK_MODEL.CACHE_OPEN_TASKS = False
+        self.put_tasks(self.TASK_MODEL, [self.create_task(
+            self.TASK_MODEL, 'new', task_entry.STATUS_OPEN, _BASE_TIME)])
+        self.assertIsNone(memcache.get(self.cache_key))
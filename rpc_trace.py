@@ -0,0 +1,331 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-request instrumentation of datastore RPCs.
+
+Hooks into the API proxy to record every datastore RPC made while a trace is
+active on the current thread. Handlers deriving from TracedRequestHandler get a
+trace per request, exposed through the X-Datastore-Trace response header and
+the /_trace endpoint.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import contextlib
+import json
+import logging
+import threading
+import time
+
+from google.appengine.api import apiproxy_stub_map
+import webapp2
+
+DATASTORE_SERVICE = 'datastore_v3'
+TRACE_HEADER = 'X-Datastore-Trace'
+# Traces whose JSON encoding exceeds this many bytes only keep their totals in
+# the response header. The full trace is still available from /_trace.
+MAX_HEADER_BYTES = 8 * 1024
+# Number of recent traces each instance keeps for the /_trace endpoint.
+RECENT_TRACES_LIMIT = 50
+
+_FILTER_OPERATORS = {
+    1: '<',
+    2: '<=',
+    3: '>',
+    4: '>=',
+    5: '==',
+    6: 'IN',
+    7: 'EXISTS',
+}
+_ORDER_DIRECTIONS = {
+    1: 'asc',
+    2: 'desc',
+}
+
+_thread_local = threading.local()
+_hooks_lock = threading.Lock()
+_hooked_stub_maps = set()
+_recent_traces = collections.deque(maxlen=RECENT_TRACES_LIMIT)
+
+
+class RpcTrace(object):
+    """The datastore RPCs and named spans recorded during one request."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.start = time.time()
+        self.end = None
+        self.rpcs = []
+        self.spans = []
+        self._pending = {}
+        self._query_kinds = {}
+
+    def record_call_start(self, response):
+        """Notes the start of an RPC, identified by its response object."""
+        self._pending[id(response)] = time.time()
+
+    def record_call_end(self, call, request, response):
+        """Builds and stores the record of a completed RPC."""
+        start = self._pending.pop(id(response), None)
+        latency_ms = (time.time() - start) * 1000 if start else None
+        record = {
+            'call': call,
+            'latency_ms': latency_ms,
+            'request_bytes': request.ByteSize(),
+            'response_bytes': response.ByteSize(),
+        }
+        record.update(self._describe(call, request, response))
+        self.rpcs.append(record)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Times a block of code and counts the RPCs completed within it.
+
+        Args:
+            name: str. The name of the span.
+
+        Yields:
+            dict. The span record, completed once the block exits.
+        """
+        span = {'name': name, 'first_rpc': len(self.rpcs)}
+        start = time.time()
+        try:
+            yield span
+        finally:
+            span['duration_ms'] = (time.time() - start) * 1000
+            span['rpcs'] = len(self.rpcs) - span['first_rpc']
+            self.spans.append(span)
+
+    def finish(self):
+        """Marks the trace as complete."""
+        self.end = time.time()
+
+    def totals(self):
+        """Returns aggregate counts over all recorded RPCs."""
+        return {
+            'rpcs': len(self.rpcs),
+            'entities': sum(rpc.get('entities', 0) for rpc in self.rpcs),
+            'bytes': sum(rpc['response_bytes'] for rpc in self.rpcs),
+            'rpc_latency_ms': sum(
+                rpc['latency_ms'] or 0 for rpc in self.rpcs),
+            'duration_ms': (
+                ((self.end or time.time()) - self.start) * 1000),
+        }
+
+    def to_dict(self):
+        """Returns a JSON-serializable representation of the trace."""
+        return {
+            'label': self.label,
+            'totals': self.totals(),
+            'spans': self.spans,
+            'rpcs': self.rpcs,
+        }
+
+    def _describe(self, call, request, response):
+        """Extracts the call-specific fields of an RPC record."""
+        if call == 'RunQuery':
+            description = {
+                'kind': request.kind(),
+                'filters': [
+                    '%s %s' % (
+                        f.property(0).name(),
+                        _FILTER_OPERATORS.get(f.op(), f.op()))
+                    for f in request.filter_list()],
+                'orders': [
+                    '%s %s' % (
+                        o.property(),
+                        _ORDER_DIRECTIONS.get(o.direction(), o.direction()))
+                    for o in request.order_list()],
+                'indexes': [
+                    [prop.name() for prop in index.definition().property_list()]
+                    for index in response.index_list()],
+                'keys_only': response.keys_only(),
+                'entities': response.result_size(),
+            }
+            if response.has_cursor():
+                self._query_kinds[response.cursor().cursor()] = description
+            return description
+        if call == 'Next':
+            query = self._query_kinds.get(request.cursor().cursor(), {})
+            return {
+                'kind': query.get('kind'),
+                'filters': query.get('filters', []),
+                'keys_only': response.keys_only(),
+                'entities': response.result_size(),
+            }
+        if call == 'Get':
+            return {
+                'kind': _kind_of_keys(request.key_list()),
+                'keys': request.key_size(),
+                'entities': sum(
+                    1 for entity in response.entity_list()
+                    if entity.has_entity()),
+            }
+        if call == 'Put':
+            return {
+                'kind': _kind_of_keys(
+                    entity.key() for entity in request.entity_list()),
+                'entities': request.entity_size(),
+            }
+        if call == 'Delete':
+            return {
+                'kind': _kind_of_keys(request.key_list()),
+                'keys': request.key_size(),
+            }
+        return {}
+
+
+def _kind_of_keys(keys):
+    """Returns the comma-separated kinds of the given key protobufs."""
+    kinds = []
+    for key in keys:
+        kind = key.path().element_list()[-1].type()
+        if kind not in kinds:
+            kinds.append(kind)
+    return ','.join(kinds)
+
+
+def _pre_call_hook(service, unused_call, unused_request, response):
+    trace = current_trace()
+    if trace is None or service != DATASTORE_SERVICE:
+        return
+    try:
+        trace.record_call_start(response)
+    except Exception:  # pylint: disable=broad-except
+        logging.exception('Failed to record start of datastore RPC')
+
+
+def _post_call_hook(service, call, request, response):
+    trace = current_trace()
+    if trace is None or service != DATASTORE_SERVICE:
+        return
+    try:
+        trace.record_call_end(call, request, response)
+    except Exception:  # pylint: disable=broad-except
+        logging.exception('Failed to record datastore %s RPC', call)
+
+
+def install_hooks():
+    """Registers the tracing hooks on the current API proxy, once."""
+    stub_map = apiproxy_stub_map.apiproxy
+    with _hooks_lock:
+        if id(stub_map) in _hooked_stub_maps:
+            return
+        stub_map.GetPreCallHooks().Append(
+            'rpc_trace', _pre_call_hook, DATASTORE_SERVICE)
+        stub_map.GetPostCallHooks().Append(
+            'rpc_trace', _post_call_hook, DATASTORE_SERVICE)
+        _hooked_stub_maps.add(id(stub_map))
+
+
+def start_trace(label=None):
+    """Starts recording datastore RPCs made by the current thread.
+
+    Args:
+        label: str|None. A description of what is being traced.
+
+    Returns:
+        RpcTrace. The new active trace.
+    """
+    install_hooks()
+    _thread_local.trace = RpcTrace(label=label)
+    return _thread_local.trace
+
+
+def end_trace():
+    """Stops recording on the current thread.
+
+    Returns:
+        RpcTrace|None. The trace that was active, if any.
+    """
+    trace = current_trace()
+    _thread_local.trace = None
+    if trace is not None:
+        trace.finish()
+        _recent_traces.append(trace.to_dict())
+    return trace
+
+
+def current_trace():
+    """Returns the trace active on the current thread, or None."""
+    return getattr(_thread_local, 'trace', None)
+
+
+@contextlib.contextmanager
+def span(name):
+    """Times a block within the current trace, if any.
+
+    Args:
+        name: str. The name of the span.
+
+    Yields:
+        dict. The span record. When no trace is active the record only has the
+        duration_ms key filled in.
+    """
+    trace = current_trace()
+    if trace is not None:
+        with trace.span(name) as span_record:
+            yield span_record
+        return
+    span_record = {'name': name}
+    start = time.time()
+    try:
+        yield span_record
+    finally:
+        span_record['duration_ms'] = (time.time() - start) * 1000
+
+
+def encode_header(trace):
+    """Encodes a trace for the X-Datastore-Trace response header.
+
+    Args:
+        trace: RpcTrace. A finished trace.
+
+    Returns:
+        str. Compact JSON, reduced to the totals if the full trace is too big.
+    """
+    trace_dict = trace.to_dict()
+    encoded = json.dumps(trace_dict, separators=(',', ':'))
+    if len(encoded) > MAX_HEADER_BYTES:
+        encoded = json.dumps({
+            'label': trace.label,
+            'totals': trace_dict['totals'],
+            'truncated': True,
+        }, separators=(',', ':'))
+    return str(encoded)
+
+
+class TracedRequestHandler(webapp2.RequestHandler):
+    """Request handler that traces the datastore RPCs of every request."""
+
+    def dispatch(self):
+        start_trace(label='%s %s' % (self.request.method, self.request.path))
+        try:
+            super(TracedRequestHandler, self).dispatch()
+        finally:
+            trace = end_trace()
+            self.response.headers[str(TRACE_HEADER)] = encode_header(trace)
+
+
+class RecentTracesPage(webapp2.RequestHandler):
+    """Serves the traces of the most recent requests to this instance."""
+
+    def get(self):
+        self.response.content_type = 'application/json'
+        self.response.out.write(json.dumps(list(_recent_traces)))
@@ -0,0 +1,243 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shadow reads which compare two task models on the same live requests.
+
+While a page reads from its primary task model, the same reads are issued
+concurrently against a shadow model. Once both finish, their latencies and
+results are compared and the comparison is sent to the metrics sink: a
+structured log line per comparison, plus the most recent comparisons of each
+instance, summarized by the /_shadow endpoint.
+
+Shadow reads are configured with the TASK_SHADOW_MODEL (a key of
+task_models.TASK_MODELS, empty to disable) and TASK_SHADOW_SAMPLE_RATE (the
+fraction of requests to shadow) environment variables, see app.yaml. Invalid
+values are logged and disable shadow reads.
+
+Pages never wait for the shadow reads: comparisons which have not finished by
+the time the page is written are abandoned, see abandon_unfinished.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import collections
+import json
+import logging
+import os
+import random
+import time
+
+from google.appengine.ext import ndb
+import webapp2
+
+import task_models
+
+OPERATION_OPEN_TASKS = 'open_tasks'
+OPERATION_HISTORY_PAGE = 'history_page'
+# Number of recent comparisons each instance keeps for the /_shadow endpoint.
+RECENT_COMPARISONS_LIMIT = 500
+
+_recent_comparisons = collections.deque(maxlen=RECENT_COMPARISONS_LIMIT)
+# The invalid configurations this instance has already logged.
+_logged_config_errors = set()
+
+
+def _log_config_error(message):
+    """Logs an invalid shadow read configuration, once per instance."""
+    if message not in _logged_config_errors:
+        _logged_config_errors.add(message)
+        logging.error('Shadow reads disabled: %s', message)
+
+
+def get_shadow_model(primary_model):
+    """Returns the model to shadow a request's reads with, if any.
+
+    Args:
+        primary_model: class. The task entry model serving the request.
+
+    Returns:
+        class|None. The shadow task entry model, or None if shadow reads are
+        disabled, not sampled for this request, or would shadow the primary
+        model with itself.
+    """
+    shadow_name = os.environ.get('TASK_SHADOW_MODEL')
+    if not shadow_name:
+        return None
+    if shadow_name not in task_models.TASK_MODELS:
+        _log_config_error('unknown TASK_SHADOW_MODEL %r' % shadow_name)
+        return None
+    try:
+        sample_rate = float(os.environ.get('TASK_SHADOW_SAMPLE_RATE') or 1)
+    except ValueError:
+        _log_config_error('invalid TASK_SHADOW_SAMPLE_RATE %r' % (
+            os.environ.get('TASK_SHADOW_SAMPLE_RATE')))
+        return None
+    if random.random() >= sample_rate:
+        return None
+    shadow_model = task_models.get_task_model(shadow_name)
+    return shadow_model if shadow_model is not primary_model else None
+
+
+@ndb.tasklet
+def _timed_async(future):
+    """Waits for a future, measuring how long that took from now.
+
+    Returns:
+        ndb.Future. Resolves to a (result, duration_ms, error) tuple, where
+        error is the repr of the exception the future raised, if any.
+    """
+    start = time.time()
+    result, error = None, None
+    try:
+        result = yield future
+    except Exception as e:  # pylint: disable=broad-except
+        error = repr(e)
+    raise ndb.Return((result, (time.time() - start) * 1000, error))
+
+
+def _get_task_ids(result):
+    """Returns the IDs of the tasks read by an operation, in read order.
+
+    Both operations resolve to a tuple whose first item is the list of
+    task_rows.TaskRow read.
+    """
+    return [row.id for row in result[0]]
+
+
+@ndb.tasklet
+def compare_async(
+        request_path, operation, primary_model, primary_future,
+        shadow_model, shadow_future):
+    """Compares the results of an operation on the primary and shadow models.
+
+    Call this as soon as both futures have been created, so that both are
+    timed from the same moment. A failing shadow read is recorded rather than
+    raised, so it never affects the page being served.
+
+    Args:
+        request_path: str. The path of the request being shadowed.
+        operation: str. OPERATION_OPEN_TASKS or OPERATION_HISTORY_PAGE.
+        primary_model: class. The task entry model serving the request.
+        primary_future: ndb.Future. The operation on the primary model.
+        shadow_model: class. The task entry model shadowing the request.
+        shadow_future: ndb.Future. The operation on the shadow model.
+
+    Returns:
+        ndb.Future. Resolves to the recorded comparison.
+    """
+    primary_timer = _timed_async(primary_future)
+    shadow_timer = _timed_async(shadow_future)
+    primary_result, primary_ms, primary_error = yield primary_timer
+    shadow_result, shadow_ms, shadow_error = yield shadow_timer
+
+    comparison = {
+        'path': request_path,
+        'operation': operation,
+        'primary': task_models.get_task_model_name(primary_model),
+        'shadow': task_models.get_task_model_name(shadow_model),
+        'primary_ms': primary_ms,
+        'shadow_ms': shadow_ms,
+        'latency_diff_ms': shadow_ms - primary_ms,
+        'error': primary_error or shadow_error,
+    }
+    if comparison['error'] is None:
+        primary_ids = _get_task_ids(primary_result)
+        shadow_ids = _get_task_ids(shadow_result)
+        comparison.update({
+            'num_results': len(primary_ids),
+            'missing_in_shadow': len(set(primary_ids) - set(shadow_ids)),
+            'extra_in_shadow': len(set(shadow_ids) - set(primary_ids)),
+            # Open tasks are unordered, history pages are not.
+            'mismatch': (
+                set(primary_ids) != set(shadow_ids)
+                if operation == OPERATION_OPEN_TASKS
+                else primary_ids != shadow_ids),
+        })
+    record(comparison)
+    raise ndb.Return(comparison)
+
+
+def abandon_unfinished(futures):
+    """Gives up on the comparisons which have not finished yet.
+
+    The shadow reads make progress whenever the page waits on its own reads,
+    so most comparisons are done by the time the page is written. The rest
+    are dropped rather than waited for, so a slow shadow model never delays
+    the response.
+
+    Args:
+        futures: list(ndb.Future). The comparisons, see compare_async.
+
+    Returns:
+        int. The number of comparisons abandoned.
+    """
+    num_unfinished = sum(1 for future in futures if not future.done())
+    if num_unfinished:
+        logging.info(
+            'shadow_read abandoned %d unfinished comparisons', num_unfinished)
+    return num_unfinished
+
+
+def record(comparison):
+    """Sends a comparison to the metrics sink."""
+    logging.info('shadow_read %s', json.dumps(comparison, sort_keys=True))
+    _recent_comparisons.append(comparison)
+
+
+def summarize(comparisons):
+    """Aggregates comparisons by operation and pair of models.
+
+    Args:
+        comparisons: list(dict). Comparisons as recorded by compare_async.
+
+    Returns:
+        list(dict). One summary per (operation, primary, shadow), with the
+        mean latency difference and the rate of mismatches and errors.
+    """
+    groups = collections.OrderedDict()
+    for comparison in comparisons:
+        groups.setdefault(
+            (comparison['operation'], comparison['primary'],
+             comparison['shadow']), []).append(comparison)
+    summaries = []
+    for (operation, primary, shadow), group in groups.items():
+        summaries.append({
+            'operation': operation,
+            'primary': primary,
+            'shadow': shadow,
+            'count': len(group),
+            'mean_latency_diff_ms': (
+                sum(c['latency_diff_ms'] for c in group) / len(group)),
+            'mismatch_rate': (
+                sum(1 for c in group if c.get('mismatch')) / len(group)),
+            'error_rate': sum(1 for c in group if c['error']) / len(group),
+        })
+    return summaries
+
+
+class ShadowReadsPage(webapp2.RequestHandler):
+    """Serves a summary of this instance's recent shadow read comparisons.
+    With ?raw=1, serves the comparisons themselves.
+    """
+
+    def get(self):
+        comparisons = list(_recent_comparisons)
+        self.response.content_type = 'application/json'
+        self.response.out.write(json.dumps(
+            comparisons if self.request.get('raw') else
+            summarize(comparisons)))
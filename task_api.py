@@ -0,0 +1,258 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""JSON API serving the open tasks and history of an entity version.
+
+    /api/<model>/open?entity_id=foo&page_size=50&cursor=...
+    /api/<model>/history?entity_id=foo&page_size=50&cursor=...
+
+where <model> is a key of task_models.TASK_MODELS. Tasks are written in the
+same form as task_export. Both views are paged, a page being at most
+ndb_utils.MAX_PAGE_SIZE tasks fetched with a single call, and link to their
+next page with a cursor.
+
+Unknown models are answered with 404 Not Found, and malformed parameters
+with 400 Bad Request.
+
+Every response carries an ETag derived from the page's parameters, the
+entity version's most recent task update, read with a projection query, and
+its task count, read from task_counters. Requests whose If-None-Match holds
+the current ETag are answered with 304 Not Modified without reading any task.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+from google.appengine.api import datastore_errors
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+import webapp2
+
+import ndb_utils
+import task_archive
+import task_entry
+import task_export
+import task_models
+
+OPEN_TASKS_URL = r'/api/(\w+)/open'
+HISTORY_URL = r'/api/(\w+)/history'
+# How many tasks are fetched per query batch by default.
+DEFAULT_BATCH_SIZE = 100
+
+
+def get_latest_update_query(
+        task_model, entity_type, entity_id, entity_version):
+    """Returns the projection query for the most recent update to any task of
+    an entity version, deleted or not.
+    """
+    return task_model.get_entity_tasks_query(
+        entity_type, entity_id, entity_version).order(
+            -task_model.last_updated)
+
+
+@ndb.tasklet
+def get_etag_async(
+        task_model, view, entity_type, entity_id, entity_version, params):
+    """Computes the ETag of an API view without reading any task.
+
+    Every put of a task, including resolving and soft-deleting it, updates
+    its last_updated, and every hard delete changes the task count, so either
+    changes the ETag.
+
+    Args:
+        task_model: class. The task entry model being read.
+        view: str. The name of the view, e.g. "open".
+        entity_type: str. The type of entity the tasks refer to.
+        entity_id: str. The ID of the entity the tasks refer to.
+        entity_version: int. The version of the entity the tasks refer to.
+        params: tuple. The other request parameters the view depends on.
+
+    Returns:
+        ndb.Future. Resolves to the ETag, unquoted.
+    """
+    latest_future = get_latest_update_query(
+        task_model, entity_type, entity_id, entity_version).get_async(
+            projection=[task_model.last_updated])
+    count_future = task_model.count_tasks_async(
+        entity_type, entity_id, entity_version)
+    latest, count = yield latest_future, count_future
+    state = json.dumps([
+        task_models.get_task_model_name(task_model), view, entity_type,
+        entity_id, entity_version, list(params),
+        latest.last_updated.isoformat() if latest else None, count])
+    raise ndb.Return(hashlib.sha1(state.encode('utf-8')).hexdigest())
+
+
+class TasksApiPageBase(webapp2.RequestHandler):
+    """Serves a JSON view of the tasks of the entity version given by the
+    entity_type, entity_id and entity_version query parameters.
+    """
+
+    VIEW = None
+
+    def get(self, model_name):
+        if model_name not in task_models.TASK_MODELS:
+            self.abort(404, detail='Unknown model')
+        task_model = task_models.get_task_model(model_name)
+        entity_type = self.request.get(
+            'entity_type', task_entry.ENTITY_TYPE_EXPLORATION)
+        entity_id = self.request.get('entity_id', 'foo')
+        try:
+            entity_version = int(self.request.get('entity_version') or 1)
+            params = self.get_params()
+        except ValueError:
+            self.abort(400, detail='Invalid parameter')
+
+        etag = get_etag_async(
+            task_model, self.VIEW, entity_type, entity_id, entity_version,
+            params).get_result()
+        self.response.headers[str('ETag')] = str('"%s"' % etag)
+        # Clients may keep responses, but must revalidate them on every poll.
+        self.response.headers[str('Cache-Control')] = str('no-cache')
+        if etag in self.request.if_none_match:
+            self.response.status = 304
+            return
+
+        self.response.content_type = 'application/json'
+        self.write_tasks(
+            task_model, entity_type, entity_id, entity_version, *params)
+
+    def get_params(self):
+        """Returns the request parameters the view depends on, besides the
+        model and entity version, as a tuple. Subclasses with parameters
+        override this.
+
+        Raises:
+            ValueError: if a parameter is malformed. The request is answered
+                with 400 Bad Request.
+        """
+        return ()
+
+    def write_tasks(
+            self, task_model, entity_type, entity_id, entity_version,
+            *params):
+        """Writes the JSON view of the tasks to the response. Every subclass
+        must override this.
+
+        Args:
+            task_model: class. The task entry model to read.
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            *params: The parameters returned by get_params.
+        """
+        raise NotImplementedError
+
+    def write_list(self, batches):
+        """Writes the tasks of each batch as the items of a JSON list.
+
+        Args:
+            batches: iterable(list(ndb.Model)). The tasks, in batches.
+        """
+        out = self.response.out
+        out.write('[')
+        separator = ''
+        for entities in batches:
+            for entity in entities:
+                out.write(separator)
+                out.write(task_export.entity_to_json(entity))
+                separator = ','
+        out.write(']')
+
+
+class OpenTasksApiPage(TasksApiPageBase):
+    """Serves a page of the open tasks, as
+    {"tasks": [...], "cursor": ..., "more": ...}. Pass the cursor back as the
+    cursor parameter to get the next page.
+    """
+
+    VIEW = 'open'
+
+    def get_params(self):
+        urlsafe_cursor = self.request.get('cursor') or None
+        if urlsafe_cursor:
+            try:
+                Cursor(urlsafe=urlsafe_cursor)
+            except datastore_errors.BadValueError:
+                raise ValueError('Invalid cursor')
+        return (
+            urlsafe_cursor,
+            max(1, min(
+                int(self.request.get('page_size') or
+                    task_entry.OPEN_TASKS_PAGE_SIZE),
+                ndb_utils.MAX_PAGE_SIZE)),
+        )
+
+    def write_tasks(
+            self, task_model, entity_type, entity_id, entity_version,
+            urlsafe_cursor, page_size):
+        entities, cursor, more = task_model.fetch_open_tasks_page_async(
+            entity_type, entity_id, entity_version,
+            urlsafe_cursor and Cursor(urlsafe=urlsafe_cursor),
+            page_size=page_size).get_result()
+        self.response.out.write('{"tasks": ')
+        self.write_list([entities])
+        self.response.out.write(
+            ', "cursor": %s, "more": %s}' % (
+                json.dumps(cursor and cursor.urlsafe()),
+                json.dumps(bool(more))))
+
+
+class HistoryApiPage(TasksApiPageBase):
+    """Serves a page of the resolved tasks, live and archived, as
+    {"tasks": [...], "cursor": ..., "more": ...}. Pass the cursor back as the
+    cursor parameter to get the next page.
+    """
+
+    VIEW = 'history'
+
+    def get_params(self):
+        urlsafe_cursor = self.request.get('cursor') or None
+        if urlsafe_cursor:
+            try:
+                task_archive.cursor_from_urlsafe(urlsafe_cursor)
+            except datastore_errors.BadValueError:
+                raise ValueError('Invalid cursor')
+        return (
+            urlsafe_cursor,
+            self.request.get('order') != 'asc',
+            max(1, min(
+                int(self.request.get('page_size') or
+                    task_entry.HISTORY_PAGE_SIZE),
+                ndb_utils.MAX_PAGE_SIZE)),
+            max(1, min(
+                int(self.request.get('batch_size') or DEFAULT_BATCH_SIZE),
+                ndb_utils.MAX_BATCH_SIZE)),
+        )
+
+    def write_tasks(
+            self, task_model, entity_type, entity_id, entity_version,
+            urlsafe_cursor, new_to_old, page_size, batch_size):
+        entities, cursor, more = task_model.fetch_history_page_async(
+            entity_type, entity_id, entity_version,
+            urlsafe_cursor and task_archive.cursor_from_urlsafe(
+                urlsafe_cursor),
+            new_to_old=new_to_old, page_size=page_size,
+            batch_size=batch_size).get_result()
+        self.response.out.write('{"tasks": ')
+        self.write_list([entities])
+        self.response.out.write(
+            ', "cursor": %s, "more": %s}' % (
+                json.dumps(cursor and cursor.urlsafe()),
+                json.dumps(bool(more))))
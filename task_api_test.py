@@ -0,0 +1,122 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for task_api."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+import json
+
+import webapp2
+
+import task_api
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+_OPEN_URL = '/api/base/open?entity_id=foo&entity_version=1'
+_HISTORY_URL = '/api/base/history?entity_id=foo&entity_version=1'
+
+app = webapp2.WSGIApplication([
+    (task_api.OPEN_TASKS_URL, task_api.OpenTasksApiPage),
+    (task_api.HISTORY_URL, task_api.HistoryApiPage),
+])
+
+
+class TasksApiTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(TasksApiTests, self).setUp()
+        self.put_tasks(self.TASK_MODEL, [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i,
+                task_entry.STATUS_OPEN if i % 2 else
+                task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(minutes=i))
+            for i in range(6)
+        ])
+
+    def _get(self, url, etag=None):
+        request = webapp2.Request.blank(str(url))
+        if etag is not None:
+            request.headers[str('If-None-Match')] = etag
+        return request.get_response(app)
+
+    def test_open_tasks_are_listed(self):
+        response = self._get(_OPEN_URL)
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(len(json.loads(response.body)['tasks']), 3)
+
+    def test_unchanged_views_are_not_modified(self):
+        for url in (_OPEN_URL, _HISTORY_URL):
+            etag = self._get(url).headers['ETag']
+            response = self._get(url, etag=etag)
+            self.assertEqual(response.status_int, 304)
+            self.assertEqual(response.body, b'')
+            self.assertEqual(response.headers['ETag'], etag)
+
+    def test_writes_change_the_etag(self):
+        etag = self._get(_OPEN_URL).headers['ETag']
+        self.put_tasks(self.TASK_MODEL, [self.create_task(
+            self.TASK_MODEL, 'new', task_entry.STATUS_OPEN,
+            _BASE_TIME + datetime.timedelta(days=1))])
+        response = self._get(_OPEN_URL, etag=etag)
+        self.assertEqual(response.status_int, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(json.loads(response.body)['tasks']), 4)
+
+    def test_parameters_are_part_of_the_etag(self):
+        etag = self._get(_HISTORY_URL).headers['ETag']
+        response = self._get(_HISTORY_URL + '&order=asc', etag=etag)
+        self.assertEqual(response.status_int, 200)
+
+    def test_pages_link_to_the_next_page(self):
+        for url in (_OPEN_URL, _HISTORY_URL):
+            body = json.loads(self._get(url + '&page_size=2').body)
+            self.assertEqual(len(body['tasks']), 2)
+            self.assertTrue(body['more'])
+            body = json.loads(self._get(
+                url + '&page_size=2&cursor=' + body['cursor']).body)
+            self.assertEqual(len(body['tasks']), 1, msg=url)
+            self.assertFalse(body['more'])
+
+    def test_pages_have_their_own_etag(self):
+        first_page = self._get(_OPEN_URL + '&page_size=2')
+        url = (
+            _OPEN_URL + '&page_size=2&cursor=' +
+            json.loads(first_page.body)['cursor'])
+        response = self._get(url, etag=first_page.headers['ETag'])
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(
+            self._get(url, etag=response.headers['ETag']).status_int, 304)
+
+    def test_unknown_models_are_not_found(self):
+        self.assertEqual(
+            self._get('/api/unknown/open?entity_id=foo').status_int, 404)
+
+    def test_malformed_parameters_are_bad_requests(self):
+        for url in (
+                _OPEN_URL + '&page_size=many',
+                _OPEN_URL + '&cursor=notacursor',
+                '/api/base/open?entity_id=foo&entity_version=one',
+                _HISTORY_URL + '&page_size=many',
+                _HISTORY_URL + '&cursor=notacursor'):
+            self.assertEqual(self._get(url).status_int, 400, msg=url)
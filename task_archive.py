@@ -0,0 +1,570 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Archive of old resolved tasks, packed into one entity group per month.
+
+The archive_resolved_tasks job (see migration_jobs) moves resolved tasks out
+of the task models into a TaskArchiveMonthModel per (task model, entity key,
+month of last update). The month's rows are stored, compressed, in child
+TaskArchivePartModels of at most MAX_PART_BYTES of JSON each, as arrays of
+the fields in ROW_COLUMNS; the rest of each task is recovered from its ID.
+Archived tasks keep counting towards the sharded counters, so each month
+also counts its tasks by state, for task_counters.reconcile_async.
+
+Tasks are appended to the archive and deleted in the same cross-group
+transaction, after being read again, so a task updated since the job queried
+it is left live rather than archived in a stale state.
+
+fetch_history_page_async pages through the live resolved tasks of an entity
+version and its archived ones as a single history. The other history reads of
+the task models only see live tasks; count_archived_async tells how many
+tasks they miss.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import datetime
+import json
+
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+import history_cursor_cache
+import ndb_utils
+import task_ids
+
+# The maximum size of the JSON rows of a TaskArchivePartModel, before
+# compression, which keeps parts under the datastore's 1MB entity size limit
+# however well the rows compress.
+MAX_PART_BYTES = 900 * 1000
+# The maximum number of tasks archived per transaction. Each task is its own
+# entity group, and a cross-group transaction spans at most 25 of them,
+# including the archive's.
+MAX_TASKS_PER_TRANSACTION = 24
+# The fields of a task stored in each archived row, in order. The others are
+# recovered from the task's ID. Rows archived before the target columns were
+# added end after last_updated.
+ROW_COLUMNS = (
+    'id',
+    'status',
+    'closed_by',
+    'closed_on',
+    'issue_description',
+    'created_on',
+    'last_updated',
+    'target_type',
+    'target_id',
+)
+# The columns recovered from the ID for rows which do not store them. The ID
+# stores a missing target as the string 'None'.
+_TARGET_COLUMNS = ('target_type', 'target_id')
+_DATETIME_COLUMNS = frozenset(['closed_on', 'created_on', 'last_updated'])
+_EPOCH = datetime.datetime(1970, 1, 1)
+_URLSAFE_PREFIX = 'archive:'
+
+
+class TaskArchiveMonthModel(ndb.Model):
+    """The archived tasks of an entity version last updated in a month.
+
+    Instances of this class have an ID with the form:
+        [task_model_kind]:[entity_key]:[YYYY-MM]
+    """
+
+    # The kind of the task model the tasks were archived from.
+    task_kind = ndb.StringProperty(required=True, indexed=True)
+    # The entity key of the archived tasks, as built by get_entity_key.
+    entity_key = ndb.StringProperty(required=True, indexed=True)
+    # The month the archived tasks were last updated in, as YYYY-MM.
+    month = ndb.StringProperty(required=True, indexed=False)
+    # The number of TaskArchivePartModel children holding the rows.
+    num_parts = ndb.IntegerProperty(default=0, indexed=False)
+    # The number of archived tasks.
+    num_rows = ndb.IntegerProperty(default=0, indexed=False)
+    # The number of archived tasks by state, keyed by [status]:[task_type].
+    # None for months archived before the states were counted.
+    state_counts = ndb.JsonProperty(default=None)
+
+    @classmethod
+    def get_month_id(cls, task_model, entity_key, month):
+        """Returns the ID of the archive of an entity version's month."""
+        return '%s:%s:%s' % (
+            task_model._get_kind(), entity_key, month)  # pylint: disable=protected-access
+
+
+class TaskArchivePartModel(ndb.Model):
+    """Part of the rows of a TaskArchiveMonthModel, which is its parent.
+
+    Instances of this class have the index of the part, plus one, as their ID.
+    """
+
+    # The archived rows, a JSON array of arrays of the ROW_COLUMNS fields.
+    rows = ndb.BlobProperty(compressed=True)
+
+
+class ArchiveCursor(collections.namedtuple(
+        'ArchiveCursor', ['month', 'part', 'offset'])):
+    """A position in the archived history of an entity version.
+
+    A month of None stands for the end of the archive.
+    """
+
+    def urlsafe(self):
+        """Returns the cursor as a string, like Cursor.urlsafe."""
+        return '%s%s:%d:%d' % (
+            _URLSAFE_PREFIX, self.month or '', self.part, self.offset)
+
+
+def cursor_from_urlsafe(urlsafe):
+    """Parses the urlsafe form of a history cursor.
+
+    Args:
+        urlsafe: str. The result of urlsafe() on a Cursor or ArchiveCursor.
+
+    Returns:
+        Cursor|ArchiveCursor. The cursor.
+    """
+    if not urlsafe.startswith(_URLSAFE_PREFIX):
+        return Cursor(urlsafe=urlsafe)
+    month, part, offset = urlsafe[len(_URLSAFE_PREFIX):].split(':')
+    return ArchiveCursor(month or None, int(part), int(offset))
+
+
+def _to_micros(value):
+    """Encodes a datetime as microseconds since the epoch."""
+    if value is None:
+        return None
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _from_micros(value):
+    """Reverses _to_micros."""
+    if value is None:
+        return None
+    return _EPOCH + datetime.timedelta(microseconds=value)
+
+
+def encode_row(entity):
+    """Returns an archived row of a task entry, as a list of ROW_COLUMNS."""
+    return [
+        _to_micros(getattr(entity, column)) if column in _DATETIME_COLUMNS
+        else entity.key.id() if column == 'id'
+        else getattr(entity, column)
+        for column in ROW_COLUMNS
+    ]
+
+
+def decode_row(task_model, row):
+    """Rebuilds a task entry, which is not stored, from an archived row.
+
+    Args:
+        task_model: class. The task model the row was archived from.
+        row: list. The row, as built by encode_row.
+
+    Returns:
+        ndb.Model. An instance of task_model. Only the fields stored in the
+        row are filled in if its ID does not decode.
+    """
+    values = {
+        column: _from_micros(value) if column in _DATETIME_COLUMNS else value
+        for column, value in zip(ROW_COLUMNS, row)
+    }
+    task_id = values.pop('id')
+    parts = task_ids.decode_task_id(task_id)
+    if parts is None:
+        return task_model(id=task_id, **values)
+    for column, value in parts._asdict().items():
+        if column not in values:
+            values[column] = (
+                None if column in _TARGET_COLUMNS and value == 'None'
+                else value)
+    entity_key_property = task_model._properties.get('entity_key')  # pylint: disable=protected-access
+    if entity_key_property is not None and not isinstance(
+            entity_key_property, ndb.ComputedProperty):
+        values['entity_key'] = task_model.get_entity_key(
+            values['entity_type'], values['entity_id'],
+            values['entity_version'])
+    return task_model(id=task_id, **values)
+
+
+def _get_part_key(month_key, part):
+    """Returns the key of a part of a month's archive, by index."""
+    return ndb.Key(TaskArchivePartModel, part + 1, parent=month_key)
+
+
+def _is_unchanged(entity, stored_entity):
+    """Returns whether a task is still stored as the job read it."""
+    return (
+        stored_entity is not None and not stored_entity.deleted and
+        stored_entity.status == entity.status and
+        stored_entity.last_updated == entity.last_updated)
+
+
+def pack_rows(rows):
+    """Encodes archived rows as the JSON arrays of as few parts as possible.
+
+    Args:
+        rows: list(list). The rows, as built by encode_row.
+
+    Returns:
+        list(str). The JSON of each part, none of which is longer than
+        MAX_PART_BYTES unless it holds a single row.
+    """
+    parts = []
+    encoded_rows, num_bytes = [], 2
+    for row in rows:
+        encoded_row = json.dumps(row)
+        if encoded_rows and (
+                num_bytes + len(encoded_row) + 1 > MAX_PART_BYTES):
+            parts.append('[%s]' % ','.join(encoded_rows))
+            encoded_rows, num_bytes = [], 2
+        encoded_rows.append(encoded_row)
+        num_bytes += len(encoded_row) + 1
+    if encoded_rows:
+        parts.append('[%s]' % ','.join(encoded_rows))
+    return parts
+
+
+@ndb.tasklet
+def _archive_chunk_async(task_model, month_key, entity_key, month, entities):
+    """Moves up to MAX_TASKS_PER_TRANSACTION tasks into a month's archive.
+
+    Args:
+        task_model: class. The task model the tasks belong to.
+        month_key: ndb.Key. The key of the month's TaskArchiveMonthModel.
+        entity_key: str. The entity key of the tasks.
+        month: str. The month the tasks were last updated in, as YYYY-MM.
+        entities: list(ndb.Model). The tasks, in archival order, as read by
+            the job.
+
+    Returns:
+        ndb.Future. Resolves to the number of tasks archived, which excludes
+        those updated or deleted since they were read.
+    """
+    @ndb.tasklet
+    def _transaction():
+        archive_future = month_key.get_async()
+        stored_entities = yield ndb.get_multi_async(
+            [entity.key for entity in entities],
+            use_cache=False, use_memcache=False)
+        archive = yield archive_future
+        entities_to_archive = [
+            stored_entity
+            for entity, stored_entity in zip(entities, stored_entities)
+            if _is_unchanged(entity, stored_entity)]
+        if not entities_to_archive:
+            raise ndb.Return(0)
+        if archive is None:
+            archive = TaskArchiveMonthModel(
+                key=month_key, task_kind=task_model._get_kind(),  # pylint: disable=protected-access
+                entity_key=entity_key, month=month)
+
+        rows = []
+        first_part = archive.num_parts
+        if archive.num_parts:
+            last_part = yield _get_part_key(
+                month_key, archive.num_parts - 1).get_async()
+            if last_part is not None and len(last_part.rows) < MAX_PART_BYTES:
+                rows = json.loads(last_part.rows)
+                first_part -= 1
+        rows.extend(encode_row(entity) for entity in entities_to_archive)
+
+        parts = [
+            TaskArchivePartModel(
+                key=_get_part_key(month_key, first_part + index),
+                rows=part_rows)
+            for index, part_rows in enumerate(pack_rows(rows))
+        ]
+        archive.num_parts = first_part + len(parts)
+        if archive.state_counts is None and archive.num_rows:
+            archive.state_counts = yield _count_month_states_async(archive)
+        state_counts = collections.Counter(archive.state_counts or {})
+        state_counts.update(
+            '%s:%s' % (entity.status, entity.task_type)
+            for entity in entities_to_archive)
+        archive.state_counts = dict(state_counts)
+        archive.num_rows += len(entities_to_archive)
+        yield (
+            ndb.put_multi_async([archive] + parts),
+            ndb.delete_multi_async(
+                [entity.key for entity in entities_to_archive]))
+        raise ndb.Return(len(entities_to_archive))
+
+    num_archived = yield ndb.transaction_async(_transaction, xg=True)
+    raise ndb.Return(num_archived)
+
+
+@ndb.tasklet
+def _count_month_states_async(archive):
+    """Counts the rows of a month's archive by state, from its parts.
+
+    Args:
+        archive: TaskArchiveMonthModel. The month's archive.
+
+    Returns:
+        ndb.Future. Resolves to a dict mapping [status]:[task_type] to the
+        number of rows in that state.
+    """
+    parts = yield ndb.get_multi_async([
+        _get_part_key(archive.key, part) for part in range(archive.num_parts)])
+    status_index = ROW_COLUMNS.index('status')
+    state_counts = collections.Counter()
+    for part in parts:
+        for row in json.loads(part.rows) if part is not None else []:
+            id_parts = task_ids.decode_task_id(row[0])
+            state_counts['%s:%s' % (
+                row[status_index],
+                id_parts.task_type if id_parts else None)] += 1
+    raise ndb.Return(dict(state_counts))
+
+
+@ndb.tasklet
+def _archive_month_async(task_model, entity_key, month, entities):
+    """Moves tasks into the archive of one month, a chunk at a time.
+
+    The chunks are archived one after the other, since they all write to the
+    month's entity group.
+
+    Args:
+        task_model: class. The task model the tasks belong to.
+        entity_key: str. The entity key of the tasks.
+        month: str. The month the tasks were last updated in, as YYYY-MM.
+        entities: list(ndb.Model). The tasks, in archival order.
+
+    Returns:
+        ndb.Future. Resolves to the number of tasks archived.
+    """
+    month_key = ndb.Key(
+        TaskArchiveMonthModel,
+        TaskArchiveMonthModel.get_month_id(task_model, entity_key, month))
+    num_archived = 0
+    for start in range(0, len(entities), MAX_TASKS_PER_TRANSACTION):
+        num_archived += yield _archive_chunk_async(
+            task_model, month_key, entity_key, month,
+            entities[start:start + MAX_TASKS_PER_TRANSACTION])
+    raise ndb.Return(num_archived)
+
+
+@ndb.tasklet
+def archive_async(task_model, entities):
+    """Moves resolved tasks into the archive.
+
+    Tasks updated or deleted since they were read are skipped; they are
+    archived by a later run if they are still resolved and old enough then.
+    Tasks whose IDs do not decode are skipped too. The tasks are deleted
+    directly rather than through the model's write hooks, since they must
+    keep counting towards the sharded counters and are not tracked by the
+    open task caches or summaries.
+
+    Args:
+        task_model: class. The task model the tasks belong to.
+        entities: list(ndb.Model). The tasks to archive, in ascending
+            (last_updated, id) order.
+    """
+    entities_by_month = collections.defaultdict(list)
+    for entity in entities:
+        if task_ids.decode_task_id(entity.key.id()) is None:
+            # Rows recover the entity and task_type of a task from its ID,
+            # so tasks under legacy IDs stay live until the
+            # rekey_task_entries job moves them.
+            continue
+        entity_key = task_model.get_entity_key(
+            entity.entity_type, entity.entity_id, entity.entity_version)
+        month = entity.last_updated.strftime('%Y-%m')
+        entities_by_month[(entity_key, month)].append(entity)
+    month_keys = list(entities_by_month)
+    nums_archived = yield [
+        _archive_month_async(
+            task_model, entity_key, month, entities_by_month[
+                (entity_key, month)])
+        for entity_key, month in month_keys
+    ]
+    yield history_cursor_cache.invalidate_async(task_model, [
+        entity_key
+        for (entity_key, _), num_archived in zip(month_keys, nums_archived)
+        if num_archived
+    ])
+
+
+@ndb.tasklet
+def count_archived_async(task_model, entity_key):
+    """Counts the archived tasks of an entity version.
+
+    Args:
+        task_model: class. The task model the tasks were archived from.
+        entity_key: str. The entity key, as built by get_entity_key.
+
+    Returns:
+        ndb.Future. Resolves to the number of archived tasks.
+    """
+    months = yield TaskArchiveMonthModel.query(
+        TaskArchiveMonthModel.task_kind == task_model._get_kind(),  # pylint: disable=protected-access
+        TaskArchiveMonthModel.entity_key == entity_key).fetch_async()
+    raise ndb.Return(sum(archive.num_rows for archive in months))
+
+
+@ndb.tasklet
+def count_archived_by_state_async(task_model, entity_key):
+    """Counts the archived tasks of an entity version by state.
+
+    Args:
+        task_model: class. The task model the tasks were archived from.
+        entity_key: str. The entity key, as built by get_entity_key.
+
+    Returns:
+        ndb.Future. Resolves to a collections.Counter mapping each
+        (status, task_type) to the number of archived tasks in that state.
+    """
+    months = yield TaskArchiveMonthModel.query(
+        TaskArchiveMonthModel.task_kind == task_model._get_kind(),  # pylint: disable=protected-access
+        TaskArchiveMonthModel.entity_key == entity_key).fetch_async()
+    uncounted_months = [
+        archive for archive in months if archive.state_counts is None]
+    recounted_states = yield [
+        _count_month_states_async(archive) for archive in uncounted_months]
+    counts = collections.Counter()
+    for state_counts in recounted_states + [
+            archive.state_counts for archive in months
+            if archive.state_counts is not None]:
+        for state, count in state_counts.items():
+            status, task_type = state.split(':', 1)
+            counts[(status, task_type)] += count
+    raise ndb.Return(counts)
+
+
+@ndb.tasklet
+def _fetch_archived_async(
+        task_model, entity_key, limit, cursor, new_to_old):
+    """Reads archived tasks of an entity version, in history order.
+
+    Args:
+        task_model: class. The task model the tasks were archived from.
+        entity_key: str. The entity key of the tasks.
+        limit: int. The maximum number of tasks to read.
+        cursor: ArchiveCursor|None. Where to start. None is the start of the
+            archive in the requested order.
+        new_to_old: bool. Whether to read the most recent tasks first.
+
+    Returns:
+        ndb.Future. Resolves to a (entities, cursor) tuple, where cursor is
+        None if the archive has been read to its end.
+    """
+    months = yield TaskArchiveMonthModel.query(
+        TaskArchiveMonthModel.task_kind == task_model._get_kind(),  # pylint: disable=protected-access
+        TaskArchiveMonthModel.entity_key == entity_key).fetch_async()
+    months.sort(key=lambda archive: archive.month, reverse=new_to_old)
+    positions = [
+        (archive, part)
+        for archive in months
+        for part in (
+            reversed(range(archive.num_parts)) if new_to_old
+            else range(archive.num_parts))
+    ]
+    index, offset = 0, 0
+    if cursor is not None:
+        index = next((
+            i for i, (archive, part) in enumerate(positions)
+            if (archive.month, part) == (cursor.month, cursor.part)),
+            len(positions))
+        offset = cursor.offset
+
+    entities = []
+    while index < len(positions) and len(entities) < limit:
+        archive, part = positions[index]
+        part_entity = yield _get_part_key(archive.key, part).get_async()
+        rows = json.loads(part_entity.rows) if part_entity else []
+        rows.sort(
+            key=lambda row: (row[-1], row[0]), reverse=new_to_old)
+        taken = rows[offset:offset + limit - len(entities)]
+        entities.extend(decode_row(task_model, row) for row in taken)
+        offset += len(taken)
+        if offset >= len(rows):
+            index, offset = index + 1, 0
+
+    if index >= len(positions):
+        raise ndb.Return((entities, None))
+    archive, part = positions[index]
+    raise ndb.Return((entities, ArchiveCursor(archive.month, part, offset)))
+
+
+@ndb.tasklet
+def fetch_history_page_async(
+        task_model, live_query, entity_key, page_size, cursor, new_to_old,
+        read_mode=ndb_utils.READ_MODE_EAGER, batch_size=None,
+        prefetch_size=None, produce_cursors=True):
+    """Fetches a page of the live and archived history of an entity version.
+
+    From newest to oldest, the history is the live resolved tasks followed by
+    the archived ones; from oldest to newest, the other way round.
+
+    Args:
+        task_model: class. The task model to read.
+        live_query: ndb.Query. The query over live resolved tasks, ordered in
+            the same direction as new_to_old.
+        entity_key: str. The entity key, as built by get_entity_key.
+        page_size: int. The maximum number of tasks in the page.
+        cursor: Cursor|ArchiveCursor|None. Where the page starts.
+        new_to_old: bool. Whether to read the most recent tasks first.
+        read_mode: str. How to read live tasks, one of ndb_utils.READ_MODES.
+        batch_size: int|None. See ndb_utils.fetch_page_async.
+        prefetch_size: int|None. See ndb_utils.fetch_page_async.
+        produce_cursors: bool. Whether to return a cursor after pages that end
+            among the live tasks. See ndb_utils.fetch_page_async.
+
+    Returns:
+        ndb.Future. Resolves to a (results, cursor, more) tuple, like
+        ndb.Query.fetch_page_async. The cursor is an ArchiveCursor while the
+        page ends in the archive.
+    """
+    in_archive = isinstance(cursor, ArchiveCursor)
+    if new_to_old:
+        results = []
+        if not in_archive:
+            results, cursor, more = yield ndb_utils.fetch_page_async(
+                live_query, page_size, start_cursor=cursor,
+                read_mode=read_mode, batch_size=batch_size,
+                prefetch_size=prefetch_size, produce_cursors=produce_cursors)
+            if more:
+                raise ndb.Return((results, cursor, True))
+            cursor = None
+        archived, cursor = yield _fetch_archived_async(
+            task_model, entity_key, page_size - len(results), cursor, True)
+        raise ndb.Return((results + archived, cursor, cursor is not None))
+
+    if cursor is None or (in_archive and cursor.month is not None):
+        results, cursor = yield _fetch_archived_async(
+            task_model, entity_key, page_size,
+            cursor if in_archive else None, False)
+        if cursor is not None:
+            raise ndb.Return((results, cursor, True))
+        if len(results) == page_size:
+            # The archive ends with this page. Whether any live tasks follow
+            # decides if there is another page.
+            live_key = yield live_query.get_async(keys_only=True)
+            raise ndb.Return((
+                results, ArchiveCursor(None, 0, 0), live_key is not None))
+        cursor = None
+    else:
+        results = []
+        if in_archive:
+            cursor = None
+    live_results, cursor, more = yield ndb_utils.fetch_page_async(
+        live_query, page_size - len(results), start_cursor=cursor,
+        read_mode=read_mode, batch_size=batch_size,
+        prefetch_size=prefetch_size, produce_cursors=produce_cursors)
+    raise ndb.Return((results + live_results, cursor, more))
@@ -0,0 +1,247 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for task_archive."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+import json
+
+import task_archive
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+# Spans two months, so archived tasks are split across month archives.
+_NUM_TASKS = 40
+_NUM_ARCHIVED = 25
+
+
+class FetchHistoryPageTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(FetchHistoryPageTests, self).setUp()
+        self.tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%02d' % i, task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(days=i))
+            for i in range(_NUM_TASKS)
+        ]
+        self.put_tasks(self.TASK_MODEL, self.tasks)
+        task_archive.archive_async(
+            self.TASK_MODEL, self.tasks[:_NUM_ARCHIVED]).get_result()
+        self.old_to_new_ids = [task.key.id() for task in self.tasks]
+
+    def _fetch_all_ids(self, page_size, new_to_old):
+        """Pages through the whole history, checking every page's size."""
+        ids, cursor = [], None
+        for _ in range(_NUM_TASKS + 1):
+            results, cursor, more = self.TASK_MODEL.fetch_history_page_async(
+                'exploration', 'foo', 1, cursor, new_to_old=new_to_old,
+                page_size=page_size).get_result()
+            ids.extend(task.key.id() for task in results)
+            if not more:
+                self.assertLessEqual(len(results), page_size)
+                return ids
+            self.assertEqual(len(results), page_size)
+            self.assertIsNotNone(cursor)
+        self.fail('History paging did not end')
+
+    def test_archived_tasks_are_no_longer_live(self):
+        self.assertEqual(
+            self.TASK_MODEL.query().count(), _NUM_TASKS - _NUM_ARCHIVED)
+        self.assertEqual(
+            task_archive.count_archived_async(
+                self.TASK_MODEL,
+                self.TASK_MODEL.get_entity_key('exploration', 'foo', 1)
+            ).get_result(),
+            _NUM_ARCHIVED)
+
+    def test_new_to_old_pages_cross_into_the_archive(self):
+        for page_size in (1, 4, 7, 15, 25, _NUM_TASKS, _NUM_TASKS + 5):
+            self.assertEqual(
+                self._fetch_all_ids(page_size, True),
+                list(reversed(self.old_to_new_ids)))
+
+    def test_old_to_new_pages_cross_out_of_the_archive(self):
+        for page_size in (1, 4, 7, 15, 25, _NUM_TASKS, _NUM_TASKS + 5):
+            self.assertEqual(
+                self._fetch_all_ids(page_size, False), self.old_to_new_ids)
+
+    def test_page_ending_with_the_archive_reports_live_tasks_after_it(self):
+        results, cursor, more = self.TASK_MODEL.fetch_history_page_async(
+            'exploration', 'foo', 1, None, new_to_old=False,
+            page_size=_NUM_ARCHIVED).get_result()
+        self.assertEqual(len(results), _NUM_ARCHIVED)
+        self.assertTrue(more)
+        results, _, more = self.TASK_MODEL.fetch_history_page_async(
+            'exploration', 'foo', 1, cursor, new_to_old=False,
+            page_size=_NUM_TASKS).get_result()
+        self.assertEqual(
+            [task.key.id() for task in results],
+            self.old_to_new_ids[_NUM_ARCHIVED:])
+        self.assertFalse(more)
+
+    def test_cursors_survive_urlsafe_round_trips(self):
+        results, cursor, _ = self.TASK_MODEL.fetch_history_page_async(
+            'exploration', 'foo', 1, None, new_to_old=True,
+            page_size=20).get_result()
+        self.assertIsInstance(cursor, task_archive.ArchiveCursor)
+        cursor = task_archive.cursor_from_urlsafe(cursor.urlsafe())
+        next_results, _, _ = self.TASK_MODEL.fetch_history_page_async(
+            'exploration', 'foo', 1, cursor, new_to_old=True,
+            page_size=20).get_result()
+        self.assertEqual(
+            [task.key.id() for task in results + next_results],
+            list(reversed(self.old_to_new_ids)))
+
+    def test_archived_tasks_keep_their_fields(self):
+        results, _, _ = self.TASK_MODEL.fetch_history_page_async(
+            'exploration', 'foo', 1, None, new_to_old=False,
+            page_size=1).get_result()
+        self.assertEqual(results[0].to_dict(), self.tasks[0].to_dict())
+
+
+class ArchiveTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def test_tasks_updated_since_they_were_read_are_not_archived(self):
+        tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(hours=i))
+            for i in range(3)
+        ]
+        self.put_tasks(self.TASK_MODEL, tasks)
+        read_tasks = self.TASK_MODEL.get_multi(
+            [task.key.id() for task in tasks])
+        reopened = self.TASK_MODEL.get_by_id(tasks[1].key.id())
+        reopened.status = task_entry.STATUS_OPEN
+        reopened.put()
+
+        task_archive.archive_async(self.TASK_MODEL, read_tasks).get_result()
+
+        self.assertEqual(
+            [task.key.id() for task in self.TASK_MODEL.query()],
+            [tasks[1].key.id()])
+        self.assertEqual(
+            task_archive.count_archived_async(
+                self.TASK_MODEL,
+                self.TASK_MODEL.get_entity_key('exploration', 'foo', 1)
+            ).get_result(),
+            2)
+
+    def test_archiving_the_same_tasks_again_is_harmless(self):
+        tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(hours=i))
+            for i in range(3)
+        ]
+        self.put_tasks(self.TASK_MODEL, tasks)
+        task_archive.archive_async(self.TASK_MODEL, tasks).get_result()
+        task_archive.archive_async(self.TASK_MODEL, tasks).get_result()
+        self.assertEqual(
+            task_archive.count_archived_async(
+                self.TASK_MODEL,
+                self.TASK_MODEL.get_entity_key('exploration', 'foo', 1)
+            ).get_result(),
+            3)
+
+    def test_tasks_without_a_target_are_archived(self):
+        task = self.TASK_MODEL(
+            id=self.TASK_MODEL.get_task_id(
+                task_entry.ENTITY_TYPE_EXPLORATION, 'foo', 1,
+                task_entry.TASK_TYPES[0], None, None),
+            entity_type=task_entry.ENTITY_TYPE_EXPLORATION, entity_id='foo',
+            entity_version=1, task_type=task_entry.TASK_TYPES[0],
+            status=task_entry.STATUS_RESOLVED, created_on=_BASE_TIME,
+            last_updated=_BASE_TIME)
+        self.put_tasks(self.TASK_MODEL, [task])
+        task_archive.archive_async(self.TASK_MODEL, [task]).get_result()
+        results, _, _ = self.TASK_MODEL.fetch_history_page_async(
+            'exploration', 'foo', 1, None, page_size=1).get_result()
+        self.assertEqual(results[0].to_dict(), task.to_dict())
+        self.assertIsNone(results[0].target_type)
+        self.assertIsNone(results[0].target_id)
+
+    def test_tasks_under_legacy_ids_are_not_archived(self):
+        task = self.create_task(
+            self.TASK_MODEL, 'state0', task_entry.STATUS_RESOLVED,
+            _BASE_TIME)
+        task.key = self.TASK_MODEL(id='exploration.foo.1.legacy').key
+        self.put_tasks(self.TASK_MODEL, [task])
+        task_archive.archive_async(self.TASK_MODEL, [task]).get_result()
+        self.assertEqual(
+            [key.id() for key in self.TASK_MODEL.query().fetch(
+                keys_only=True)],
+            ['exploration.foo.1.legacy'])
+
+
+class DecodeRowTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def test_rows_without_target_columns_recover_them_from_the_id(self):
+        task_id = self.TASK_MODEL.get_task_id(
+            task_entry.ENTITY_TYPE_EXPLORATION, 'foo', 1,
+            task_entry.TASK_TYPES[0], None, None)
+        row = [task_id, task_entry.STATUS_RESOLVED, None, None, None, 0, 0]
+        task = task_archive.decode_row(self.TASK_MODEL, row)
+        self.assertEqual(task.entity_id, 'foo')
+        self.assertEqual(task.task_type, task_entry.TASK_TYPES[0])
+        self.assertIsNone(task.target_type)
+        self.assertIsNone(task.target_id)
+
+    def test_rows_with_legacy_ids_keep_their_stored_fields(self):
+        row = ['legacy', task_entry.STATUS_RESOLVED, None, None, None, 0, 0]
+        task = task_archive.decode_row(self.TASK_MODEL, row)
+        self.assertEqual(task.key.id(), 'legacy')
+        self.assertEqual(task.status, task_entry.STATUS_RESOLVED)
+        self.assertIsNone(task.entity_id)
+
+
+class PackRowsTests(test_utils.TestBase):
+
+    def setUp(self):
+        super(PackRowsTests, self).setUp()
+        self.max_part_bytes = task_archive.MAX_PART_BYTES
+        task_archive.MAX_PART_BYTES = 100
+
+    def tearDown(self):
+        task_archive.MAX_PART_BYTES = self.max_part_bytes
+        super(PackRowsTests, self).tearDown()
+
+    def test_parts_are_bounded_by_size(self):
+        rows = [['task%d' % i, 'x' * (i % 7) * 5] for i in range(50)]
+        parts = task_archive.pack_rows(rows)
+        self.assertGreater(len(parts), 1)
+        for part in parts:
+            self.assertLessEqual(len(part), 100)
+        self.assertEqual(
+            [row for part in parts for row in json.loads(part)], rows)
+
+    def test_oversized_rows_get_a_part_of_their_own(self):
+        rows = [['small'], ['x' * 200], ['small']]
+        self.assertEqual(
+            [json.loads(part) for part in task_archive.pack_rows(rows)],
+            [[row] for row in rows])
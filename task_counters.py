@@ -0,0 +1,265 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sharded counters of task entries by entity key, status and task type.
+
+Every (entity_key, status, task_type) combination has NUM_SHARDS counter
+entities. Writers update a random shard, so concurrent writes rarely contend
+for the same entity group, and readers sum all shards with a single batch get.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import itertools
+import random
+
+from google.appengine.ext import ndb
+
+import task_archive
+import task_ids
+
+NUM_SHARDS = 20
+# The number of task keys each page of a recount fetches.
+RECOUNT_PAGE_SIZE = 1000
+
+
+class TaskCounterShardModel(ndb.Model):
+    """One shard of the count of tasks in a given state.
+
+    Instances of this class have an ID with the form:
+        [task_model_kind]:[entity_key]:[status]:[task_type]:[shard_index]
+    """
+
+    # This shard's share of the number of tasks.
+    count = ndb.IntegerProperty(default=0, indexed=False)
+
+    @classmethod
+    def get_shard_id(cls, task_model, entity_key, status, task_type, shard):
+        """Returns the ID of a counter shard.
+
+        Args:
+            task_model: class. The task entry model being counted.
+            entity_key: str. The entity key, as built by get_entity_key.
+            status: str. The status of the counted tasks.
+            task_type: str. The task_type of the counted tasks.
+            shard: int. The index of the shard, in [0, NUM_SHARDS).
+
+        Returns:
+            str. The ID of the shard.
+        """
+        return '%s:%s:%s:%s:%d' % (
+            task_model._get_kind(), entity_key, status, task_type, shard)  # pylint: disable=protected-access
+
+    @classmethod
+    def get_entity_key_range(cls, task_model, entity_key):
+        """Returns the range of keys of the shards of an entity version.
+
+        Args:
+            task_model: class. The task entry model being counted.
+            entity_key: str. The entity key, as built by get_entity_key.
+
+        Returns:
+            tuple(ndb.Key, ndb.Key). The inclusive start and exclusive end of
+            the range.
+        """
+        prefix = '%s:%s:' % (task_model._get_kind(), entity_key)  # pylint: disable=protected-access
+        return ndb.Key(cls, prefix), ndb.Key(cls, prefix + '\ufffd')
+
+
+def _get_counted_state(task_model, entity):
+    """Returns the counter an entity contributes to, or None if it is deleted.
+
+    Args:
+        task_model: class. The task entry model being counted.
+        entity: ndb.Model|None. A task entry, or None if it does not exist.
+
+    Returns:
+        tuple(str, str, str)|None. The (entity_key, status, task_type) of the
+        counter.
+    """
+    if entity is None or entity.deleted:
+        return None
+    return (
+        task_model.get_entity_key(
+            entity.entity_type, entity.entity_id, entity.entity_version),
+        entity.status, entity.task_type)
+
+
+@ndb.tasklet
+def _increment_shard_async(shard_id, delta):
+    """Transactionally adds delta to a single counter shard."""
+    @ndb.tasklet
+    def _transaction():
+        shard = yield TaskCounterShardModel.get_by_id_async(shard_id)
+        if shard is None:
+            shard = TaskCounterShardModel(id=shard_id)
+        shard.count += delta
+        yield shard.put_async()
+
+    yield ndb.transaction_async(_transaction)
+
+
+@ndb.tasklet
+def record_changes_async(task_model, previous_entities, new_entities):
+    """Updates the counters for a batch of task entry writes.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        previous_entities: list(ndb.Model|None). The stored versions of the
+            written entities from before the write, None where there were none.
+        new_entities: list(ndb.Model|None). The written entities, in the same
+            order as previous_entities, None where they were deleted.
+    """
+    deltas = collections.Counter()
+    for previous, new in zip(previous_entities, new_entities):
+        previous_state = _get_counted_state(task_model, previous)
+        new_state = _get_counted_state(task_model, new)
+        if previous_state != new_state:
+            if previous_state is not None:
+                deltas[previous_state] -= 1
+            if new_state is not None:
+                deltas[new_state] += 1
+    yield [
+        _increment_shard_async(
+            TaskCounterShardModel.get_shard_id(
+                task_model, entity_key, status, task_type,
+                random.randrange(NUM_SHARDS)),
+            delta)
+        for (entity_key, status, task_type), delta in deltas.items()
+        if delta
+    ]
+
+
+@ndb.tasklet
+def count_tasks_async(task_model, entity_key, statuses, task_types):
+    """Counts the tasks of an entity version in any of the given states.
+
+    Args:
+        task_model: class. The task entry model being counted.
+        entity_key: str. The entity key, as built by get_entity_key.
+        statuses: list(str). The statuses to count.
+        task_types: list(str). The task types to count.
+
+    Returns:
+        ndb.Future. Resolves to the total number of matching tasks.
+    """
+    shards = yield ndb.get_multi_async([
+        ndb.Key(TaskCounterShardModel, TaskCounterShardModel.get_shard_id(
+            task_model, entity_key, status, task_type, shard))
+        for status, task_type, shard in itertools.product(
+            statuses, task_types, range(NUM_SHARDS))
+    ])
+    raise ndb.Return(sum(shard.count for shard in shards if shard is not None))
+
+
+@ndb.tasklet
+def _recount_live_async(task_model, query, status):
+    """Counts the live tasks of a status by task_type, a page of keys at a
+    time.
+
+    Args:
+        task_model: class. The task entry model being counted.
+        query: ndb.Query. The query over the tasks of an entity version.
+        status: str. The status to count.
+
+    Returns:
+        ndb.Future. Resolves to a collections.Counter mapping each
+        (status, task_type) to its number of tasks.
+    """
+    query = query.filter(
+        task_model.status == status,
+        task_model.deleted == False)  # pylint: disable=singleton-comparison
+    counts = collections.Counter()
+    cursor, more = None, True
+    while more:
+        keys, cursor, more = yield query.fetch_page_async(
+            RECOUNT_PAGE_SIZE, keys_only=True, start_cursor=cursor)
+        # The task_type is part of the task's ID, except for legacy IDs,
+        # whose tasks are read instead.
+        legacy_keys = []
+        for key, parts in zip(
+                keys, task_ids.decode_task_ids([key.id() for key in keys])):
+            if parts is None:
+                legacy_keys.append(key)
+            else:
+                counts[(status, parts.task_type)] += 1
+        legacy_entities = yield ndb.get_multi_async(legacy_keys)
+        counts.update(
+            (status, entity.task_type) for entity in legacy_entities
+            if entity is not None)
+        more = more and cursor is not None
+    raise ndb.Return(counts)
+
+
+@ndb.tasklet
+def reconcile_async(
+        task_model, entity_type, entity_id, entity_version, statuses):
+    """Recounts the tasks of an entity version and corrects its counters.
+
+    Live tasks are counted with keys-only queries and archived ones from the
+    counts of their archive months, since both count towards the counters.
+    The difference between each recount and the sum of its shards is added to
+    a random shard. A task written while the recount runs may leave a small
+    error, which the next reconciliation corrects.
+
+    Args:
+        task_model: class. The task entry model being counted.
+        entity_type: str. The type of entity the tasks refer to.
+        entity_id: str. The ID of the entity the tasks refer to.
+        entity_version: int. The version of the entity the tasks refer to.
+        statuses: list(str). Every status a task can have.
+
+    Returns:
+        ndb.Future. Resolves to the number of counters which were corrected.
+    """
+    entity_key = task_model.get_entity_key(
+        entity_type, entity_id, entity_version)
+    start_key, end_key = TaskCounterShardModel.get_entity_key_range(
+        task_model, entity_key)
+    query = task_model.get_entity_tasks_query(
+        entity_type, entity_id, entity_version)
+    live_counts_futures = [
+        _recount_live_async(task_model, query, status) for status in statuses]
+    archived_counts_future = task_archive.count_archived_by_state_async(
+        task_model, entity_key)
+    shard_keys_future = TaskCounterShardModel.query(
+        TaskCounterShardModel.key >= start_key,
+        TaskCounterShardModel.key < end_key).fetch_async(keys_only=True)
+    live_counts, archived_counts, shard_keys = yield (
+        live_counts_futures, archived_counts_future, shard_keys_future)
+    # The key query may be stale, but the shards themselves are read with a
+    # strongly consistent get.
+    shards = yield ndb.get_multi_async(shard_keys)
+
+    deltas = collections.Counter(archived_counts)
+    for counts in live_counts:
+        deltas.update(counts)
+    for shard in shards:
+        if shard is not None:
+            status, task_type = shard.key.id().rsplit(':', 3)[1:3]
+            deltas[(status, task_type)] -= shard.count
+    yield [
+        _increment_shard_async(
+            TaskCounterShardModel.get_shard_id(
+                task_model, entity_key, status, task_type,
+                random.randrange(NUM_SHARDS)),
+            delta)
+        for (status, task_type), delta in deltas.items()
+        if delta
+    ]
+    raise ndb.Return(sum(1 for delta in deltas.values() if delta))
@@ -0,0 +1,138 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for task_counters and the reconcile_task_counters job."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+
+from google.appengine.ext import ndb
+
+import batch_jobs
+import migration_jobs
+import task_archive
+import task_counters
+import task_entry
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+
+
+class ReconcileTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(ReconcileTests, self).setUp()
+        self.tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i,
+                task_entry.STATUS_OPEN if i % 3 == 0 else
+                task_entry.STATUS_RESOLVED,
+                _BASE_TIME + datetime.timedelta(days=i))
+            for i in range(12)
+        ]
+        self.put_tasks(self.TASK_MODEL, self.tasks)
+
+    def _count(self, status):
+        return self.TASK_MODEL.count_tasks_async(
+            'exploration', 'foo', 1, status=status).get_result()
+
+    def _reconcile(self):
+        return task_counters.reconcile_async(
+            self.TASK_MODEL, 'exploration', 'foo', 1,
+            task_entry.STATUS_CHOICES).get_result()
+
+    def test_consistent_counters_are_left_alone(self):
+        self.assertEqual(self._reconcile(), 0)
+        self.assertEqual(self._count(task_entry.STATUS_OPEN), 4)
+        self.assertEqual(self._count(task_entry.STATUS_RESOLVED), 8)
+
+    def test_drifted_counters_are_corrected(self):
+        ndb.delete_multi(
+            task_counters.TaskCounterShardModel.query().fetch(keys_only=True))
+        self.assertEqual(self._count(task_entry.STATUS_RESOLVED), 0)
+        self.assertEqual(self._reconcile(), 2)
+        self.assertEqual(self._count(task_entry.STATUS_OPEN), 4)
+        self.assertEqual(self._count(task_entry.STATUS_RESOLVED), 8)
+
+    def test_archived_tasks_keep_being_counted(self):
+        task_archive.archive_async(self.TASK_MODEL, [
+            task for task in self.tasks
+            if task.status == task_entry.STATUS_RESOLVED][:5]).get_result()
+        self.assertEqual(self._reconcile(), 0)
+        self.assertEqual(self._count(task_entry.STATUS_RESOLVED), 8)
+
+    def test_archives_without_state_counts_are_recounted(self):
+        task_archive.archive_async(self.TASK_MODEL, [
+            task for task in self.tasks
+            if task.status == task_entry.STATUS_RESOLVED][:5]).get_result()
+        months = task_archive.TaskArchiveMonthModel.query().fetch()
+        for archive in months:
+            archive.state_counts = None
+        ndb.put_multi(months)
+        self.assertEqual(self._reconcile(), 0)
+        self.assertEqual(self._count(task_entry.STATUS_RESOLVED), 8)
+
+
+class ReconcileTaskCountersJobTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(ReconcileTaskCountersJobTests, self).setUp()
+        self.tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%02d' % i, task_entry.STATUS_OPEN,
+                _BASE_TIME, entity_id=entity_id)
+            for entity_id in ('bar', 'baz', 'foo')
+            for i in range(7)
+        ]
+        self.put_tasks(self.TASK_MODEL, self.tasks)
+        self.batch_size = migration_jobs.ReconcileTaskCountersJob.BATCH_SIZE
+        # Every version straddles two or three batches.
+        migration_jobs.ReconcileTaskCountersJob.BATCH_SIZE = 3
+        self.reconcile_async = task_counters.reconcile_async
+        self.reconciled = []
+
+        def _reconcile_async(task_model, *entity_version, **kwargs):
+            self.reconciled.append(entity_version)
+            return self.reconcile_async(task_model, *entity_version, **kwargs)
+        task_counters.reconcile_async = _reconcile_async
+
+    def tearDown(self):
+        task_counters.reconcile_async = self.reconcile_async
+        migration_jobs.ReconcileTaskCountersJob.BATCH_SIZE = self.batch_size
+        super(ReconcileTaskCountersJobTests, self).tearDown()
+
+    def test_every_version_is_reconciled_once(self):
+        ndb.delete_multi(
+            task_counters.TaskCounterShardModel.query().fetch(keys_only=True))
+        job_id = batch_jobs.create_job(
+            migration_jobs.ReconcileTaskCountersJob.JOB_TYPE,
+            {'model': 'base'})
+        self.assertTrue(batch_jobs.run_job_locally(job_id)['done'])
+        self.assertEqual(self.reconciled, [
+            ('exploration', entity_id, 1)
+            for entity_id in ('bar', 'baz', 'foo')])
+        for entity_id in ('bar', 'baz', 'foo'):
+            self.assertEqual(
+                self.TASK_MODEL.count_tasks_async(
+                    'exploration', entity_id, 1).get_result(),
+                7)
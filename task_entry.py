@@ -19,7 +19,9 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import collections
 import datetime
+import functools
 
 import random
 import uuid
@@ -27,6 +29,17 @@ import uuid
 from google.appengine.ext import ndb
 from google.appengine.ext.ndb import metadata
 
+import history_cursor_cache
+import index_profiles
+import ndb_utils
+import open_task_summary
+import open_tasks_cache
+import task_archive
+import task_counters
+import task_hooks
+import task_ids
+import task_rows
+
 TEST_ONLY_ENTITY_TYPE = 'TEST_ONLY_ENTITY_TYPE'
 ENTITY_TYPE_EXPLORATION = 'exploration'
 ENTITY_TYPES = (
@@ -57,6 +70,15 @@ TASK_TYPES = (
     'ineffective-feedback-loop',
 )
 
+# The number of resolved tasks in a page of task history.
+HISTORY_PAGE_SIZE = 10
+# The default number of open tasks in a page, or fetched per batch.
+OPEN_TASKS_PAGE_SIZE = 50
+
+# Whether a property of the model is indexed under the active deployment
+# profile.
+_indexed = functools.partial(index_profiles.is_indexed, 'TaskEntryModel')
+
 ENTITY_TYPE_TARGETS = {
     ENTITY_TYPE_EXPLORATION: {
         TARGET_TYPE_STATE,
@@ -71,42 +93,54 @@ class TaskEntryModel(ndb.Model):
         [entity_type].[entity_id].[task_type].[uuid]
     """
 
+    # How queries for task lists read their results: one of
+    # ndb_utils.READ_MODES.
+    READ_MODE = ndb_utils.READ_MODE_EAGER
+    # Whether get_open_tasks reads through open_tasks_cache, and writes
+    # invalidate it. Writes made while this is off do not invalidate the
+    # cache, so entries from before it was turned off may be served for up to
+    # open_tasks_cache.CACHE_TTL_SECS once it is turned back on.
+    CACHE_OPEN_TASKS = False
+
     # When this entity was first created. This can be overwritten and
     # set explicitly.
-    created_on = ndb.DateTimeProperty(indexed=True, required=True)
+    created_on = ndb.DateTimeProperty(
+        indexed=_indexed('created_on'), required=True)
     # When this entity was last updated. This cannot be set directly.
-    last_updated = ndb.DateTimeProperty(indexed=True, required=True)
+    last_updated = ndb.DateTimeProperty(
+        indexed=_indexed('last_updated'), required=True)
     # Whether the current version of the model instance is deleted.
-    deleted = ndb.BooleanProperty(indexed=True, default=False)
+    deleted = ndb.BooleanProperty(indexed=_indexed('deleted'), default=False)
 
     # The type of entity a task entry refers to.
     entity_type = ndb.StringProperty(
-        required=True, indexed=True, choices=ENTITY_TYPES)
+        required=True, indexed=_indexed('entity_type'), choices=ENTITY_TYPES)
     # The ID of the entity a task entry refers to.
     entity_id = ndb.StringProperty(
-        required=True, indexed=True)
+        required=True, indexed=_indexed('entity_id'))
     # The version of the entity a task entry refers to.
     entity_version = ndb.IntegerProperty(
-        required=True, indexed=True)
+        required=True, indexed=_indexed('entity_version'))
     # The type of task a task entry tracks.
     task_type = ndb.StringProperty(
-        required=True, indexed=True, choices=TASK_TYPES)
+        required=True, indexed=_indexed('task_type'), choices=TASK_TYPES)
     # The type of sub-entity a task entry focuses on.
     target_type = ndb.StringProperty(
-        default=None, required=False, indexed=True, choices=TARGET_TYPES)
+        default=None, required=False, indexed=_indexed('target_type'),
+        choices=TARGET_TYPES)
     # Uniquely identifies the sub-entity a task entry focuses on.
     target_id = ndb.StringProperty(
-        default=None, required=False, indexed=True)
+        default=None, required=False, indexed=_indexed('target_id'))
 
     # Tracks the state/progress of a task entry.
     status = ndb.StringProperty(
-        required=True, indexed=True, choices=STATUS_CHOICES)
+        required=True, indexed=_indexed('status'), choices=STATUS_CHOICES)
     # ID of the user who closed the task, if any.
     closed_by = ndb.StringProperty(
-        default=None, required=False, indexed=True)
+        default=None, required=False, indexed=_indexed('closed_by'))
     # The date and time at which a task was closed or deprecated.
     closed_on = ndb.DateTimeProperty(
-        default=None, required=False, indexed=True)
+        default=None, required=False, indexed=_indexed('closed_on'))
     # Auto-generated string which provides a one-line summary of the task.
     issue_description = ndb.StringProperty(
         default=None, required=False, indexed=False)
@@ -116,6 +150,11 @@ class TaskEntryModel(ndb.Model):
         """A unique id for this model instance."""
         return self.key.id()
 
+    @classmethod
+    def get_entity_key(cls, entity_type, entity_id, entity_version):
+        return task_ids.encode_entity_key(
+            entity_type, entity_id, entity_version)
+
     @classmethod
     def get(cls, entity_id, strict=True):
         """Gets an entity by id.
@@ -172,7 +211,7 @@ class TaskEntryModel(ndb.Model):
             entities.insert(index, None)
 
         if not include_deleted:
-            for i in python_utils.RANGE(len(entities)):
+            for i in range(len(entities)):
                 if entities[i] and entities[i].deleted:
                     entities[i] = None
         return entities
@@ -193,12 +232,61 @@ class TaskEntryModel(ndb.Model):
         if update_last_updated_time or self.last_updated is None:
             self.last_updated = datetime.datetime.utcnow()
 
-        return super(TaskEntryModel, self).put()
+        previous = task_hooks.before_write_async([self.key]).get_result()
+        key = super(TaskEntryModel, self).put()
+        task_hooks.after_put_async(type(self), [self], previous).get_result()
+        return key
 
     @classmethod
     def put_multi(cls, entities, update_last_updated_time=True):
         """Stores the given ndb.Model instances.
 
+        Args:
+            entities: list(ndb.Model).
+            update_last_updated_time: bool. Whether to update the
+                last_updated_field of the entities.
+        """
+        cls.put_multi_async(
+            entities, update_last_updated_time=update_last_updated_time
+        ).get_result()
+
+    @classmethod
+    @ndb.tasklet
+    def put_multi_async(
+            cls, entities, update_last_updated_time=True,
+            batch_size=ndb_utils.DEFAULT_PUT_BATCH_SIZE,
+            max_in_flight=ndb_utils.DEFAULT_MAX_IN_FLIGHT,
+            update_summaries=True):
+        """Stores the given ndb.Model instances, with pipelined batch puts.
+
+        Args:
+            entities: list(ndb.Model).
+            update_last_updated_time: bool. Whether to update the
+                last_updated_field of the entities.
+            batch_size: int. The number of entities written by each put RPC.
+            max_in_flight: int. The maximum number of put RPCs in flight.
+            update_summaries: bool. Whether to record the entities in the
+                open task summaries. Bulk writers which skip this must call
+                open_task_summary.mark_for_rebuild_async once they are done.
+
+        Returns:
+            ndb.Future. Resolves to the list of keys of the stored entities.
+        """
+        cls.update_timestamps(
+            entities, update_last_updated_time=update_last_updated_time)
+        previous = yield task_hooks.before_write_async(
+            [entity.key for entity in entities])
+        keys = yield ndb_utils.put_multi_pipelined_async(
+            ndb_utils.split_into_batches(entities, batch_size),
+            max_in_flight=max_in_flight)
+        yield task_hooks.after_put_async(
+            cls, entities, previous, update_summaries=update_summaries)
+        raise ndb.Return(keys)
+
+    @classmethod
+    def update_timestamps(cls, entities, update_last_updated_time=True):
+        """Fills in the timestamps of the given instances before a put.
+
         Args:
             entities: list(ndb.Model).
             update_last_updated_time: bool. Whether to update the
@@ -211,7 +299,18 @@ class TaskEntryModel(ndb.Model):
             if update_last_updated_time or entity.last_updated is None:
                 entity.last_updated = datetime.datetime.utcnow()
 
-        ndb.put_multi(entities)
+    @classmethod
+    def soft_delete_multi(cls, entities):
+        """Marks the given instances as deleted. Queries and gets skip them
+        from then on, and the purge_task_tombstones job eventually deletes
+        them for good.
+
+        Args:
+            entities: list(ndb.Model).
+        """
+        for entity in entities:
+            entity.deleted = True
+        cls.put_multi(entities)
 
     @classmethod
     def delete_multi(cls, entities):
@@ -220,8 +319,24 @@ class TaskEntryModel(ndb.Model):
         Args:
             entities: list(ndb.Model).
         """
+        cls.delete_multi_async(entities).get_result()
+
+    @classmethod
+    @ndb.tasklet
+    def delete_multi_async(cls, entities):
+        """Asynchronous version of delete_multi.
+
+        Args:
+            entities: list(ndb.Model).
+
+        Returns:
+            ndb.Future. Resolves once the entities and the data derived from
+            them have been updated.
+        """
         keys = [entity.key for entity in entities]
-        ndb.delete_multi(keys)
+        previous = yield task_hooks.before_write_async(keys)
+        yield ndb.delete_multi_async(keys)
+        yield task_hooks.after_delete_async(cls, keys, previous)
 
     @classmethod
     def delete_by_id(cls, instance_id):
@@ -230,11 +345,17 @@ class TaskEntryModel(ndb.Model):
         Args:
             instance_id: str. Id of the model to delete.
         """
-        ndb.Key(cls, instance_id).delete()
+        key = ndb.Key(cls, instance_id)
+        previous = task_hooks.before_write_async([key]).get_result()
+        key.delete()
+        task_hooks.after_delete_async(cls, [key], previous).get_result()
 
     def delete(self):
         """Deletes this instance."""
+        previous = task_hooks.before_write_async([self.key]).get_result()
         super(TaskEntryModel, self).key.delete()
+        task_hooks.after_delete_async(
+            type(self), [self.key], previous).get_result()
 
     @classmethod
     def get_all(cls, include_deleted=False):
@@ -281,23 +402,370 @@ class TaskEntryModel(ndb.Model):
 
     @classmethod
     def get_open_tasks(cls, entity_type, entity_id, entity_version):
-        return list(cls.query(
+        return cls.get_open_tasks_async(
+            entity_type, entity_id, entity_version).get_result()
+
+    @classmethod
+    def get_open_tasks_async(cls, entity_type, entity_id, entity_version):
+        """Asynchronous version of get_open_tasks.
+
+        Returns:
+            ndb.Future. Resolves to the list of open task entries.
+        """
+        fetch_async = functools.partial(
+            ndb_utils.fetch_async,
+            cls.get_open_tasks_query(entity_type, entity_id, entity_version),
+            read_mode=cls.READ_MODE)
+        if not cls.CACHE_OPEN_TASKS:
+            return fetch_async()
+        return open_tasks_cache.get_or_fetch_async(
+            cls, cls.get_entity_key(entity_type, entity_id, entity_version),
+            fetch_async)
+
+    @classmethod
+    def get_open_tasks_query(cls, entity_type, entity_id, entity_version):
+        """Returns the query over open tasks."""
+        return cls.query(
             cls.entity_type == entity_type,
             cls.entity_id == entity_id,
             cls.entity_version == entity_version,
-            cls.status == STATUS_OPEN))
+            cls.status == STATUS_OPEN,
+            cls.deleted == False)  # pylint: disable=singleton-comparison
+
+    @classmethod
+    def get_entity_tasks_query(cls, entity_type, entity_id, entity_version):
+        """Returns the query over every task of an entity version."""
+        return cls.query(
+            cls.entity_type == entity_type,
+            cls.entity_id == entity_id,
+            cls.entity_version == entity_version)
+
+    @classmethod
+    def list_open_tasks_async(cls, entity_type, entity_id, entity_version):
+        """Lists open tasks as TaskRows.
+
+        The rows come from the entity version's open task summary once it has
+        been rebuilt. Otherwise they come from a keys-only query, whose result
+        is used to rebuild the summary, see open_task_summary.
+
+        Returns:
+            ndb.Future. Resolves to a list(task_rows.TaskRow).
+        """
+        return open_task_summary.list_open_task_rows_async(
+            cls, cls.get_entity_key(entity_type, entity_id, entity_version),
+            cls.get_open_tasks_query(entity_type, entity_id, entity_version))
+
+    @classmethod
+    def fetch_open_tasks_page(
+            cls, entity_type, entity_id, entity_version, cursor,
+            page_size=OPEN_TASKS_PAGE_SIZE):
+        return cls.fetch_open_tasks_page_async(
+            entity_type, entity_id, entity_version, cursor,
+            page_size=page_size).get_result()
+
+    @classmethod
+    def fetch_open_tasks_page_async(
+            cls, entity_type, entity_id, entity_version, cursor,
+            page_size=OPEN_TASKS_PAGE_SIZE):
+        """Fetches a page of open tasks, unlike get_open_tasks which fetches
+        all of them at once.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            cursor: Cursor|None. Where the page starts.
+            page_size: int. The maximum number of tasks in the page.
+
+        Returns:
+            ndb.Future. Resolves to a (results, cursor, more) tuple.
+        """
+        return ndb_utils.fetch_page_async(
+            cls.get_open_tasks_query(entity_type, entity_id, entity_version),
+            page_size, start_cursor=cursor, read_mode=cls.READ_MODE)
+
+    @classmethod
+    def iter_open_tasks(
+            cls, entity_type, entity_id, entity_version,
+            batch_size=OPEN_TASKS_PAGE_SIZE):
+        """Streams the open tasks, so that only one batch of them at a time is
+        held in memory.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            batch_size: int. The number of tasks fetched per RPC.
+
+        Returns:
+            ndb.QueryIterator. Yields the open task entries.
+        """
+        return cls.get_open_tasks_query(
+            entity_type, entity_id, entity_version).iter(batch_size=batch_size)
+
+    @classmethod
+    @ndb.tasklet
+    def list_open_tasks_page_async(
+            cls, entity_type, entity_id, entity_version, cursor,
+            page_size=OPEN_TASKS_PAGE_SIZE):
+        """Lists a page of open tasks as TaskRows, in task ID order.
+
+        A first page is served from the entity version's open task summary
+        when it has been rebuilt and fits in a page. Otherwise the page comes
+        from a keys-only query.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            cursor: Cursor|None. Where the page starts.
+            page_size: int. The maximum number of tasks in the page.
+
+        Returns:
+            ndb.Future. Resolves to a (rows, next_cursor, has_next) tuple,
+            where rows is a list(task_rows.TaskRow).
+        """
+        if cursor is None:
+            summary = yield open_task_summary.get_summary_async(
+                cls, cls.get_entity_key(entity_type, entity_id, entity_version))
+            if summary is not None:
+                open_task_ids = summary.get_open_task_ids()
+                if len(open_task_ids) <= page_size:
+                    raise ndb.Return((
+                        task_rows.rows_from_ids(open_task_ids, STATUS_OPEN),
+                        None, False))
+
+        keys, next_cursor, has_next = yield ndb_utils.fetch_page_async(
+            cls.get_open_tasks_query(entity_type, entity_id, entity_version),
+            page_size, start_cursor=cursor,
+            read_mode=ndb_utils.READ_MODE_KEYS_ONLY)
+        raise ndb.Return((
+            task_rows.rows_from_keys(keys, STATUS_OPEN), next_cursor,
+            has_next))
+
+    @classmethod
+    @ndb.tasklet
+    def get_open_task_counts_async(
+            cls, entity_type, entity_id, entity_version):
+        """Counts open tasks by task_type.
+
+        Returns:
+            ndb.Future. Resolves to a dict mapping each task_type to its number
+            of open tasks.
+        """
+        rows = yield cls.list_open_tasks_async(
+            entity_type, entity_id, entity_version)
+        raise ndb.Return(
+            dict(collections.Counter(row.task_type for row in rows)))
+
+    @classmethod
+    def count_tasks(
+            cls, entity_type, entity_id, entity_version, status=None,
+            task_type=None):
+        return cls.count_tasks_async(
+            entity_type, entity_id, entity_version, status=status,
+            task_type=task_type).get_result()
+
+    @classmethod
+    def count_tasks_async(
+            cls, entity_type, entity_id, entity_version, status=None,
+            task_type=None):
+        """Counts the tasks of an entity version from the sharded counters.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            status: str|None. Only count tasks with this status, if given.
+            task_type: str|None. Only count tasks of this type, if given.
+
+        Returns:
+            ndb.Future. Resolves to the number of matching tasks.
+        """
+        return task_counters.count_tasks_async(
+            cls, cls.get_entity_key(entity_type, entity_id, entity_version),
+            [status] if status else STATUS_CHOICES,
+            [task_type] if task_type else TASK_TYPES)
 
     @classmethod
     def fetch_history_page(
-            cls, entity_type, entity_id, entity_version, cursor, new_to_old=False):
+            cls, entity_type, entity_id, entity_version, cursor,
+            new_to_old=False, page_size=HISTORY_PAGE_SIZE, batch_size=None,
+            prefetch_size=None, produce_cursors=True):
+        return cls.fetch_history_page_async(
+            entity_type, entity_id, entity_version, cursor,
+            new_to_old=new_to_old, page_size=page_size, batch_size=batch_size,
+            prefetch_size=prefetch_size,
+            produce_cursors=produce_cursors).get_result()
+
+    @classmethod
+    def fetch_history_page_async(
+            cls, entity_type, entity_id, entity_version, cursor,
+            new_to_old=False, page_size=HISTORY_PAGE_SIZE, batch_size=None,
+            prefetch_size=None, produce_cursors=True):
+        """Asynchronous version of fetch_history_page.
+
+        Once the live resolved tasks run out, pages continue into the tasks
+        archived by the archive_resolved_tasks job, see task_archive.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            cursor: Cursor|task_archive.ArchiveCursor|None. A cursor returned
+                by a previous call, or None for the first page.
+            new_to_old: bool. Whether to read the most recent tasks first.
+            page_size: int. The maximum number of tasks in the page, at most
+                ndb_utils.MAX_PAGE_SIZE.
+            batch_size: int|None. The number of tasks per query RPC, at most
+                ndb_utils.MAX_BATCH_SIZE. None leaves it to ndb.
+            prefetch_size: int|None. The number of tasks returned by the first
+                query RPC, at most ndb_utils.MAX_BATCH_SIZE. None leaves it to
+                ndb.
+            produce_cursors: bool. Whether to return the cursor after the
+                page. Pages fetched without one can't be followed.
+
+        Returns:
+            ndb.Future. Resolves to a (results, cursor, more) tuple. The cursor
+            is a task_archive.ArchiveCursor once the page ends in the archive.
+
+        Raises:
+            ValueError. A size is out of its limits.
+        """
+        ndb_utils.validate_page_options(page_size, batch_size, prefetch_size)
+        return task_archive.fetch_history_page_async(
+            cls,
+            cls.get_history_query(
+                entity_type, entity_id, entity_version, new_to_old),
+            cls.get_entity_key(entity_type, entity_id, entity_version),
+            page_size, cursor, new_to_old, read_mode=cls.READ_MODE,
+            batch_size=batch_size, prefetch_size=prefetch_size,
+            produce_cursors=produce_cursors)
+
+    @classmethod
+    def fetch_history_page_bidirectional(
+            cls, entity_type, entity_id, entity_version, cursor,
+            backward=False, page_size=HISTORY_PAGE_SIZE, batch_size=None,
+            prefetch_size=None):
+        return cls.fetch_history_page_bidirectional_async(
+            entity_type, entity_id, entity_version, cursor,
+            backward=backward, page_size=page_size, batch_size=batch_size,
+            prefetch_size=prefetch_size).get_result()
+
+    @classmethod
+    def fetch_history_page_bidirectional_async(
+            cls, entity_type, entity_id, entity_version, cursor,
+            backward=False, page_size=HISTORY_PAGE_SIZE, batch_size=None,
+            prefetch_size=None):
+        """Fetches a page of resolved tasks, newest first, with one query.
+
+        Unlike fetch_history_page, the cursors needed to link to both the next
+        and the previous page are returned, so no second query is needed to
+        build a "Prev" link.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            cursor: Cursor|None. A cursor returned by a previous call, or None
+                for the first page.
+            backward: bool. Whether cursor is a prev_cursor rather than a
+                next_cursor.
+            page_size: int. See fetch_history_page_async.
+            batch_size: int|None. See fetch_history_page_async.
+            prefetch_size: int|None. See fetch_history_page_async.
+
+        Returns:
+            ndb.Future. Resolves to a (results, prev_cursor, next_cursor,
+            has_prev, has_next) tuple.
+
+        Raises:
+            ValueError. A size is out of its limits.
+        """
+        ndb_utils.validate_page_options(page_size, batch_size, prefetch_size)
+        return ndb_utils.fetch_page_bidirectional_async(
+            cls.get_history_query(
+                entity_type, entity_id, entity_version, True),
+            cls.get_history_query(
+                entity_type, entity_id, entity_version, False),
+            page_size, cursor, backward=backward, read_mode=cls.READ_MODE,
+            batch_size=batch_size, prefetch_size=prefetch_size)
+
+    @classmethod
+    @ndb.tasklet
+    def list_history_page_async(
+            cls, entity_type, entity_id, entity_version, cursor,
+            backward=False, page_size=HISTORY_PAGE_SIZE, batch_size=None,
+            prefetch_size=None):
+        """Lists a page of resolved tasks as TaskRows, using a keys-only query.
+
+        Takes the same arguments as fetch_history_page_bidirectional_async.
+
+        Returns:
+            ndb.Future. Resolves to a (rows, prev_cursor, next_cursor,
+            has_prev, has_next) tuple, where rows is a list(task_rows.TaskRow).
+
+        Raises:
+            ValueError. A size is out of its limits.
+        """
+        ndb_utils.validate_page_options(page_size, batch_size, prefetch_size)
+        keys, prev_cursor, next_cursor, has_prev, has_next = yield (
+            ndb_utils.fetch_page_bidirectional_async(
+                cls.get_history_query(
+                    entity_type, entity_id, entity_version, True),
+                cls.get_history_query(
+                    entity_type, entity_id, entity_version, False),
+                page_size, cursor, backward=backward,
+                read_mode=ndb_utils.READ_MODE_KEYS_ONLY,
+                batch_size=batch_size, prefetch_size=prefetch_size))
+        raise ndb.Return((
+            task_rows.rows_from_keys(keys, STATUS_RESOLVED), prev_cursor,
+            next_cursor, has_prev, has_next))
+
+    @classmethod
+    def get_history_page_cursor_async(
+            cls, entity_type, entity_id, entity_version, page,
+            new_to_old=True, page_size=HISTORY_PAGE_SIZE):
+        """Finds the cursor at which a numbered page of resolved tasks starts.
+
+        Cursors of every few pages are kept in history_cursor_cache, so this
+        costs at most one short keys-only query.
+
+        Args:
+            entity_type: str. The type of entity the tasks refer to.
+            entity_id: str. The ID of the entity the tasks refer to.
+            entity_version: int. The version of the entity the tasks refer to.
+            page: int. The page, starting from 1.
+            new_to_old: bool. Whether pages are numbered from the most
+                recent task.
+            page_size: int. The number of tasks per page.
+
+        Returns:
+            ndb.Future. Resolves to a Cursor into the live resolved tasks, or
+            None for the first page, to pass to list_history_page_async.
+
+        Raises:
+            ValueError. page_size is out of its limits.
+        """
+        ndb_utils.validate_page_options(page_size)
+        return history_cursor_cache.seek_async(
+            cls, cls.get_entity_key(entity_type, entity_id, entity_version),
+            cls.get_history_query(
+                entity_type, entity_id, entity_version, new_to_old),
+            page_size, page, new_to_old)
+
+    @classmethod
+    def get_history_query(
+            cls, entity_type, entity_id, entity_version, new_to_old):
+        """Returns the query over resolved tasks, ordered by last update."""
         return (
             cls.query(
                 cls.entity_type == entity_type,
                 cls.entity_id == entity_id,
                 cls.entity_version == entity_version,
-                cls.status == STATUS_RESOLVED)
-            .order(-cls.last_updated if new_to_old else cls.last_updated)
-            .fetch_page(10, start_cursor=cursor))
+                cls.status == STATUS_RESOLVED,
+                cls.deleted == False)  # pylint: disable=singleton-comparison
+            .order(-cls.last_updated if new_to_old else cls.last_updated))
 
     @classmethod
     def get_task_id(
@@ -313,9 +781,9 @@ class TaskEntryModel(ndb.Model):
         Returns:
             str. An ID available for use for a new task entry.
         """
-        return '.'.join(str(piece) for piece in (
-            entity_type, entity_id, entity_version, task_type,
-            target_type, target_id))
+        return task_ids.encode_task_id(
+            entity_type, entity_id, entity_version, task_type, target_type,
+            target_id)
 
     @classmethod
     def get_random_task(cls, entity_id=None):
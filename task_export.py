@@ -0,0 +1,207 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Exports task entries as newline-delimited JSON (one entity per line).
+
+Entities are read in large batches, with the next batch fetched while the
+current one is being written, so only about two batches are held in memory at
+a time. Every batch ends at a cursor, from which an interrupted export can
+resume. Exports are served by the admin-only /_export endpoint, or run from
+export_tasks.py through remote_api.
+
+The App Engine runtime buffers a whole response before sending any of it, so
+/_export bounds each response by size rather than by time, and clients page
+through the rest with the returned cursor.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import datetime
+import json
+
+from google.appengine.api import datastore_errors
+from google.appengine.datastore.datastore_query import Cursor
+import webapp2
+
+import task_models
+
+EXPORT_URL = '/_export'
+CURSOR_HEADER = 'X-Export-Cursor'
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+# How many bytes a response from /_export holds, at most one batch past
+# which it returns the cursor to resume from. Responses are buffered in
+# memory and limited to 32MB by App Engine.
+MAX_RESPONSE_BYTES = 8 * 1024 * 1024
+# The query parameters of /_export which restrict it to one entity version.
+# They are given together or not at all.
+ENTITY_FILTER_PARAMS = ('entity_type', 'entity_id', 'entity_version')
+
+
+def get_export_query(
+        task_model, entity_type=None, entity_id=None, entity_version=None,
+        include_deleted=False):
+    """Returns the query over the task entries to export.
+
+    Args:
+        task_model: class. The task entry model to export.
+        entity_type: str|None. With entity_id and entity_version, restricts
+            the export to the tasks of one entity version.
+        entity_id: str|None. See entity_type.
+        entity_version: int|None. See entity_type.
+        include_deleted: bool. Whether to export deleted tasks too.
+
+    Returns:
+        ndb.Query. The query.
+    """
+    if entity_id is None:
+        return task_model.get_all(include_deleted=include_deleted)
+    query = task_model.get_entity_tasks_query(
+        entity_type, entity_id, entity_version)
+    if not include_deleted:
+        query = query.filter(task_model.deleted == False)  # pylint: disable=singleton-comparison
+    return query
+
+
+def _json_default(value):
+    """Encodes the property values which json cannot encode by itself."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def entity_to_json(entity):
+    """Returns a task entry as a single line of JSON, without the newline."""
+    values = entity.to_dict()
+    values['id'] = entity.key.id()
+    return json.dumps(values, sort_keys=True, default=_json_default)
+
+
+def iter_batches(query, start_cursor=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields the results of a query one batch at a time.
+
+    Each batch is requested before the previous one is handed to the caller,
+    so the datastore fetches a batch while the caller processes the last.
+
+    Args:
+        query: ndb.Query. The query to run.
+        start_cursor: Cursor|None. Where to start.
+        batch_size: int. The number of results per batch.
+
+    Yields:
+        tuple(list(ndb.Model), Cursor|None, bool). Each batch, the cursor
+        after it, and whether more results may follow.
+    """
+    def _fetch_async(cursor):
+        return query.fetch_page_async(
+            batch_size, start_cursor=cursor, batch_size=batch_size)
+
+    future = _fetch_async(start_cursor)
+    while future is not None:
+        entities, cursor, more = future.get_result()
+        future = _fetch_async(cursor) if more and cursor else None
+        yield entities, cursor, more
+
+
+def export_ndjson(
+        query, out, start_cursor=None, batch_size=DEFAULT_BATCH_SIZE,
+        on_batch=None, max_bytes=None):
+    """Writes the results of a query to a file as newline-delimited JSON.
+
+    Args:
+        query: ndb.Query. The query to export.
+        out: file. Where to write the lines.
+        start_cursor: Cursor|None. Where to resume from.
+        batch_size: int. The number of entities fetched per batch.
+        on_batch: callable|None. Called with the cursor after each batch and
+            the number of entities written so far, once the batch has been
+            written to out. Use it to checkpoint the export.
+        max_bytes: int|None. Stop after the batch during which this many
+            bytes have been written. None means to export everything.
+
+    Returns:
+        tuple(int, Cursor|None). The number of entities written, and the
+        cursor to resume from, or None if the export is complete.
+    """
+    num_written = 0
+    num_bytes = 0
+    for entities, cursor, more in iter_batches(
+            query, start_cursor=start_cursor, batch_size=batch_size):
+        for entity in entities:
+            line = entity_to_json(entity)
+            out.write(line)
+            out.write('\n')
+            num_bytes += len(line) + 1
+        num_written += len(entities)
+        if on_batch is not None:
+            on_batch(cursor, num_written)
+        if not more:
+            return num_written, None
+        if max_bytes is not None and num_bytes >= max_bytes:
+            return num_written, cursor
+    return num_written, None
+
+
+class ExportPage(webapp2.RequestHandler):
+    """Exports task entries as NDJSON, for example with
+    /_export?model=real&entity_type=exploration&entity_id=foo&entity_version=1
+
+    The response is buffered until the handler returns, so it stops after the
+    batch which takes it past MAX_RESPONSE_BYTES. When the export is not
+    complete, the X-Export-Cursor header holds the cursor parameter with which
+    to request the rest. Requests giving only some of ENTITY_FILTER_PARAMS
+    are answered with 400 Bad Request.
+    """
+
+    def get(self):
+        if self.request.get('model') not in task_models.TASK_MODELS:
+            self.abort(400, detail='Unknown model')
+        task_model = task_models.get_task_model(self.request.get('model'))
+        entity_filter = [
+            self.request.get(name) for name in ENTITY_FILTER_PARAMS]
+        if any(entity_filter) and not all(entity_filter):
+            self.abort(
+                400, detail='%s must be given together' % ', '.join(
+                    ENTITY_FILTER_PARAMS))
+        entity_id = self.request.get('entity_id') or None
+        entity_version = None
+        try:
+            if entity_id:
+                entity_version = int(self.request.get('entity_version'))
+            batch_size = int(
+                self.request.get('batch_size') or DEFAULT_BATCH_SIZE)
+        except ValueError:
+            self.abort(
+                400, detail='entity_version and batch_size must be integers')
+        try:
+            urlsafe_cursor = self.request.get('cursor') or None
+            start_cursor = urlsafe_cursor and Cursor(urlsafe=urlsafe_cursor)
+        except datastore_errors.BadValueError:
+            self.abort(400, detail='Invalid cursor')
+        query = get_export_query(
+            task_model,
+            entity_type=self.request.get('entity_type') or None,
+            entity_id=entity_id, entity_version=entity_version,
+            include_deleted=bool(self.request.get('include_deleted')))
+
+        self.response.content_type = 'application/x-ndjson'
+        _, cursor = export_ndjson(
+            query, self.response.out, start_cursor=start_cursor,
+            batch_size=max(1, min(batch_size, MAX_BATCH_SIZE)),
+            max_bytes=MAX_RESPONSE_BYTES)
+        if cursor is not None:
+            self.response.headers[str(CURSOR_HEADER)] = str(cursor.urlsafe())
@@ -0,0 +1,102 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for task_export."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import test_utils  # pylint: disable=wrong-import-order
+
+import datetime
+import json
+
+import webapp2
+
+import task_entry
+import task_export
+
+_BASE_TIME = datetime.datetime(2020, 1, 1)
+_ENTITY_FILTER = 'entity_type=exploration&entity_id=foo&entity_version=1'
+
+app = webapp2.WSGIApplication([
+    (task_export.EXPORT_URL, task_export.ExportPage),
+])
+
+
+class ExportPageTests(test_utils.TestBase):
+
+    TASK_MODEL = task_entry.TaskEntryModel
+
+    def setUp(self):
+        super(ExportPageTests, self).setUp()
+        self.tasks = [
+            self.create_task(
+                self.TASK_MODEL, 'state%d' % i, task_entry.STATUS_OPEN,
+                _BASE_TIME + datetime.timedelta(minutes=i),
+                entity_id='foo' if i % 2 else 'bar')
+            for i in range(10)
+        ]
+        self.put_tasks(self.TASK_MODEL, self.tasks)
+
+    def _get(self, query_string):
+        return webapp2.Request.blank(
+            str('%s?model=base&%s' % (task_export.EXPORT_URL, query_string))
+        ).get_response(app)
+
+    def _get_exported_ids(self, response):
+        return sorted(
+            json.loads(line)['id'] for line in response.body.splitlines())
+
+    def test_everything_is_exported_without_an_entity_filter(self):
+        self.assertEqual(
+            self._get_exported_ids(self._get('')),
+            sorted(task.key.id() for task in self.tasks))
+
+    def test_entity_filters_restrict_the_export(self):
+        self.assertEqual(
+            self._get_exported_ids(self._get(_ENTITY_FILTER)),
+            sorted(
+                task.key.id() for task in self.tasks
+                if task.entity_id == 'foo'))
+
+    def test_partial_entity_filters_are_bad_requests(self):
+        for query_string in (
+                'entity_id=foo',
+                'entity_id=foo&entity_version=1',
+                'entity_type=exploration',
+                'entity_version=1'):
+            self.assertEqual(
+                self._get(query_string).status_int, 400, msg=query_string)
+
+    def test_large_exports_are_split_across_responses(self):
+        max_response_bytes = task_export.MAX_RESPONSE_BYTES
+        task_export.MAX_RESPONSE_BYTES = 1
+        try:
+            exported_ids = []
+            query_string = 'batch_size=3'
+            for _ in range(len(self.tasks)):
+                response = self._get(query_string)
+                exported_ids.extend(self._get_exported_ids(response))
+                cursor = response.headers.get(task_export.CURSOR_HEADER)
+                if cursor is None:
+                    break
+                query_string = 'batch_size=3&cursor=%s' % cursor
+        finally:
+            task_export.MAX_RESPONSE_BYTES = max_response_bytes
+        self.assertEqual(
+            sorted(exported_ids),
+            sorted(task.key.id() for task in self.tasks))
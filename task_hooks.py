@@ -0,0 +1,157 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Work that must follow every write to a task entry model.
+
+The put and delete methods of the task models call into this module before and
+after their datastore writes, so that derived data stays in sync.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+
+from google.appengine.ext import ndb
+
+import history_cursor_cache
+import open_task_summary
+import open_tasks_cache
+import task_counters
+
+# Matches STATUS_RESOLVED in the task model modules.
+STATUS_RESOLVED = 'resolved'
+
+
+def _get_entity_keys_of_entities(task_model, entities):
+    """Returns the entity keys the given task entries belong to."""
+    return set(
+        task_model.get_entity_key(
+            entity.entity_type, entity.entity_id, entity.entity_version)
+        for entity in entities)
+
+
+def _get_entity_keys_of_resolved(task_model, *entity_lists):
+    """Returns the entity keys of the given task entries which are resolved.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        *entity_lists: list(ndb.Model|None). Task entries, None standing for
+            a missing one.
+    """
+    return _get_entity_keys_of_entities(task_model, [
+        entity for entities in entity_lists for entity in entities
+        if entity is not None and entity.status == STATUS_RESOLVED])
+
+
+def _group_ids_by_entity_key(task_model, keys, entities):
+    """Groups the IDs of task entries by the entity key they belong to.
+
+    The entity keys are taken from the stored entities rather than the task
+    IDs, so tasks under legacy IDs are grouped too.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        keys: list(ndb.Key). The keys of the task entries.
+        entities: list(ndb.Model|None). The stored entities of the keys, in
+            the same order, None where there were none.
+
+    Returns:
+        dict(str, set(str)). Maps each entity key to its task IDs.
+    """
+    task_ids_by_entity_key = collections.defaultdict(set)
+    for key, entity in zip(keys, entities):
+        if entity is not None:
+            entity_key = task_model.get_entity_key(
+                entity.entity_type, entity.entity_id, entity.entity_version)
+            task_ids_by_entity_key[entity_key].add(key.id())
+    return task_ids_by_entity_key
+
+
+@ndb.tasklet
+def before_write_async(keys):
+    """Runs before task entries are stored or deleted.
+
+    Args:
+        keys: list(ndb.Key|None). The keys of the entities about to be
+            written. None stands for an entity without a key yet.
+
+    Returns:
+        ndb.Future. Resolves to the currently stored versions of the entities,
+        in the same order as keys, None where there are none. These are read
+        past the caches, which may hold the very instances being modified.
+    """
+    existing_keys = [key for key in keys if key is not None]
+    existing_entities = yield ndb.get_multi_async(
+        existing_keys, use_cache=False, use_memcache=False)
+    existing_entities = iter(existing_entities)
+    raise ndb.Return([
+        next(existing_entities) if key is not None else None for key in keys])
+
+
+@ndb.tasklet
+def after_put_async(
+        task_model, entities, previous_entities, update_summaries=True):
+    """Runs after task entries have been stored.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        entities: list(ndb.Model). The stored entities.
+        previous_entities: list(ndb.Model|None). The result of
+            before_write_async for the stored entities.
+        update_summaries: bool. Whether to record the entities in the open
+            task summaries.
+    """
+    futures = [
+        history_cursor_cache.invalidate_async(
+            task_model, _get_entity_keys_of_resolved(
+                task_model, entities, previous_entities)),
+        task_counters.record_changes_async(
+            task_model, previous_entities, entities),
+    ]
+    if task_model.CACHE_OPEN_TASKS:
+        futures.append(open_tasks_cache.invalidate_async(
+            task_model, _get_entity_keys_of_entities(task_model, entities)))
+    if update_summaries:
+        futures.append(open_task_summary.record_put_async(task_model, entities))
+    yield futures
+
+
+@ndb.tasklet
+def after_delete_async(task_model, keys, previous_entities):
+    """Runs after task entries have been deleted.
+
+    Args:
+        task_model: class. The task entry model that was written.
+        keys: list(ndb.Key). The keys of the deleted entities.
+        previous_entities: list(ndb.Model|None). The result of
+            before_write_async for the deleted keys.
+    """
+    task_ids_by_entity_key = _group_ids_by_entity_key(
+        task_model, keys, previous_entities)
+    futures = [
+        open_task_summary.record_delete_async(
+            task_model, task_ids_by_entity_key),
+        history_cursor_cache.invalidate_async(
+            task_model, _get_entity_keys_of_resolved(
+                task_model, previous_entities)),
+        task_counters.record_changes_async(
+            task_model, previous_entities, [None] * len(keys)),
+    ]
+    if task_model.CACHE_OPEN_TASKS:
+        futures.append(open_tasks_cache.invalidate_async(
+            task_model, task_ids_by_entity_key))
+    yield futures
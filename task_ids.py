@@ -0,0 +1,152 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Encodes and decodes the IDs of task entries.
+
+Task IDs have the form:
+    [entity_type].[entity_id].[entity_version].[task_type].[target_type].[target_id]
+and entity keys are their first three pieces. Dots and percent signs inside a
+piece are percent-escaped, so every ID splits back into the pieces it was
+built from. Pieces without either character are written as they are, with
+str(), so IDs built before escaping was introduced keep their value. Tasks
+whose pieces do contain either character were stored under ambiguous IDs
+before; the rekey_task_entries job (see migration_jobs) moves them to their
+escaped IDs.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import re
+
+# The pieces of a task ID.
+TaskIdParts = collections.namedtuple('TaskIdParts', [
+    'entity_type',
+    'entity_id',
+    'entity_version',
+    'task_type',
+    'target_type',
+    'target_id',
+])
+
+_TASK_ID_PATTERN = re.compile(
+    r'^([^.]*)\.([^.]*)\.([^.]*)\.([^.]*)\.([^.]*)\.([^.]*)$')
+_ESCAPE_PATTERN = re.compile(r'[.%]')
+_UNESCAPE_PATTERN = re.compile(r'%(25|2E)')
+_ESCAPES = {'.': '%2E', '%': '%25'}
+_UNESCAPES = {'2E': '.', '25': '%'}
+
+
+def _escape(piece):
+    """Escapes the dots and percent signs of a piece of an ID."""
+    piece = '%s' % piece
+    if '.' not in piece and '%' not in piece:
+        return piece
+    return _ESCAPE_PATTERN.sub(lambda m: _ESCAPES[m.group(0)], piece)
+
+
+def _unescape(piece):
+    """Reverses _escape."""
+    if '%' not in piece:
+        return piece
+    return _UNESCAPE_PATTERN.sub(lambda m: _UNESCAPES[m.group(1)], piece)
+
+
+def encode_entity_key(entity_type, entity_id, entity_version):
+    """Returns the key of an entity version, shared by the IDs of its tasks.
+
+    Args:
+        entity_type: str. The type of the entity.
+        entity_id: str. The ID of the entity.
+        entity_version: int. The version of the entity.
+
+    Returns:
+        str. The entity key.
+    """
+    return '%s.%s.%s' % (
+        _escape(entity_type), _escape(entity_id), _escape(entity_version))
+
+
+def encode_task_id(
+        entity_type, entity_id, entity_version, task_type, target_type,
+        target_id):
+    """Returns the ID of a task entry.
+
+    Args:
+        entity_type: str. The type of entity the task refers to.
+        entity_id: str. The ID of the entity the task refers to.
+        entity_version: int. The version of the entity the task refers to.
+        task_type: str. The type of the task.
+        target_type: str|None. The type of sub-entity the task focuses on.
+        target_id: str|None. The ID of the sub-entity the task focuses on.
+
+    Returns:
+        str. The task ID.
+    """
+    return '%s.%s.%s.%s.%s.%s' % (
+        _escape(entity_type), _escape(entity_id), _escape(entity_version),
+        _escape(task_type), _escape(target_type), _escape(target_id))
+
+
+def encode_task_ids(parts_list):
+    """Returns the IDs of many task entries.
+
+    Args:
+        parts_list: list(TaskIdParts|tuple). The pieces of each ID, in the
+            order encode_task_id takes them.
+
+    Returns:
+        list(str). The task IDs, in the same order.
+    """
+    return [encode_task_id(*parts) for parts in parts_list]
+
+
+def decode_task_id(task_id):
+    """Splits a task ID into its pieces.
+
+    Args:
+        task_id: str. The ID of a task entry.
+
+    Returns:
+        TaskIdParts|None. The pieces, or None if the ID does not have the
+        structure built by encode_task_id. Missing target pieces decode to
+        the string 'None', and versions which are not integers to strings.
+    """
+    match = _TASK_ID_PATTERN.match(task_id)
+    if match is None:
+        return None
+    (entity_type, entity_id, entity_version, task_type, target_type,
+     target_id) = match.groups()
+    entity_version = _unescape(entity_version)
+    if entity_version.isdigit():
+        entity_version = int(entity_version)
+    return TaskIdParts(
+        _unescape(entity_type), _unescape(entity_id), entity_version,
+        _unescape(task_type), _unescape(target_type), _unescape(target_id))
+
+
+def decode_task_ids(task_ids):
+    """Splits many task IDs into their pieces.
+
+    Args:
+        task_ids: list(str). The IDs of task entries.
+
+    Returns:
+        list(TaskIdParts|None). The pieces of each ID, as returned by
+        decode_task_id, in the same order.
+    """
+    return [decode_task_id(task_id) for task_id in task_ids]
@@ -0,0 +1,81 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for task_ids."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import unittest
+
+import task_ids
+
+
+class TaskIdsTests(unittest.TestCase):
+
+    def test_plain_ids_keep_the_unescaped_encoding(self):
+        pieces = ('exploration', 'foo', 3, 'high-bounce-rate', 'state', 'Intro')
+        self.assertEqual(
+            task_ids.encode_task_id(*pieces),
+            '.'.join('%s' % piece for piece in pieces))
+
+    def test_plain_ids_round_trip(self):
+        parts = task_ids.TaskIdParts(
+            'exploration', 'foo', 3, 'high-bounce-rate', 'state', 'Intro')
+        self.assertEqual(
+            task_ids.decode_task_id(task_ids.encode_task_id(*parts)), parts)
+
+    def test_dots_and_percent_signs_round_trip(self):
+        parts = task_ids.TaskIdParts(
+            'exploration', 'a.b', 3, 'high-bounce-rate', 'state', '50%.%2E')
+        task_id = task_ids.encode_task_id(*parts)
+        self.assertEqual(task_id.count('.'), 5)
+        self.assertEqual(task_ids.decode_task_id(task_id), parts)
+
+    def test_non_integer_versions_round_trip_as_strings(self):
+        parts = task_ids.TaskIdParts(
+            'exploration', 'foo', '1.2', 'high-bounce-rate', 'state', 'Intro')
+        self.assertEqual(
+            task_ids.decode_task_id(task_ids.encode_task_id(*parts)), parts)
+
+    def test_missing_targets_decode_to_none_strings(self):
+        parts = task_ids.decode_task_id(task_ids.encode_task_id(
+            'exploration', 'foo', 1, 'high-bounce-rate', None, None))
+        self.assertEqual(parts.target_type, 'None')
+        self.assertEqual(parts.target_id, 'None')
+
+    def test_malformed_ids_decode_to_none(self):
+        self.assertIsNone(task_ids.decode_task_id('exploration.foo.1'))
+        self.assertIsNone(task_ids.decode_task_id('a.b.1.c.d.e.f'))
+
+    def test_entity_key_prefixes_task_ids(self):
+        entity_key = task_ids.encode_entity_key('exploration', 'a.b', 2)
+        task_id = task_ids.encode_task_id(
+            'exploration', 'a.b', 2, 'high-bounce-rate', 'state', 'Intro')
+        self.assertTrue(task_id.startswith(entity_key + '.'))
+
+    def test_encode_and_decode_many(self):
+        parts_list = [
+            ('exploration', 'foo', 1, 'high-bounce-rate', 'state', 'A'),
+            ('exploration', 'bar', 2, 'high-bounce-rate', 'state', 'B'),
+        ]
+        self.assertEqual(
+            task_ids.decode_task_ids(task_ids.encode_task_ids(parts_list)),
+            [task_ids.TaskIdParts(*parts) for parts in parts_list])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Registry of the task entry model variants being compared."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+
+import task_entry
+import task_entry_with_computed_property
+import task_entry_with_real_property
+
+# Maps the short name used in URLs and command-line flags to the model class
+# implementing that index strategy.
+TASK_MODELS = collections.OrderedDict([
+    ('base', task_entry.TaskEntryModel),
+    ('comp',
+     task_entry_with_computed_property.TaskEntryWithComputedPropertyModel),
+    ('real', task_entry_with_real_property.TaskEntryWithRealPropertyModel),
+])
+
+
+def get_task_model(name):
+    """Returns the task entry model registered under the given name.
+
+    Args:
+        name: str. One of the keys of TASK_MODELS.
+
+    Returns:
+        class. The corresponding ndb.Model subclass.
+
+    Raises:
+        Exception: if no model is registered under the given name.
+    """
+    if name not in TASK_MODELS:
+        raise Exception(
+            'Unknown task model %r, expected one of: %s' %
+            (name, ', '.join(TASK_MODELS)))
+    return TASK_MODELS[name]
+
+
+def get_task_model_name(task_model):
+    """Returns the name a task entry model is registered under.
+
+    Args:
+        task_model: class. One of the values of TASK_MODELS.
+
+    Returns:
+        str. The corresponding key of TASK_MODELS.
+
+    Raises:
+        Exception: if the model is not registered.
+    """
+    for name, registered_model in TASK_MODELS.items():
+        if registered_model is task_model:
+            return name
+    raise Exception('Unregistered task model %s' % task_model.__name__)
@@ -0,0 +1,100 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact rows for listing task entries without loading the entities."""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+
+import task_ids
+
+# A task entry as shown in list views. Every field except status is recovered
+# from the task's ID, which is built by task_ids.encode_task_id; status is
+# known from the query that found the task.
+TaskRow = collections.namedtuple('TaskRow', [
+    'id',
+    'entity_type',
+    'entity_id',
+    'entity_version',
+    'task_type',
+    'target_type',
+    'target_id',
+    'status',
+])
+
+
+def _make_row(task_id, parts, status):
+    """Builds a TaskRow from a task ID and its decoded pieces, if any."""
+    if parts is None:
+        return TaskRow(task_id, None, None, None, None, None, None, status)
+    return TaskRow(task_id, *parts, status=status)
+
+
+def row_from_id(task_id, status):
+    """Builds a TaskRow from the ID of a task entry.
+
+    Args:
+        task_id: str. The ID of the task entry.
+        status: str. The status the task is known to have.
+
+    Returns:
+        TaskRow. The row. If the ID does not have the structure produced by
+        task_ids.encode_task_id, only the id and status fields are filled in.
+    """
+    return _make_row(task_id, task_ids.decode_task_id(task_id), status)
+
+
+def row_from_key(key, status):
+    """Builds a TaskRow from the key of a task entry.
+
+    Args:
+        key: ndb.Key. The key of the task entry.
+        status: str. The status the task is known to have.
+
+    Returns:
+        TaskRow. The row, as built by row_from_id.
+    """
+    return row_from_id(key.id(), status)
+
+
+def rows_from_keys(keys, status):
+    """Builds TaskRows from the keys of task entries sharing a status.
+
+    Args:
+        keys: list(ndb.Key). The keys of the task entries.
+        status: str. The status the tasks are known to have.
+
+    Returns:
+        list(TaskRow). The rows, in the same order as keys.
+    """
+    return rows_from_ids([key.id() for key in keys], status)
+
+
+def rows_from_ids(ids, status):
+    """Builds TaskRows from the IDs of task entries sharing a status.
+
+    Args:
+        ids: list(str). The IDs of the task entries.
+        status: str. The status the tasks are known to have.
+
+    Returns:
+        list(TaskRow). The rows, in the same order as ids.
+    """
+    return [
+        _make_row(task_id, parts, status)
+        for task_id, parts in zip(ids, task_ids.decode_task_ids(ids))]
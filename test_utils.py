@@ -0,0 +1,108 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Common utilities for the unit tests, which run against the local stubs of
+the App Engine SDK. Run them all with:
+
+    python -m unittest discover -p '*_test.py'
+
+Test modules which need the SDK import this module before any google.appengine
+module, so that the SDK is on the path.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import sys
+sys.path.append('../oppia_tools/google_appengine_1.9.67/google_appengine')
+sys.path.append('../oppia_tools/google-cloud-sdk-251.0.0')
+
+import unittest
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+import task_entry
+
+
+class TestBase(unittest.TestCase):
+    """Runs each test against fresh datastore, memcache and task queue stubs.
+
+    The datastore stub is strongly consistent, so tests see their writes in
+    queries straight away.
+    """
+
+    def setUp(self):
+        super(TestBase, self).setUp()
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.init_datastore_v3_stub(
+            consistency_policy=(
+                datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+                    probability=1)))
+        self.testbed.init_memcache_stub()
+        # Reads queue.yaml, so that the app's queues exist.
+        self.testbed.init_taskqueue_stub(
+            root_path=os.path.dirname(os.path.abspath(__file__)))
+        self.taskqueue_stub = self.testbed.get_stub(
+            testbed.TASKQUEUE_SERVICE_NAME)
+        ndb.get_context().clear_cache()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+        super(TestBase, self).tearDown()
+
+    def create_task(
+            self, task_model, target_id, status, last_updated,
+            entity_id='foo', task_type=task_entry.TASK_TYPES[0]):
+        """Returns a new, unstored task of the exploration entity_id, version
+        1, targeting a state.
+
+        Args:
+            task_model: class. The task entry model to instantiate.
+            target_id: str. The ID of the state the task targets.
+            status: str. The status of the task.
+            last_updated: datetime.datetime. When the task was last updated,
+                and created.
+            entity_id: str. The ID of the exploration.
+            task_type: str. The type of the task.
+
+        Returns:
+            ndb.Model. The task.
+        """
+        values = {}
+        if 'entity_key' in task_model._properties and not isinstance(  # pylint: disable=protected-access
+                task_model._properties['entity_key'], ndb.ComputedProperty):  # pylint: disable=protected-access
+            values['entity_key'] = task_model.get_entity_key(
+                task_entry.ENTITY_TYPE_EXPLORATION, entity_id, 1)
+        return task_model(
+            id=task_model.get_task_id(
+                task_entry.ENTITY_TYPE_EXPLORATION, entity_id, 1, task_type,
+                task_entry.TARGET_TYPE_STATE, target_id),
+            entity_type=task_entry.ENTITY_TYPE_EXPLORATION,
+            entity_id=entity_id, entity_version=1, task_type=task_type,
+            target_type=task_entry.TARGET_TYPE_STATE, target_id=target_id,
+            status=status, created_on=last_updated,
+            last_updated=last_updated, **values)
+
+    def put_tasks(self, task_model, tasks):
+        """Stores tasks through the model, keeping their timestamps."""
+        task_model.put_multi(tasks, update_last_updated_time=False)
@@ -0,0 +1,195 @@
+# coding: utf-8
+#
+# Copyright 2020 The Oppia Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reproducible synthetic workloads of task entries.
+
+A WorkloadGenerator produces batches of task entities from a seed. Explorations
+are picked with Zipfian popularity, so a few of them own most of the tasks, and
+statuses follow a configurable mix. Random values come from a seeded
+random.Random and strings from pools allocated up front, so generating an
+entity costs a handful of random draws and no UUIDs. Two generators with the
+same seed, stream, configuration and clock produce the same entities.
+
+Generators with the same seed share their pool of explorations, and with it
+the popularity of each exploration. Giving each a different stream makes them
+generate different tasks, so a workload can be split over many writers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import bisect
+import datetime
+import itertools
+import random
+
+from google.appengine.ext import ndb
+
+import task_entry
+
+# The share of generated tasks in each status.
+DEFAULT_STATUS_WEIGHTS = {
+    task_entry.STATUS_OPEN: 0.2,
+    task_entry.STATUS_RESOLVED: 0.7,
+    task_entry.STATUS_DEPRECATED: 0.1,
+}
+DEFAULT_NUM_ENTITY_IDS = 1000
+# The exponent s of the Zipf distribution: the k-th most popular exploration
+# gets tasks in proportion to 1 / k^s.
+DEFAULT_ZIPF_EXPONENT = 1.1
+DEFAULT_NUM_VERSIONS = 1
+DEFAULT_LAST_UPDATED_SPREAD_DAYS = 90
+# Sizes of the pools of cheap strings which generated entities share.
+ISSUE_DESCRIPTION_POOL_SIZE = 256
+USER_ID_POOL_SIZE = 64
+
+
+def _cumulative(weights):
+    """Returns the running totals of a list of weights."""
+    totals = []
+    total = 0
+    for weight in weights:
+        total += weight
+        totals.append(total)
+    return totals
+
+
+class WorkloadGenerator(object):
+    """Produces task entities following a configurable distribution."""
+
+    def __init__(
+            self, task_model, seed=0, stream=0, entity_ids=None,
+            num_entity_ids=DEFAULT_NUM_ENTITY_IDS,
+            zipf_exponent=DEFAULT_ZIPF_EXPONENT,
+            status_weights=None, num_versions=DEFAULT_NUM_VERSIONS,
+            last_updated_spread_days=DEFAULT_LAST_UPDATED_SPREAD_DAYS,
+            now=None):
+        """Allocates the pools and distributions of a workload.
+
+        Args:
+            task_model: class. The task entry model to produce entities of.
+            seed: int|str. Seeds the pools of the workload.
+            stream: int|str. Seeds the tasks drawn from the pools.
+            entity_ids: list(str)|None. The explorations tasks are generated
+                for, from most to least popular. By default, num_entity_ids
+                random IDs.
+            num_entity_ids: int. How many explorations to generate IDs for,
+                when entity_ids is not given.
+            zipf_exponent: float. The skew of exploration popularity. 0 makes
+                every exploration equally popular.
+            status_weights: dict(str, float)|None. The relative share of tasks
+                in each status. Defaults to DEFAULT_STATUS_WEIGHTS.
+            num_versions: int. Tasks are spread uniformly over versions 1 to
+                num_versions of their exploration.
+            last_updated_spread_days: float. Tasks were last updated uniformly
+                within this many days before now.
+            now: datetime.datetime|None. The time the workload is generated
+                at. Defaults to the current time.
+        """
+        self._task_model = task_model
+        rng = random.Random(seed)
+        self._entity_ids = list(entity_ids) if entity_ids else [
+            '%032x' % rng.getrandbits(128) for _ in range(num_entity_ids)]
+        self._entity_id_totals = _cumulative([
+            1 / (rank ** zipf_exponent)
+            for rank in range(1, len(self._entity_ids) + 1)])
+        status_weights = status_weights or DEFAULT_STATUS_WEIGHTS
+        self._statuses = sorted(status_weights)
+        self._status_totals = _cumulative(
+            [status_weights[status] for status in self._statuses])
+        self._num_versions = num_versions
+        self._spread_secs = last_updated_spread_days * 24 * 60 * 60
+        self._now = now or datetime.datetime.utcnow()
+        self._issue_descriptions = [
+            '%032x' % rng.getrandbits(128)
+            for _ in range(ISSUE_DESCRIPTION_POOL_SIZE)]
+        self._user_ids = [
+            'uid_%016x' % rng.getrandbits(64) for _ in range(USER_ID_POOL_SIZE)]
+        self._rng = random.Random('%s.%s' % (seed, stream))
+        # Target IDs are a random prefix plus a counter, which keeps the IDs
+        # of the generated tasks unique without drawing a UUID for each.
+        self._target_id_prefix = '%016x' % self._rng.getrandbits(64)
+        self._target_id_counter = itertools.count()
+        target_property = task_model._properties.get('entity_key')  # pylint: disable=protected-access
+        self._sets_entity_key = target_property is not None and (
+            not isinstance(target_property, ndb.ComputedProperty))
+
+    def _pick(self, values, totals):
+        """Picks one of values, with the weights whose running totals are
+        given.
+        """
+        index = bisect.bisect(totals, self._rng.random() * totals[-1])
+        return values[min(index, len(values) - 1)]
+
+    def generate(self):
+        """Returns a new task entity, with its timestamps filled in.
+
+        Returns:
+            ndb.Model. An instance of the task model, not yet stored. Store it
+            with update_last_updated_time=False to keep its timestamps.
+        """
+        rng = self._rng
+        entity_type = task_entry.ENTITY_TYPE_EXPLORATION
+        entity_id = self._pick(self._entity_ids, self._entity_id_totals)
+        entity_version = 1 + int(rng.random() * self._num_versions)
+        task_type = task_entry.TASK_TYPES[
+            int(rng.random() * len(task_entry.TASK_TYPES))]
+        target_type = task_entry.TARGET_TYPE_STATE
+        target_id = '%s%x' % (
+            self._target_id_prefix, next(self._target_id_counter))
+        status = self._pick(self._statuses, self._status_totals)
+        last_updated = self._now - datetime.timedelta(
+            seconds=rng.random() * self._spread_secs)
+        is_closed = status != task_entry.STATUS_OPEN
+
+        values = {
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'entity_version': entity_version,
+            'task_type': task_type,
+            'target_type': target_type,
+            'target_id': target_id,
+            'status': status,
+            'closed_by': (
+                self._user_ids[int(rng.random() * len(self._user_ids))]
+                if is_closed else None),
+            'closed_on': last_updated if is_closed else None,
+            'issue_description': self._issue_descriptions[
+                int(rng.random() * len(self._issue_descriptions))],
+            'created_on': last_updated,
+            'last_updated': last_updated,
+        }
+        if self._sets_entity_key:
+            values['entity_key'] = self._task_model.get_entity_key(
+                entity_type, entity_id, entity_version)
+        return self._task_model(
+            id=self._task_model.get_task_id(
+                entity_type, entity_id, entity_version, task_type,
+                target_type, target_id),
+            **values)
+
+    def generate_batches(self, count, batch_size):
+        """Yields lists of new task entities.
+
+        Args:
+            count: int. The total number of entities to generate.
+            batch_size: int. The maximum number of entities per list.
+        """
+        while count:
+            size = min(count, batch_size)
+            yield [self.generate() for _ in range(size)]
+            count -= size